@@ -1,12 +1,111 @@
-from django.contrib import admin
+import ipaddress
 
-from solomon.models import SolomonToken
+from django.contrib import admin, messages
+from django.contrib.auth import get_permission_codename
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db.models import Sum
+from django.db.models.functions import TruncDay
+from django.http import HttpRequest, QueryDict, StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from django.utils.translation import ngettext
+
+from solomon.conf import settings
+from solomon.export import iter_csv, iter_token_rows
+from solomon.models import SolomonDevice, SolomonToken, SolomonTokenEvent, SolomonTokenStats, TokenStatus
+from solomon.sharding import for_each_shard, get_shard, get_shards, is_sharded
+from solomon.utils import estimate_count, normalize_email, normalize_ip
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that avoids a full COUNT(*) on large token tables.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        return estimate_count(self.object_list, settings.SOLOMON_ADMIN_COUNT_LIMIT)
+
+
+class TokenStatusListFilter(admin.SimpleListFilter):
+    title = _("status")
+    parameter_name = "status"
+
+    def lookups(self, request, model_admin):  # noqa: ARG002
+        return TokenStatus.choices
+
+    def queryset(self, request, queryset):  # noqa: ARG002
+        if self.value() in TokenStatus.values:
+            return queryset.with_status(self.value())
+        return queryset
+
+
+class ShardListFilter(admin.SimpleListFilter):
+    """
+    Selects the shard shown in the changelist, if SOLOMON_SHARDS is set.
+
+    A queryset can only read from one database, so the changelist shows one shard at a time, the first one by default.
+    The queryset is switched by SolomonTokenAdmin.get_queryset(), so the change view and the actions on the selected
+    tokens use the same shard.
+    """
+
+    title = _("shard")
+    parameter_name = "shard"
+
+    def lookups(self, request, model_admin):  # noqa: ARG002
+        return [(str(index), alias) for index, alias in enumerate(get_shards())]
+
+    def has_output(self) -> bool:
+        return is_sharded()
+
+    def choices(self, changelist):
+        # There is no "All" choice, the tokens of all shards can't be listed together.
+        for lookup, title in self.lookup_choices:
+            yield {
+                "selected": (self.value() or "0") == lookup,
+                "query_string": changelist.get_query_string({self.parameter_name: lookup}),
+                "display": title,
+            }
+
+    def queryset(self, request, queryset):  # noqa: ARG002
+        return queryset
+
+
+def get_request_shard(request: HttpRequest) -> str:
+    """
+    Returns the database alias of the shard selected by the ShardListFilter, also from the preserved changelist
+    filters of the change view.
+    """
+    params = request.GET
+    if "_changelist_filters" in params:
+        params = QueryDict(params["_changelist_filters"])
+    try:
+        index = int(params.get(ShardListFilter.parameter_name, 0))
+    except ValueError:
+        index = 0
+    return get_shard(index) or get_shards()[0]
 
 
 @admin.register(SolomonToken)
 class SolomonTokenAdmin(admin.ModelAdmin):
+    """
+    Admin of the tokens. With SOLOMON_SHARDS, the changelist shows the shard selected in the shard filter. The actions
+    for email domains and IP networks disable the matching tokens on all shards.
+    """
+
     list_display = ("email", "ip_address", "redirect_url", "created_at", "expiry_date", "is_consumed", "is_disabled")
-    search_fields = ("email",)
+    list_filter = (ShardListFilter, TokenStatusListFilter, "expiry_date")
+    search_fields = ("^email",)
+    date_hierarchy = "created_at"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ("disable_tokens", "disable_tokens_for_domains", "disable_tokens_for_networks", "export_tokens_as_csv")
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).using(get_request_shard(request))
 
     @admin.display(boolean=True)
     def is_consumed(self, obj):
@@ -16,6 +115,154 @@ class SolomonTokenAdmin(admin.ModelAdmin):
     def is_disabled(self, obj):
         return obj.disabled_at is not None
 
+    def get_search_results(self, request, queryset, search_term):  # noqa: ARG002
+        """
+        Searches tokens by email with lookups that can use the index on the email column.
+
+        Emails are stored lowercased, so a full address is matched exactly and everything else is matched as a
+        case-sensitive prefix instead of the default icontains scan.
+        """
+        search_term = normalize_email(search_term)
+        if not search_term:
+            return queryset, False
+        if "@" in search_term:
+            return queryset.filter(email=search_term), False
+        return queryset.filter(email__startswith=search_term), False
+
+    @admin.action(description=_("Disable selected tokens"), permissions=["disable"])
+    def disable_tokens(self, request, queryset):
+        self._message_disabled(request, queryset.bulk_disable())
+
+    @admin.action(
+        description=_("Disable all active tokens for the email domains of the selected tokens"),
+        permissions=["disable"],
+    )
+    def disable_tokens_for_domains(self, request, queryset):
+        domains = {email.rpartition("@")[2] for email in queryset.values_list("email", flat=True)}
+        if not domains:
+            self._message_disabled(request, 0)
+            return
+        disabled = for_each_shard(lambda alias: SolomonToken.objects.using(alias).for_domains(domains).bulk_disable())
+        self._message_disabled(request, sum(disabled))
+
+    @admin.action(
+        description=_("Disable all active tokens for the IP networks (/24 or /64) of the selected tokens"),
+        permissions=["disable"],
+    )
+    def disable_tokens_for_networks(self, request, queryset):
+        networks = set()
+        for ip_address in queryset.values_list("ip_address", flat=True):
+            # Tokens stored before the IP address was validated may have none.
+            if (ip_address := normalize_ip(ip_address)) is None:
+                continue
+            prefixlen = 24 if ipaddress.ip_address(ip_address).version == 4 else 64
+            networks.add(str(ipaddress.ip_network(f"{ip_address}/{prefixlen}", strict=False)))
+        if not networks:
+            self._message_disabled(request, 0)
+            return
+        disabled = for_each_shard(lambda alias: SolomonToken.objects.using(alias).bulk_disable(networks=networks))
+        self._message_disabled(request, sum(disabled))
+
+    @admin.action(description=_("Export selected tokens as CSV"), permissions=["view"])
+    def export_tokens_as_csv(self, request, queryset):  # noqa: ARG002
+        return StreamingHttpResponse(
+            iter_csv(iter_token_rows(queryset)),
+            content_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="solomon-tokens.csv"'},
+        )
+
+    def _message_disabled(self, request, disabled: int) -> None:
+        message = ngettext("%(count)d token was disabled.", "%(count)d tokens were disabled.", disabled)
+        self.message_user(request, message % {"count": disabled}, messages.SUCCESS)
+
+    def has_disable_permission(self, request):
+        """
+        Tokens can't be edited in the admin, but disabling them requires the change permission of the model.
+        """
+        codename = get_permission_codename("change", self.opts)
+        return request.user.has_perm(f"{self.opts.app_label}.{codename}")
+
+    def has_add_permission(self, request):  # noqa: ARG002
+        return False
+
+    def has_change_permission(self, request, obj=None):  # noqa: ARG002
+        return False
+
+
+@admin.register(SolomonTokenEvent)
+class SolomonTokenEventAdmin(admin.ModelAdmin):
+    list_display = ("email", "event", "reason", "ip_address", "user_agent", "created_at")
+    list_filter = ("event", "reason")
+    search_fields = ("=email",)
+    date_hierarchy = "created_at"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):  # noqa: ARG002
+        return False
+
+    def has_change_permission(self, request, obj=None):  # noqa: ARG002
+        return False
+
+
+@admin.register(SolomonDevice)
+class SolomonDeviceAdmin(admin.ModelAdmin):
+    list_display = ("user", "created_at", "last_used_at", "expiry_date")
+    list_select_related = ("user",)
+    date_hierarchy = "created_at"
+    actions = ("revoke_devices_of_users",)
+
+    @admin.action(description=_("Revoke all devices of the users of the selected devices"), permissions=["delete"])
+    def revoke_devices_of_users(self, request, queryset):
+        revoked = SolomonDevice.objects.filter(user__in=queryset.values("user")).delete()[0]
+        message = ngettext("%(count)d device was revoked.", "%(count)d devices were revoked.", revoked)
+        self.message_user(request, message % {"count": revoked}, messages.SUCCESS)
+
+    def has_add_permission(self, request):  # noqa: ARG002
+        return False
+
+    def has_change_permission(self, request, obj=None):  # noqa: ARG002
+        return False
+
+
+@admin.register(SolomonTokenStats)
+class SolomonTokenStatsAdmin(admin.ModelAdmin):
+    """
+    Dashboard of the hourly token statistics, with a per-day view. Both only read the small rollup table.
+    """
+
+    list_display = ("hour", "issued", "consumed", "disabled", "expired")
+    date_hierarchy = "hour"
+    ordering = ("-hour",)
+    change_list_template = "admin/solomon/solomontokenstats/change_list.html"
+
+    def get_urls(self):
+        urls = [
+            path(
+                "daily/",
+                self.admin_site.admin_view(self.daily_view),
+                name=f"{self.opts.app_label}_{self.opts.model_name}_daily",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def daily_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        days = (
+            SolomonTokenStats.objects.annotate(day=TruncDay("hour"))
+            .values("day")
+            .annotate(issued=Sum("issued"), consumed=Sum("consumed"), disabled=Sum("disabled"), expired=Sum("expired"))
+            .order_by("-day")[:90]
+        )
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.opts,
+            "title": _("Token statistics per day"),
+            "days": days,
+        }
+        return TemplateResponse(request, "admin/solomon/solomontokenstats/daily.html", context)
+
     def has_add_permission(self, request):  # noqa: ARG002
         return False
 
@@ -0,0 +1,212 @@
+import json
+from typing import Any, Optional
+
+from django.contrib.auth import authenticate, login, logout
+from django.http import Http404, HttpRequest, JsonResponse
+from django.urls import reverse
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from solomon.conf import settings
+from solomon.decorators import login_not_required
+from solomon.forms import LoginForm
+from solomon.health import get_health
+from solomon.mail import MailUnavailable, check_mail_available, send_token_email
+from solomon.models import InvalidReason, SolomonToken, TokenEventType
+from solomon.pending import CONFIRM_SESSION_KEY, confirm_pending_login, register_pending_login, resolve_pending_login
+from solomon.profiling import profiled
+from solomon.throttling import (
+    MALFORMED,
+    check_verify_link,
+    is_blocked,
+    mark_dead_token,
+    register_failure,
+    reject_verify_link,
+)
+from solomon.utils import get_ip_address
+from solomon.views import get_safe_redirect_url
+
+INVALID_REASON_STATUS = {
+    InvalidReason.DISABLED: 410,
+    InvalidReason.CONSUMED: 410,
+    InvalidReason.EXPIRED: 410,
+    InvalidReason.IP_MISMATCH: 403,
+    InvalidReason.BROWSER_MISMATCH: 403,
+}
+
+
+def json_response(data: dict[str, Any], status: int = 200) -> JsonResponse:
+    return JsonResponse(data, status=status, json_dumps_params={"separators": (",", ":")})
+
+
+def mail_unavailable(error: MailUnavailable) -> JsonResponse:
+    response = json_response({"error": "mail_unavailable"}, status=503)
+    response["Retry-After"] = str(error.retry_after)
+    return response
+
+
+def parse_json(request: HttpRequest) -> Optional[dict[str, Any]]:
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+@csrf_exempt
+@require_POST
+@never_cache
+@login_not_required
+@profiled("api_login_view")
+def api_login_view(request: HttpRequest) -> JsonResponse:
+    """
+    Requests a magic link for the email address in the JSON body.
+
+    Expects {"email": ..., "redirect_url": ...}, where the redirect url is optional. The IP address is always taken
+    from the request.
+
+    Returns:
+        JsonResponse: 202 if the link was sent, 400 with the form errors, or 503 if the mail can't be delivered at the
+        moment.
+    """
+    if (data := parse_json(request)) is None:
+        return json_response({"error": "invalid_json"}, status=400)
+
+    form = LoginForm(
+        {
+            "email": data.get("email", ""),
+            "redirect_url": get_safe_redirect_url(request, data.get("redirect_url")),
+        },
+        ip_address=get_ip_address(request),
+    )
+    if not form.is_valid():
+        return json_response({"error": "invalid", "errors": form.errors.get_json_data()}, status=400)
+
+    try:
+        check_mail_available()
+    except MailUnavailable as e:
+        return mail_unavailable(e)
+
+    logout(request)
+    token = form.save()
+    token.send_event(TokenEventType.ISSUE, request)
+    try:
+        send_token_email(token, request)
+    except MailUnavailable as e:
+        return mail_unavailable(e)
+
+    payload = {"status": "sent"}
+    if settings.SOLOMON_CROSS_DEVICE_LOGIN:
+        payload["pending_login_code"] = register_pending_login(request, token)
+        payload["pending_login_url"] = reverse("solomon:pending_login")
+
+    response = json_response(payload, status=202)
+    if settings.SOLOMON_REQUIRE_SAME_BROWSER:
+        response.set_cookie(settings.SOLOMON_COOKIE_NAME, token.cookie_value)
+    return response
+
+
+@csrf_exempt
+@require_POST
+@never_cache
+@login_not_required
+@profiled("api_verify_view")
+def api_verify_view(request: HttpRequest) -> JsonResponse:
+    """
+    Verifies the token in the JSON body and logs in its user.
+
+    Expects {"pk": ..., "token": ...} and, if SOLOMON_SHARDS is set, the "shard" of the token. Failures are reported
+    with a status code per reason: 404 for unknown tokens, 410 for disabled, consumed or expired tokens, 403 for a
+    different IP address or browser and 429 for blocked IP addresses.
+
+    If another browser waits for the token with SOLOMON_CROSS_DEVICE_LOGIN, it is only logged in if the body contains
+    the "pending_login_code" shown there. Otherwise the response reports the pending login as
+    "confirmation_required" with the url of the confirm page.
+
+    Returns:
+        JsonResponse: 200 with the redirect url if the user was logged in, otherwise the error.
+    """
+    if (data := parse_json(request)) is None:
+        return json_response({"error": "invalid_json"}, status=400)
+
+    ip_address = get_ip_address(request)
+    if is_blocked(ip_address):
+        return json_response({"error": "blocked"}, status=429)
+
+    pk, token_string, shard = data.get("pk"), data.get("token"), data.get("shard")
+    if not isinstance(pk, int) or not isinstance(shard, (int, type(None))) or not isinstance(token_string, str):
+        register_failure(ip_address)
+        return json_response({"error": "not_found"}, status=404)
+
+    if (rejected := check_verify_link(ip_address, pk, token_string)) == MALFORMED:
+        return json_response({"error": "not_found"}, status=404)
+    if rejected is not None:
+        return json_response({"error": "invalid"}, status=410)
+
+    if not (token := SolomonToken.objects.for_shard(shard).filter(pk=pk, token_string=token_string).first()):
+        reject_verify_link(ip_address, pk, token_string)
+        return json_response({"error": "not_found"}, status=404)
+
+    if (reason := token.get_invalid_reason(request)) is not None:
+        token.is_valid(request)
+        reject_verify_link(ip_address, pk, token_string)
+        return json_response({"error": reason}, status=INVALID_REASON_STATUS[reason])
+
+    if not (user := authenticate(request, token=token)):
+        mark_dead_token(pk, token_string)
+        return json_response({"error": "unknown_user"}, status=403)
+
+    login(request, user)
+    payload = {"status": "ok", "redirect_url": token.redirect_url}
+    if settings.SOLOMON_CROSS_DEVICE_LOGIN and resolve_pending_login(request, token, user):
+        code = data.get("pending_login_code")
+        if isinstance(code, str) and confirm_pending_login(token, user, code):
+            request.session.pop(CONFIRM_SESSION_KEY, None)
+            payload["pending_login"] = "confirmed"
+        else:
+            payload["pending_login"] = "confirmation_required"
+            payload["pending_login_confirm_url"] = reverse("solomon:pending_login_confirm")
+    return json_response(payload)
+
+
+@require_GET
+@never_cache
+@login_not_required
+def api_status_view(request: HttpRequest) -> JsonResponse:
+    """
+    Reports whether the session is logged in.
+
+    Returns:
+        JsonResponse: {"authenticated": ..., "email": ...}
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return json_response({"authenticated": False, "email": None})
+    return json_response({"authenticated": True, "email": getattr(user, user.get_email_field_name(), None)})
+
+
+@require_GET
+@never_cache
+@login_not_required
+def api_health_view(request: HttpRequest) -> JsonResponse:
+    """
+    Reports the health of the magic link login, if SOLOMON_HEALTH_VIEW is enabled.
+
+    The report contains the tokens issued, verified and disabled within the last SOLOMON_HEALTH_WINDOW seconds, the
+    active tokens and the age of the oldest one, the failed verifications per reason, the mail backlog of the
+    responding process and an estimate of the token table size. The token activity is cached for
+    SOLOMON_HEALTH_CACHE_TIMEOUT seconds, so frequent polling costs a cache lookup.
+
+    The view answers with 200 while the report is "degraded", so a mail outage doesn't take healthy app servers out of
+    a load balancer's rotation. Only with the "strict" query parameter, a degraded report is answered with 503.
+
+    Returns:
+        JsonResponse: The report.
+    """
+    if not settings.SOLOMON_HEALTH_VIEW:
+        raise Http404
+
+    health = get_health()
+    status = 503 if "strict" in request.GET and health["status"] != "ok" else 200
+    return json_response(health, status=status)
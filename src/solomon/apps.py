@@ -1,7 +1,27 @@
 from django.apps import AppConfig
+from django.core.signals import request_finished
+from django.test.signals import setting_changed
 
 
 class DefaultAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "solomon"
     default = True
+
+    def ready(self) -> None:
+        from solomon import checks  # noqa: F401
+        from solomon.audit import flush_events, record_event
+        from solomon.conf import settings
+        from solomon.metrics import count_failure
+        from solomon.signals import token_event
+        from solomon.utils import clear_settings_caches
+
+        token_event.connect(record_event, dispatch_uid="solomon.audit.record_event")
+        token_event.connect(count_failure, dispatch_uid="solomon.metrics.count_failure")
+        request_finished.connect(flush_events, dispatch_uid="solomon.audit.flush_events")
+        setting_changed.connect(clear_settings_caches, dispatch_uid="solomon.utils.clear_settings_caches")
+
+        if settings.SOLOMON_WARMUP:
+            from solomon.warmup import warm_up
+
+            warm_up()
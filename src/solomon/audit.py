@@ -0,0 +1,116 @@
+import atexit
+import logging
+import threading
+import time
+from typing import Optional
+
+from django.http import HttpRequest
+
+from solomon.conf import settings
+from solomon.models import SolomonToken, SolomonTokenEvent
+from solomon.utils import get_ip_address, is_valid_ip
+
+logger = logging.getLogger(__name__)
+
+
+class EventBuffer:
+    """
+    In-process buffer for audit events.
+
+    Events are collected in memory and written with a single bulk_create once SOLOMON_AUDIT_BUFFER_SIZE events are
+    pending or SOLOMON_AUDIT_FLUSH_INTERVAL seconds have passed since the last flush. The interval is checked when an
+    event is added and at the end of every request. Pending events are flushed when the process exits.
+    """
+
+    def __init__(self) -> None:
+        self._events: list[SolomonTokenEvent] = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def add(self, event: SolomonTokenEvent) -> None:
+        with self._lock:
+            self._events.append(event)
+        if len(self._events) >= settings.SOLOMON_AUDIT_BUFFER_SIZE:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self) -> int:
+        if time.monotonic() - self._last_flush < settings.SOLOMON_AUDIT_FLUSH_INTERVAL:
+            return 0
+        return self.flush()
+
+    def flush(self) -> int:
+        """
+        Writes all pending events to the database.
+
+        The flush runs in the request that filled the buffer, so a database error is logged and the events are
+        dropped instead of failing the login.
+
+        Returns:
+            int: The number of written events.
+        """
+        with self._lock:
+            events, self._events = self._events, []
+            self._last_flush = time.monotonic()
+
+        if not events:
+            return 0
+        try:
+            SolomonTokenEvent.objects.bulk_create(events, batch_size=settings.SOLOMON_AUDIT_BUFFER_SIZE)
+        except Exception:
+            logger.exception("Writing %d audit events failed.", len(events))
+            return 0
+        return len(events)
+
+
+event_buffer = EventBuffer()
+atexit.register(event_buffer.flush)
+
+
+def record_event(
+    sender,  # noqa: ARG001
+    token: SolomonToken,
+    event: str,
+    request: Optional[HttpRequest] = None,
+    reason: str = "",
+    **kwargs,  # noqa: ARG001
+) -> None:
+    """
+    Receiver of the token_event signal that stores an audit record for the event.
+
+    The record is written immediately if SOLOMON_AUDIT_SYNCHRONOUS is enabled, otherwise it is buffered.
+    """
+    if not settings.SOLOMON_AUDIT_LOG:
+        return
+
+    ip_address = None
+    user_agent = ""
+    if request is not None:
+        ip_address = get_ip_address(request) or None
+        user_agent = request.headers.get("user-agent", "")[:255]
+
+    audit_event = SolomonTokenEvent(
+        token_pk=token.pk,
+        email=token.email,
+        event=event,
+        reason=reason,
+        ip_address=ip_address if ip_address and is_valid_ip(ip_address) else None,
+        user_agent=user_agent,
+    )
+
+    if settings.SOLOMON_AUDIT_SYNCHRONOUS:
+        audit_event.save()
+    else:
+        event_buffer.add(audit_event)
+
+
+def flush_events(**kwargs) -> None:  # noqa: ARG001
+    """
+    Receiver of the request_finished signal that flushes the buffer if the flush interval has passed.
+    """
+    if settings.SOLOMON_AUDIT_LOG and len(event_buffer):
+        event_buffer.flush_if_due()
@@ -2,32 +2,60 @@ from typing import Optional
 
 from django.contrib.auth import get_user_model
 from django.contrib.auth.base_user import AbstractBaseUser
+from django.db import transaction
 from django.http import HttpRequest
 
-from solomon.models import SolomonToken
+from solomon.models import InvalidReason, SolomonToken, TokenEventType
+from solomon.profiling import span
+from solomon.utils import get_or_create_user
 
 
 class SolomonBackend:
     def authenticate(
-        self, request: HttpRequest, token_pk: Optional[int] = None, token_string: Optional[str] = None
+        self,
+        request: HttpRequest,
+        token_pk: Optional[int] = None,
+        token_string: Optional[str] = None,
+        token: Optional[SolomonToken] = None,
+        token_shard: Optional[int] = None,
     ) -> Optional[AbstractBaseUser]:
         """
         Authenticates a user based on a provided token primary key and token string.
 
+        The user of a signup token is created in the same transaction that consumes the token, unless it exists
+        already. If the token is stored on another shard than the users, the two writes are separate transactions.
+
         Args:
             request (HttpRequest): The HTTP request object. token_pk (Optional[int]): The primary key of the token.
             token_string (Optional[str]): The string representation of the token.
+            token (Optional[SolomonToken]): An already loaded token, used instead of looking it up by primary key and
+                token string.
+            token_shard (Optional[int]): The index of the shard the token is stored on, if SOLOMON_SHARDS is set.
 
         Returns:
             Optional[AbstractBaseUser]: The authenticated user if the token is valid and can be consumed, otherwise
             None.
         """
-        token = SolomonToken.objects.filter(pk=token_pk, token_string=token_string).first()
-        if not token or not token.is_valid(request):
-            return None
+        if token is None:
+            with span("solomon.authenticate.lookup"):
+                token = (
+                    SolomonToken.objects.for_shard(token_shard).filter(pk=token_pk, token_string=token_string).first()
+                )
+        with span("solomon.authenticate.validate"):
+            if not token or not token.is_valid(request):
+                return None
 
-        token.consume()
-        return token.get_user()
+        token.send_event(TokenEventType.VERIFY, request)
+        with span("solomon.authenticate.consume"), transaction.atomic():
+            if not token.consume():
+                # Another request consumed the token after it was validated, e.g. the same link clicked twice at once.
+                token.send_event(TokenEventType.FAIL, request, reason=InvalidReason.CONSUMED)
+                return None
+            user = token.get_user()
+            if user is None and token.is_signup:
+                user = get_or_create_user(token.email)
+        token.send_event(TokenEventType.CONSUME, request)
+        return user
 
     def get_user(self, user_id: int) -> Optional[AbstractBaseUser]:
         """
@@ -0,0 +1,101 @@
+import ipaddress
+import os
+
+from django.contrib.auth import get_user_model
+from django.core import checks
+from django.db.models import Model
+from django.db.models.functions import Lower
+
+from solomon.conf import settings
+
+
+@checks.register()
+def check_settings(app_configs, **kwargs) -> list[checks.CheckMessage]:  # noqa: ARG001
+    """
+    Validates the SOLOMON_* settings that would otherwise only fail on the first login.
+    """
+    messages = []
+
+    if settings.SOLOMON_CACHE_ALIAS not in settings.CACHES:
+        messages.append(
+            checks.Error(
+                f"SOLOMON_CACHE_ALIAS {settings.SOLOMON_CACHE_ALIAS!r} is not configured in CACHES.",
+                id="solomon.E001",
+            )
+        )
+
+    for alias in settings.SOLOMON_SHARDS or []:
+        if alias not in settings.DATABASES:
+            messages.append(checks.Error(f"The shard {alias!r} is not configured in DATABASES.", id="solomon.E002"))
+
+    for cidr in settings.SOLOMON_TRUSTED_PROXIES or []:
+        try:
+            ipaddress.ip_network(cidr, strict=False)
+        except ValueError:
+            messages.append(
+                checks.Error(f"SOLOMON_TRUSTED_PROXIES contains the invalid network {cidr!r}.", id="solomon.E003")
+            )
+
+    path = settings.SOLOMON_BLOCKED_EMAIL_DOMAINS_FILE
+    if path and not os.path.isfile(path):
+        messages.append(checks.Error(f"SOLOMON_BLOCKED_EMAIL_DOMAINS_FILE {path!r} does not exist.", id="solomon.E004"))
+
+    if settings.SOLOMON_PROFILING_SAMPLE_RATE and not settings.SOLOMON_PROFILING_DIR:
+        messages.append(
+            checks.Error("SOLOMON_PROFILING_SAMPLE_RATE requires SOLOMON_PROFILING_DIR.", id="solomon.E005")
+        )
+
+    if settings.SOLOMON_CROSS_DEVICE_LOGIN and settings.SOLOMON_REQUIRE_SAME_BROWSER:
+        messages.append(
+            checks.Warning(
+                "SOLOMON_CROSS_DEVICE_LOGIN has no effect while SOLOMON_REQUIRE_SAME_BROWSER is enabled.",
+                hint="Disable SOLOMON_REQUIRE_SAME_BROWSER to let links be opened on another device.",
+                id="solomon.W001",
+            )
+        )
+
+    if (
+        settings.SOLOMON_MAIL_MAX_QUEUE_DEPTH is not None
+        and not settings.SOLOMON_MAIL_QUEUE_DEPTH_CALLBACK
+        and not settings.SOLOMON_MAIL_SCHEDULER
+    ):
+        messages.append(
+            checks.Warning(
+                "SOLOMON_MAIL_MAX_QUEUE_DEPTH has no effect without SOLOMON_MAIL_QUEUE_DEPTH_CALLBACK or "
+                "SOLOMON_MAIL_SCHEDULER.",
+                id="solomon.W002",
+            )
+        )
+
+    return messages
+
+
+def has_lower_index(model: type[Model], field_name: str) -> bool:
+    """
+    Checks whether the model has a functional index or unique constraint on Lower(field_name).
+    """
+    expression = Lower(field_name)
+    for index in [*model._meta.indexes, *model._meta.constraints]:
+        if list(getattr(index, "expressions", ())) == [expression]:
+            return True
+    return False
+
+
+@checks.register(deploy=True)
+def check_user_email_index(app_configs, **kwargs) -> list[checks.CheckMessage]:  # noqa: ARG001
+    """
+    Recommends a functional index for the case-insensitive lookup of users by email address.
+    """
+    User = get_user_model()  # noqa: N806
+    field_name = User.get_email_field_name()
+    if has_lower_index(User, field_name):
+        return []
+    return [
+        checks.Warning(
+            f"{User._meta.label} has no index on Lower({field_name!r}), so solomon scans the user table for email "
+            "addresses that aren't stored in lowercase or belong to no user.",
+            hint=f"Add models.Index(Lower({field_name!r}), name=...) to the Meta.indexes of the user model.",
+            obj=User,
+            id="solomon.W003",
+        )
+    ]
@@ -8,16 +8,140 @@ class SesameAuthAppConfig(AppConf):
     LOGIN_TEMPLATE = "solomon/login.html"
     LOGIN_DONE_TEMPLATE = "solomon/login_done.html"
     LOGIN_FAILED_TEMPLATE = "solomon/login_failed.html"
+    MAIL_UNAVAILABLE_TEMPLATE = "solomon/mail_unavailable.html"
+    VERIFY_CONFIRM_TEMPLATE = "solomon/verify_confirm.html"
+    LOGIN_CODE_TEMPLATE = "solomon/login_code.html"
+    PENDING_LOGIN_CONFIRM_TEMPLATE = "solomon/pending_login_confirm.html"
 
     EMAIL_SUBJECT_TEMPLATE = "solomon/login_email_subject.txt"
     EMAIL_HTML_TEMPLATE = "solomon/login_email.html"
     EMAIL_TXT_TEMPLATE = "solomon/login_email.txt"
 
+    SIGNUP_TEMPLATE = "solomon/signup.html"
+    SIGNUP_DONE_TEMPLATE = "solomon/signup_done.html"
+    SIGNUP_EMAIL_SUBJECT_TEMPLATE = "solomon/login_email_subject.txt"
+    SIGNUP_EMAIL_HTML_TEMPLATE = "solomon/signup_mail.html"
+    SIGNUP_EMAIL_TXT_TEMPLATE = "solomon/signup_mail.txt"
+
     COMPLETE_PROFILE_URL = None
 
+    # Cache the login page of anonymous users for this many seconds, once per language. None disables the cache.
+    # Increase LOGIN_PAGE_CACHE_VERSION after changing the login template.
+    LOGIN_PAGE_CACHE_TIMEOUT = None
+    LOGIN_PAGE_CACHE_VERSION = 1
+
+    # Only log in on a POST from a confirmation page, so link scanners fetching the verify url don't burn tokens.
+    VERIFY_CONFIRM = False
+
+    # Let the browser that requested a link wait for it being clicked on another device and log in as well. Only
+    # usable if REQUIRE_SAME_BROWSER is disabled. The waiting browser shows a code, which has to be entered on the
+    # device the link is clicked on. The long-poll view is async and should be served by ASGI.
+    CROSS_DEVICE_LOGIN = False
+    PENDING_LOGIN_TIMEOUT = 25  # seconds
+    PENDING_LOGIN_POLL_INTERVAL = 1  # seconds
+
     REQUIRE_SAME_IP = True
     ANONYMIZE_IP_ADDRESS = False
     REQUIRE_SAME_BROWSER = True
     COOKIE_NAME = "solomon"
 
+    # Send a numeric one-time code along with the link, which can be entered on the login code page instead. The
+    # code shares the expiry and consumption of the link. A token is disabled after LOGIN_CODE_MAX_ATTEMPTS wrong
+    # codes for its email address. After LOGIN_CODE_EMAIL_MAX_ATTEMPTS wrong codes for an email address, further
+    # codes are rejected until MAX_TOKEN_LIFETIME has passed since the last wrong code. Requesting new links resets
+    # neither counter.
+    LOGIN_CODE = False
+    LOGIN_CODE_LENGTH = 6
+    LOGIN_CODE_MAX_ATTEMPTS = 5
+    LOGIN_CODE_EMAIL_MAX_ATTEMPTS = 20
+
+    # Remember the browser after a verified login. Submitting the login form from a remembered browser logs the user
+    # in without a token or mail. The signed cookie is rotated on every use and expires after
+    # REMEMBER_DEVICE_LIFETIME seconds without a login.
+    REMEMBER_DEVICE = False
+    REMEMBER_DEVICE_COOKIE_NAME = "solomon_device"
+    REMEMBER_DEVICE_LIFETIME = 30 * 24 * 60 * 60
+
+    # None keeps the historic behaviour of trusting the last X-Forwarded-For entry. A list of CIDRs (e.g.
+    # ["10.0.0.0/8"]) only honours X-Forwarded-For when the request comes from one of these proxies.
+    TRUSTED_PROXIES = None
+
+    # Restrict logins to these email domains and their subdomains. None allows all domains. Blocked domains, e.g.
+    # disposable-address providers, are rejected even if they are allowed. BLOCKED_EMAIL_DOMAINS_FILE is the path to
+    # a blocklist with one domain per line, blank lines and lines starting with "#" are ignored.
+    ALLOWED_EMAIL_DOMAINS = None
+    BLOCKED_EMAIL_DOMAINS = None
+    BLOCKED_EMAIL_DOMAINS_FILE = None
+
     FORM_LABEL_SUFFIX = ""
+
+    # Database aliases to spread the tokens across, by a hash of the email address. None stores all tokens in the
+    # default database. The verify urls contain the shard, so every lookup goes straight to the owning database.
+    SHARDS = None
+
+    # The cache used for the negative cache, failure counters and other shared state.
+    CACHE_ALIAS = "default"
+
+    # Failed verify links are remembered for this many seconds and rejected without a query. 0 disables the cache.
+    NEGATIVE_CACHE_TIMEOUT = 60 * 60
+
+    # Number of failed verifications per IP address within VERIFY_FAILURE_WINDOW seconds, after which further
+    # verifications are blocked. None disables the limit.
+    VERIFY_FAILURE_LIMIT = None
+    VERIFY_FAILURE_WINDOW = 15 * 60
+
+    # Audit log of token events. Events are buffered in-process and bulk inserted, unless AUDIT_SYNCHRONOUS is set.
+    AUDIT_LOG = False
+    AUDIT_SYNCHRONOUS = False
+    AUDIT_BUFFER_SIZE = 100
+    AUDIT_FLUSH_INTERVAL = 5  # seconds
+
+    # Circuit breaker around the delivery of login mails. While it is open, logins are rejected with a 503 instead of
+    # creating tokens that can't be delivered.
+    MAIL_CIRCUIT_BREAKER = False
+    MAIL_BREAKER_FAILURE_RATE = 0.5
+    MAIL_BREAKER_SLOW_CALL_DURATION = 5  # seconds
+    MAIL_BREAKER_WINDOW = 20  # deliveries
+    MAIL_BREAKER_MINIMUM_CALLS = 5
+    MAIL_BREAKER_OPEN_DURATION = 30  # seconds
+
+    # Dotted path to a callable returning the number of queued mails. Logins are rejected once MAIL_MAX_QUEUE_DEPTH
+    # mails are queued. Without a callback, the queue of the MAIL_SCHEDULER is used. None disables the check.
+    MAIL_QUEUE_DEPTH_CALLBACK = None
+    MAIL_MAX_QUEUE_DEPTH = None
+    MAIL_UNAVAILABLE_RETRY_AFTER = 30  # seconds
+
+    # Deliver login mails from background threads and share them fairly between the recipient domains, so a
+    # throttling provider doesn't hold up the mails to all others. Every domain gets at most MAIL_DOMAIN_CONCURRENCY
+    # concurrent deliveries and MAIL_DOMAIN_RATE mails per second (None is unlimited). Interactive logins are sent
+    # before bulk mails. A failed delivery pauses its domain for MAIL_RETRY_DELAY seconds and is retried
+    # MAIL_MAX_RETRIES times, before the token is disabled.
+    MAIL_SCHEDULER = False
+    MAIL_SCHEDULER_WORKERS = 4
+    MAIL_DOMAIN_CONCURRENCY = 2
+    MAIL_DOMAIN_RATE = None  # mails per second
+    MAIL_MAX_RETRIES = 2
+    MAIL_RETRY_DELAY = 5  # seconds
+
+    # Load templates, the mail backend and urls when the app is ready, instead of on the first login of every new
+    # process. The timings are logged by the "solomon.warmup" logger.
+    WARMUP = False
+
+    # Serve a JSON health report at api/health/ for load balancers and monitors. The report covers the last
+    # HEALTH_WINDOW seconds and its token activity is computed at most once per HEALTH_CACHE_TIMEOUT seconds, however
+    # often it is polled. It is always answered with 200, unless the "strict" query parameter is given.
+    HEALTH_VIEW = False
+    HEALTH_WINDOW = 15 * 60  # seconds
+    HEALTH_CACHE_TIMEOUT = 10  # seconds
+
+    # Dotted path to a callable(name, seconds, attributes) that receives the duration of every stage of the login
+    # flow. With PROFILING_OPENTELEMETRY the stages are recorded as OpenTelemetry spans, if opentelemetry-api is
+    # installed. PROFILING_SAMPLE_RATE is the fraction of solomon requests profiled with cProfile, the stats files
+    # are written to PROFILING_DIR.
+    PROFILING_SPAN_CALLBACK = None
+    PROFILING_OPENTELEMETRY = False
+    PROFILING_SAMPLE_RATE = 0
+    PROFILING_DIR = None
+
+    # Upper bound for row counts in the admin changelist. Larger tables are paginated by an estimate.
+    ADMIN_COUNT_LIMIT = 10_000
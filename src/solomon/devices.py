@@ -0,0 +1,136 @@
+from datetime import timedelta
+from typing import Optional
+
+from django.contrib.auth import login
+from django.contrib.auth.base_user import AbstractBaseUser
+from django.http import HttpRequest, HttpResponse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, get_random_string
+
+from solomon.conf import settings
+from solomon.models import SolomonDevice, hash_value
+from solomon.utils import normalize_email
+
+COOKIE_SALT = "solomon.device"
+
+
+def _set_cookie(request: HttpRequest, response: HttpResponse, device: SolomonDevice, secret: str) -> None:
+    response.set_signed_cookie(
+        settings.SOLOMON_REMEMBER_DEVICE_COOKIE_NAME,
+        f"{device.pk}:{secret}",
+        salt=COOKIE_SALT,
+        max_age=settings.SOLOMON_REMEMBER_DEVICE_LIFETIME,
+        secure=request.is_secure(),
+        httponly=True,
+        samesite="Lax",
+    )
+
+
+def remember_device(request: HttpRequest, response: HttpResponse, user: AbstractBaseUser) -> SolomonDevice:
+    """
+    Remembers the browser of a verified login by setting a device cookie on the response.
+
+    If the browser is already remembered for the user, its device is rotated instead of adding another one. A device
+    of another user is replaced, because the browser only keeps one device cookie.
+
+    Args:
+        request (HttpRequest): The request that verified the login.
+        response (HttpResponse): The response to set the cookie on.
+        user (AbstractBaseUser): The user that logged in.
+
+    Returns:
+        SolomonDevice: The remembered device.
+    """
+    if (device := get_device(request)) is not None:
+        if device.user_id != user.pk:
+            device.delete()
+        elif rotate_device(request, response, device):
+            return device
+
+    secret = get_random_string(64)
+    device = SolomonDevice.objects.create(
+        user=user,
+        secret_digest=hash_value(secret),
+        expiry_date=timezone.now() + timedelta(seconds=settings.SOLOMON_REMEMBER_DEVICE_LIFETIME),
+    )
+    _set_cookie(request, response, device, secret)
+    return device
+
+
+def get_device(request: HttpRequest) -> Optional[SolomonDevice]:
+    """
+    Returns the unexpired device of the request's device cookie, with its user.
+
+    A cookie with a valid signature, but an outdated secret, is a copy of a cookie that was already rotated. The
+    device is revoked then, because either the copy or the original was stolen.
+
+    Returns:
+        Optional[SolomonDevice]: The device, or None if the cookie is missing, invalid or outdated.
+    """
+    value = request.get_signed_cookie(
+        settings.SOLOMON_REMEMBER_DEVICE_COOKIE_NAME,
+        default=None,
+        salt=COOKIE_SALT,
+        max_age=settings.SOLOMON_REMEMBER_DEVICE_LIFETIME,
+    )
+    if not value:
+        return None
+
+    pk, _, secret = value.partition(":")
+    device = SolomonDevice.objects.select_related("user").filter(pk=pk, expiry_date__gt=timezone.now()).first()
+    if device is None:
+        return None
+    if not constant_time_compare(bytes(device.secret_digest), hash_value(secret)):
+        device.delete()
+        return None
+    return device
+
+
+def rotate_device(request: HttpRequest, response: HttpResponse, device: SolomonDevice) -> bool:
+    """
+    Replaces the secret of the device and sets the new cookie on the response.
+
+    The secret is only replaced if it is still the one the device was loaded with, so of two concurrent requests
+    with the same cookie only one succeeds.
+
+    Returns:
+        bool: Whether the device was rotated.
+    """
+    secret = get_random_string(64)
+    now = timezone.now()
+    updated = SolomonDevice.objects.filter(pk=device.pk, secret_digest=bytes(device.secret_digest)).update(
+        secret_digest=hash_value(secret),
+        last_used_at=now,
+        expiry_date=now + timedelta(seconds=settings.SOLOMON_REMEMBER_DEVICE_LIFETIME),
+    )
+    if updated:
+        _set_cookie(request, response, device, secret)
+    return bool(updated)
+
+
+def login_remembered_device(request: HttpRequest, email: str, response: HttpResponse) -> bool:
+    """
+    Logs in the user of the request's device cookie, if it belongs to the given email address.
+
+    Args:
+        request (HttpRequest): The request that submitted the login form.
+        email (str): The normalized email address from the login form.
+        response (HttpResponse): The response to set the rotated cookie on.
+
+    Returns:
+        bool: Whether the user was logged in. If not, a magic link has to be sent as usual.
+    """
+    device = get_device(request)
+    if device is None:
+        return False
+
+    user = device.user
+    if normalize_email(getattr(user, user.get_email_field_name()) or "") != email:
+        return False
+    if not getattr(user, "is_active", True):
+        return False
+    if not rotate_device(request, response, device):
+        return False
+
+    login(request, user, backend="solomon.backends.SolomonBackend")
+    return True
@@ -0,0 +1,80 @@
+import csv
+import json
+from datetime import datetime
+from typing import Any, Iterable, Iterator
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from solomon.models import SolomonTokenQuerySet
+
+EXPORT_FIELDS = (
+    "id",
+    "email",
+    "ip_address",
+    "redirect_url",
+    "created_at",
+    "expiry_date",
+    "consumed_at",
+    "disabled_at",
+)
+
+# Export fields which are stored in another column than their name suggests.
+EXPORT_COLUMNS = {
+    "redirect_url": "redirect__url",
+}
+
+
+class Echo:
+    """
+    File-like object that returns the written value instead of buffering it, so csv.writer can feed a stream.
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def iter_token_rows(queryset: SolomonTokenQuerySet, chunk_size: int = 2000) -> Iterator[tuple]:
+    """
+    Iterates over the audit relevant columns of the tokens without caching the queryset.
+
+    The secrets of a token (token string and cookie digest) are never exported.
+
+    Args:
+        queryset (SolomonTokenQuerySet): The tokens to export.
+        chunk_size (int): The number of rows fetched from the database at once.
+
+    Returns:
+        Iterator[tuple]: The rows in the order of EXPORT_FIELDS.
+    """
+    columns = [EXPORT_COLUMNS.get(field, field) for field in EXPORT_FIELDS]
+    return queryset.order_by("pk").values_list(*columns).iterator(chunk_size=chunk_size)
+
+
+def _format_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(rows: Iterable[tuple]) -> Iterator[str]:
+    """
+    Renders the rows as CSV lines including a header line.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([_format_value(value) for value in row])
+
+
+def iter_jsonl(rows: Iterable[tuple]) -> Iterator[str]:
+    """
+    Renders the rows as JSON Lines, one object per row.
+    """
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+EXPORT_FORMATS = {
+    "csv": iter_csv,
+    "jsonl": iter_jsonl,
+}
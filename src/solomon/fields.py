@@ -0,0 +1,56 @@
+import ipaddress
+from typing import Any, Optional
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class PackedIPAddressField(models.BinaryField):
+    """
+    Stores an IPv4 or IPv6 address packed into 4 or 16 bytes, but reads and writes it as a string.
+
+    GenericIPAddressField stores the textual representation on most databases, which takes up to 39 bytes.
+    """
+
+    description = _("IP address packed into 4 or 16 bytes")
+
+    def __init__(self, *args, **kwargs) -> None:
+        kwargs.setdefault("editable", True)
+        super().__init__(*args, **kwargs)
+
+    def db_type(self, connection) -> Optional[str]:
+        if connection.vendor == "mysql":
+            return "varbinary(16)"
+        if connection.vendor == "oracle":
+            return "RAW(16)"
+        return super().db_type(connection)
+
+    def from_db_value(self, value: Any, expression, connection) -> Optional[str]:  # noqa: ARG002
+        if not value:
+            return None
+        return str(ipaddress.ip_address(bytes(value)))
+
+    def to_python(self, value: Any) -> Optional[str]:
+        if not value:
+            return None
+        try:
+            if isinstance(value, (bytes, memoryview)):
+                return str(ipaddress.ip_address(bytes(value)))
+            return str(ipaddress.ip_address(value.strip()))
+        except ValueError as e:
+            raise ValidationError(_("Enter a valid IPv4 or IPv6 address."), code="invalid") from e
+
+    def get_prep_value(self, value: Any) -> Optional[bytes]:
+        if not value:
+            return None
+        if isinstance(value, (bytes, memoryview)):
+            return bytes(value)
+        return ipaddress.ip_address(value.strip()).packed
+
+    def value_to_string(self, obj) -> str:
+        return self.value_from_object(obj) or ""
+
+    def formfield(self, **kwargs) -> forms.Field:
+        return models.Field.formfield(self, **{"form_class": forms.GenericIPAddressField, **kwargs})
@@ -1,31 +1,87 @@
+from typing import Optional
+
 from django import forms
-from django.contrib.auth import get_user_model
+from django.core.validators import RegexValidator
 from django.utils.translation import gettext_lazy as _
 
 from solomon.models import SolomonToken
-
-User = get_user_model()
+from solomon.utils import get_user_by_email, is_email_domain_allowed, normalize_email, normalize_ip
 
 
 class LoginForm(forms.ModelForm):
+    # Not a model field, the token stores the URL in the SolomonRedirect lookup table.
+    redirect_url = forms.CharField(widget=forms.HiddenInput())
+
     class Meta:
         model = SolomonToken
-        fields = ["email", "redirect_url", "ip_address"]
+        fields = ["email", "redirect_url"]
         widgets = {
             "email": forms.EmailInput(attrs={"autofocus": "autofocus"}),
-            "redirect_url": forms.HiddenInput(),
-            "ip_address": forms.HiddenInput(),
         }
 
+    def __init__(self, *args, ip_address: Optional[str] = None, **kwargs) -> None:
+        # The IP address is resolved from the request by the view, it is never taken from the submitted data.
+        super().__init__(*args, **kwargs)
+        self.instance.ip_address = normalize_ip(ip_address)
+
     def clean_email(self):
-        email = self.cleaned_data["email"].lower()
+        email = normalize_email(self.cleaned_data["email"])
+
+        # Checked before the user lookup, so rejected domains never cost a query.
+        if not is_email_domain_allowed(email):
+            raise forms.ValidationError(_("Logins with this email address are not allowed."))
 
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
-            pass
-        else:
-            if not getattr(user, "is_active", True):
-                raise forms.ValidationError(_("This user has been deactivated."))
+        user = get_user_by_email(email)
+        if user is not None and not getattr(user, "is_active", True):
+            raise forms.ValidationError(_("This user has been deactivated."))
 
         return email
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # Without a valid IP address the token can't be stored, nor bound to the client.
+        if self.instance.ip_address is None:
+            raise forms.ValidationError(_("Your IP address could not be determined."), code="invalid_ip_address")
+        return cleaned_data
+
+    def save(self, *args, **kwargs) -> SolomonToken:
+        self.instance.redirect_url = self.cleaned_data["redirect_url"]
+        return super().save(*args, **kwargs)
+
+
+class SignupForm(LoginForm):
+    """
+    Requests a link that creates the user when it is verified. Existing users are simply logged in by it.
+    """
+
+    def save(self, *args, **kwargs) -> SolomonToken:
+        self.instance.is_signup = True
+        return super().save(*args, **kwargs)
+
+
+class LoginCodeForm(forms.Form):
+    """
+    Logs in with the one-time code of a token instead of its link.
+    """
+
+    email = forms.EmailField(widget=forms.EmailInput(attrs={"autocomplete": "email"}))
+    code = forms.CharField(
+        max_length=32,
+        validators=[RegexValidator(r"^[0-9]+$")],
+        widget=forms.TextInput(attrs={"autocomplete": "one-time-code", "inputmode": "numeric", "autofocus": True}),
+    )
+
+    def clean_email(self):
+        return normalize_email(self.cleaned_data["email"])
+
+
+class PendingLoginConfirmForm(forms.Form):
+    """
+    Confirms the login of the browser that requested a link with the code shown there.
+    """
+
+    code = forms.CharField(
+        max_length=32,
+        validators=[RegexValidator(r"^[0-9]+$")],
+        widget=forms.TextInput(attrs={"autocomplete": "off", "inputmode": "numeric", "autofocus": True}),
+    )
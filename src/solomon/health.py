@@ -0,0 +1,108 @@
+import os
+import socket
+from datetime import timedelta
+from typing import Any
+
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from solomon.conf import settings
+from solomon.mail import CircuitBreaker, get_queue_depth, mail_circuit_breaker
+from solomon.metrics import failure_counter, get_counters
+from solomon.models import InvalidReason, SolomonToken
+from solomon.sharding import for_each_shard
+from solomon.utils import estimate_count, get_cache
+
+CACHE_KEY = "solomon:health"
+
+
+def get_token_stats(alias: str) -> dict[str, Any]:
+    """
+    Aggregates the token activity of the last SOLOMON_HEALTH_WINDOW seconds on one database with a single query.
+
+    Tokens are consumed or disabled before they expire, so only tokens created within the window plus the token
+    lifetime are aggregated. The scan is bounded by the index on created_at, however large the table is.
+    """
+    now = timezone.now()
+    since = now - timedelta(seconds=settings.SOLOMON_HEALTH_WINDOW)
+    active = Q(expiry_date__gt=now, consumed_at__isnull=True, disabled_at__isnull=True)
+    stats = (
+        SolomonToken.objects.using(alias)
+        .filter(created_at__gte=since - timedelta(seconds=settings.SOLOMON_MAX_TOKEN_LIFETIME))
+        .aggregate(
+            issued=Count("pk", filter=Q(created_at__gte=since)),
+            verified=Count("pk", filter=Q(consumed_at__gte=since)),
+            disabled=Count("pk", filter=Q(disabled_at__gte=since)),
+            active=Count("pk", filter=active),
+            oldest_active=Min("created_at", filter=active),
+        )
+    )
+    stats["estimated_tokens"] = estimate_count(SolomonToken.objects.using(alias), settings.SOLOMON_ADMIN_COUNT_LIMIT)
+    return stats
+
+
+def collect_token_health() -> dict[str, Any]:
+    """
+    Computes the part of the health report that is shared by all processes: the token activity of all shards and the
+    failed verifications.
+    """
+    shards = for_each_shard(get_token_stats)
+    oldest_active = min((stats["oldest_active"] for stats in shards if stats["oldest_active"]), default=None)
+    failures = get_counters(failure_counter(reason) for reason in InvalidReason.values)
+
+    return {
+        "window": settings.SOLOMON_HEALTH_WINDOW,
+        "tokens": {
+            name: sum(stats[name] for stats in shards)
+            for name in ("issued", "verified", "disabled", "active", "estimated_tokens")
+        },
+        "oldest_active_token_age": round((timezone.now() - oldest_active).total_seconds()) if oldest_active else None,
+        "failures_total": {reason: failures[failure_counter(reason)] for reason in InvalidReason.values},
+    }
+
+
+def add_mail_health(token_health: dict[str, Any]) -> dict[str, Any]:
+    """
+    Completes the report with the mail state of the current process.
+
+    The circuit breaker and the scheduler queue are per process, so they are never shared through the cache. The
+    "process" label tells which host and process they were read from.
+
+    Returns:
+        dict[str, Any]: The report. Its "status" is "degraded" if this process can't deliver login mails at the
+        moment.
+    """
+    queue_depth = get_queue_depth()
+    mail_available = mail_circuit_breaker.state == CircuitBreaker.CLOSED and (
+        queue_depth is None
+        or settings.SOLOMON_MAIL_MAX_QUEUE_DEPTH is None
+        or queue_depth < settings.SOLOMON_MAIL_MAX_QUEUE_DEPTH
+    )
+    return {
+        "status": "ok" if mail_available else "degraded",
+        **token_health,
+        "mail": {
+            "process": f"{socket.gethostname()}:{os.getpid()}",
+            "queue_depth": queue_depth,
+            "circuit_breaker": mail_circuit_breaker.state,
+        },
+    }
+
+
+def collect_health() -> dict[str, Any]:
+    """
+    Computes the health report of all shards and the current process, without the cache.
+    """
+    return add_mail_health(collect_token_health())
+
+
+def get_health() -> dict[str, Any]:
+    """
+    Returns the health report. The token activity is computed at most once per SOLOMON_HEALTH_CACHE_TIMEOUT seconds
+    and shared by all processes through the cache, the mail state is always the one of the current process.
+    """
+    cache = get_cache()
+    if (token_health := cache.get(CACHE_KEY)) is None:
+        token_health = collect_token_health()
+        cache.set(CACHE_KEY, token_health, timeout=settings.SOLOMON_HEALTH_CACHE_TIMEOUT)
+    return add_mail_health(token_health)
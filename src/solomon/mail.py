@@ -0,0 +1,373 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from django.core.mail import EmailMessage
+from django.db import close_old_connections
+from django.http import HttpRequest
+from django.utils.module_loading import import_string
+
+from solomon.conf import settings
+from solomon.models import MailPriority, SolomonToken
+
+logger = logging.getLogger(__name__)
+
+
+class MailUnavailable(Exception):  # noqa: N818
+    """
+    Raised if login mails can't be delivered at the moment.
+    """
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"Mail delivery is unavailable, retry after {retry_after} seconds.")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    In-process circuit breaker for the mail delivery.
+
+    The breaker is closed as long as mails are delivered. It remembers the outcome of the last
+    SOLOMON_MAIL_BREAKER_WINDOW deliveries, where calls slower than SOLOMON_MAIL_BREAKER_SLOW_CALL_DURATION seconds
+    count as failures. Once at least SOLOMON_MAIL_BREAKER_MINIMUM_CALLS were recorded and the failure rate reaches
+    SOLOMON_MAIL_BREAKER_FAILURE_RATE, the breaker opens and rejects all deliveries. After
+    SOLOMON_MAIL_BREAKER_OPEN_DURATION seconds it is half-open and lets a single probe through, which either closes
+    the breaker again or keeps it open for another period.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._outcomes: deque[bool] = deque()
+            self._opened_at: Optional[float] = None
+            self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._probing or self._is_due():
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def _is_due(self) -> bool:
+        return time.monotonic() - self._opened_at >= settings.SOLOMON_MAIL_BREAKER_OPEN_DURATION
+
+    def retry_after(self) -> int:
+        """
+        Returns the number of seconds until the breaker lets the next probe through.
+        """
+        if self._opened_at is None:
+            return 0
+        remaining = settings.SOLOMON_MAIL_BREAKER_OPEN_DURATION - (time.monotonic() - self._opened_at)
+        return max(1, round(remaining))
+
+    def before_call(self) -> None:
+        """
+        Checks whether a delivery may be attempted.
+
+        In the half-open state only one caller is let through. A probe that never records its outcome is given up
+        after another SOLOMON_MAIL_BREAKER_OPEN_DURATION seconds, so the breaker can't get stuck.
+
+        Raises:
+            MailUnavailable: If the breaker is open or a probe is in flight.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if self._is_due():
+                self._probing = True
+                self._opened_at = time.monotonic()
+                return
+        raise MailUnavailable(self.retry_after())
+
+    def record(self, duration: float, failed: bool) -> None:  # noqa: FBT001
+        """
+        Records the outcome of a delivery and opens or closes the breaker accordingly.
+
+        Args:
+            duration (float): The duration of the delivery in seconds.
+            failed (bool): Whether the delivery raised an exception.
+
+        Returns:
+            None
+        """
+        failed = failed or duration >= settings.SOLOMON_MAIL_BREAKER_SLOW_CALL_DURATION
+        with self._lock:
+            if self._probing:
+                self._probing = False
+                self._outcomes.clear()
+                self._opened_at = time.monotonic() if failed else None
+                return
+
+            self._outcomes.append(failed)
+            while len(self._outcomes) > settings.SOLOMON_MAIL_BREAKER_WINDOW:
+                self._outcomes.popleft()
+            if len(self._outcomes) >= settings.SOLOMON_MAIL_BREAKER_MINIMUM_CALLS:
+                failure_rate = sum(self._outcomes) / len(self._outcomes)
+                if failure_rate >= settings.SOLOMON_MAIL_BREAKER_FAILURE_RATE:
+                    self._outcomes.clear()
+                    self._opened_at = time.monotonic()
+
+
+mail_circuit_breaker = CircuitBreaker()
+
+
+class MailJob:
+    __slots__ = ("attempts", "domain", "message", "on_failure", "priority")
+
+    def __init__(
+        self, message: EmailMessage, domain: str, priority: int, on_failure: Optional[Callable[[], None]]
+    ) -> None:
+        self.message = message
+        self.domain = domain
+        self.priority = priority
+        self.on_failure = on_failure
+        self.attempts = 0
+
+
+class DomainQueue:
+    __slots__ = ("active", "jobs", "next_send", "scheduled")
+
+    def __init__(self) -> None:
+        self.jobs: dict[int, deque[MailJob]] = {priority: deque() for priority in MailPriority.values}
+        self.active = 0
+        self.next_send = 0.0
+        self.scheduled = False
+
+    def __len__(self) -> int:
+        return sum(map(len, self.jobs.values()))
+
+
+class MailScheduler:
+    """
+    In-process scheduler that delivers mails from SOLOMON_MAIL_SCHEDULER_WORKERS background threads.
+
+    Mails are queued per recipient domain and the domains with pending mails take turns in round-robin order, so a
+    single domain with thousands of mails doesn't delay the mails to all others. A domain is skipped while it has
+    SOLOMON_MAIL_DOMAIN_CONCURRENCY deliveries in flight or its SOLOMON_MAIL_DOMAIN_RATE is exhausted, and all
+    interactive mails are scheduled before any bulk mail. A failed delivery pauses its domain for
+    SOLOMON_MAIL_RETRY_DELAY seconds, because the provider is most likely throttling, and is retried up to
+    SOLOMON_MAIL_MAX_RETRIES times.
+
+    The workers are started with the first mail.
+    """
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._domains: dict[str, DomainQueue] = {}
+        # The domains with pending mails in round-robin order.
+        self._ring: deque[str] = deque()
+        self._pending = 0
+        self._active = 0
+        self._workers: list[threading.Thread] = []
+
+    def __len__(self) -> int:
+        """
+        Returns the number of mails waiting for delivery.
+        """
+        return self._pending
+
+    def submit(
+        self,
+        message: EmailMessage,
+        priority: int = MailPriority.INTERACTIVE,
+        on_failure: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """
+        Queues a mail for delivery.
+
+        Args:
+            message (EmailMessage): The mail, which must have a single recipient.
+            priority (int): The MailPriority of the mail.
+            on_failure (Optional[Callable[[], None]]): Called from the worker if the mail can't be delivered.
+
+        Returns:
+            None
+        """
+        domain = message.to[0].rpartition("@")[2].lower()
+        with self._condition:
+            self._start_workers()
+            self._enqueue(MailJob(message, domain, priority, on_failure))
+            self._condition.notify()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until all queued mails were delivered or given up.
+
+        Returns:
+            bool: False if the timeout passed before.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and not self._active, timeout)
+
+    def _start_workers(self) -> None:
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        while len(self._workers) < settings.SOLOMON_MAIL_SCHEDULER_WORKERS:
+            worker = threading.Thread(target=self._work, name="solomon-mail", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _enqueue(self, job: MailJob, front: bool = False) -> None:  # noqa: FBT001, FBT002
+        queue = self._domains.setdefault(job.domain, DomainQueue())
+        if front:
+            queue.jobs[job.priority].appendleft(job)
+        else:
+            queue.jobs[job.priority].append(job)
+        if not queue.scheduled:
+            queue.scheduled = True
+            self._ring.append(job.domain)
+        self._pending += 1
+
+    def _next_job(self) -> tuple[Optional[MailJob], Optional[float]]:
+        """
+        Takes the next deliverable mail from the queues.
+
+        Returns:
+            tuple[Optional[MailJob], Optional[float]]: The job, or None and the number of seconds until a rate limited
+            domain is ready again.
+        """
+        now = time.monotonic()
+        delay = None
+        for priority in MailPriority.values:
+            for _ in range(len(self._ring)):
+                domain = self._ring[0]
+                self._ring.rotate(-1)
+                queue = self._domains[domain]
+                if not queue.jobs[priority] or queue.active >= settings.SOLOMON_MAIL_DOMAIN_CONCURRENCY:
+                    continue
+                if queue.next_send > now:
+                    wait = queue.next_send - now
+                    delay = wait if delay is None else min(delay, wait)
+                    continue
+
+                job = queue.jobs[priority].popleft()
+                queue.active += 1
+                if settings.SOLOMON_MAIL_DOMAIN_RATE:
+                    queue.next_send = now + 1 / settings.SOLOMON_MAIL_DOMAIN_RATE
+                if not len(queue):
+                    # The domain was rotated to the end of the ring.
+                    self._ring.pop()
+                    queue.scheduled = False
+                self._pending -= 1
+                self._active += 1
+                return job, None
+        return None, delay
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                job, delay = self._next_job()
+                while job is None:
+                    self._condition.wait(delay)
+                    job, delay = self._next_job()
+            self._deliver(job)
+
+    def _deliver(self, job: MailJob) -> None:
+        start = time.monotonic()
+        try:
+            job.message.send()
+            failed = False
+        except Exception:
+            logger.warning("Delivery of a mail to %s failed.", job.domain, exc_info=True)
+            failed = True
+        if settings.SOLOMON_MAIL_CIRCUIT_BREAKER:
+            mail_circuit_breaker.record(time.monotonic() - start, failed=failed)
+
+        give_up = failed and job.attempts >= settings.SOLOMON_MAIL_MAX_RETRIES
+        try:
+            if give_up and job.on_failure is not None:
+                job.on_failure()
+        except Exception:
+            logger.exception("Handling the failed delivery of a mail to %s failed.", job.domain)
+        finally:
+            close_old_connections()
+
+        with self._condition:
+            queue = self._domains[job.domain]
+            queue.active -= 1
+            self._active -= 1
+            if failed and not give_up:
+                job.attempts += 1
+                queue.next_send = max(queue.next_send, time.monotonic() + settings.SOLOMON_MAIL_RETRY_DELAY)
+                self._enqueue(job, front=True)
+            elif not queue.active and not queue.scheduled:
+                # Idle domains are forgotten, so the rate limit only spaces mails that are queued at the same time.
+                del self._domains[job.domain]
+            self._condition.notify_all()
+
+
+mail_scheduler = MailScheduler()
+atexit.register(mail_scheduler.wait, timeout=10)
+
+
+def get_queue_depth() -> Optional[int]:
+    """
+    Returns the number of mails waiting for delivery, as reported by SOLOMON_MAIL_QUEUE_DEPTH_CALLBACK or else by the
+    mail scheduler.
+
+    Returns:
+        Optional[int]: The queue depth, or None if neither a callback nor SOLOMON_MAIL_SCHEDULER is configured.
+    """
+    if settings.SOLOMON_MAIL_QUEUE_DEPTH_CALLBACK:
+        return import_string(settings.SOLOMON_MAIL_QUEUE_DEPTH_CALLBACK)()
+    if settings.SOLOMON_MAIL_SCHEDULER:
+        return len(mail_scheduler)
+    return None
+
+
+def check_mail_available() -> None:
+    """
+    Checks that a login mail can be delivered, before a token is created for it.
+
+    Raises:
+        MailUnavailable: If the mail queue is full or the circuit breaker rejects deliveries.
+    """
+    if settings.SOLOMON_MAIL_MAX_QUEUE_DEPTH is not None:
+        depth = get_queue_depth()
+        if depth is not None and depth >= settings.SOLOMON_MAIL_MAX_QUEUE_DEPTH:
+            raise MailUnavailable(settings.SOLOMON_MAIL_UNAVAILABLE_RETRY_AFTER)
+
+    if settings.SOLOMON_MAIL_CIRCUIT_BREAKER:
+        mail_circuit_breaker.before_call()
+
+
+def send_token_email(token: SolomonToken, request: HttpRequest) -> None:
+    """
+    Sends the login mail of the token and records the outcome in the circuit breaker.
+
+    The availability must have been checked with check_mail_available before. If the delivery fails, the token is
+    disabled, because its link never reached the user. With SOLOMON_MAIL_SCHEDULER enabled, the mail is only queued
+    here and the scheduler records the outcome of the delivery.
+
+    Args:
+        token (SolomonToken): The token to send.
+        request (HttpRequest): The request that created the token.
+
+    Raises:
+        MailUnavailable: If the circuit breaker is enabled and the delivery failed.
+    """
+    if not settings.SOLOMON_MAIL_CIRCUIT_BREAKER or settings.SOLOMON_MAIL_SCHEDULER:
+        token.send_email(request)
+        return
+
+    start = time.monotonic()
+    try:
+        token.send_email(request)
+    except Exception as e:
+        mail_circuit_breaker.record(time.monotonic() - start, failed=True)
+        token.disable()
+        raise MailUnavailable(
+            mail_circuit_breaker.retry_after() or settings.SOLOMON_MAIL_UNAVAILABLE_RETRY_AFTER
+        ) from e
+    mail_circuit_breaker.record(time.monotonic() - start, failed=False)
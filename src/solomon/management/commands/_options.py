@@ -0,0 +1,61 @@
+from argparse import ArgumentParser, ArgumentTypeError
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from solomon.models import SolomonTokenQuerySet
+
+
+def aware_datetime(value: str, *, end_of_day: bool = False) -> datetime:
+    """
+    Parses an ISO 8601 date or datetime command line option into an aware datetime.
+
+    A bare date is the start of the day, or its last microsecond if end_of_day is set.
+
+    Raises:
+        ArgumentTypeError: If the value is neither a date nor a datetime.
+    """
+    # parse_datetime() accepts bare dates as well on newer Pythons, so they are parsed first.
+    if (date := parse_date(value)) is not None:
+        parsed = datetime.combine(date, time.max if end_of_day else time.min)
+    else:
+        parsed = parse_datetime(value)
+    if parsed is None:
+        raise ArgumentTypeError(f"'{value}' is not a valid ISO 8601 date or datetime.")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def aware_end_datetime(value: str) -> datetime:
+    """
+    Parses an inclusive upper bound, so a bare date includes the whole day.
+    """
+    return aware_datetime(value, end_of_day=True)
+
+
+def add_token_filter_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument(
+        "--domain",
+        action="append",
+        dest="domains",
+        default=[],
+        help="Only include tokens for this email domain. Can be given multiple times.",
+    )
+    parser.add_argument(
+        "--created-after",
+        type=aware_datetime,
+        help="Only include tokens created at or after this ISO 8601 date or datetime.",
+    )
+    parser.add_argument(
+        "--created-before",
+        type=aware_end_datetime,
+        help="Only include tokens created at or before this ISO 8601 date or datetime. A date includes the whole day.",
+    )
+
+
+def filter_tokens(queryset: SolomonTokenQuerySet, options: dict) -> SolomonTokenQuerySet:
+    if options["domains"]:
+        queryset = queryset.for_domains(options["domains"])
+    return queryset.created_between(options["created_after"], options["created_before"])
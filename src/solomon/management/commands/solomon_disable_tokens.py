@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from solomon.management.commands._options import add_token_filter_arguments, filter_tokens
+from solomon.models import SolomonToken
+from solomon.sharding import for_each_shard
+from solomon.utils import NetworkSet
+
+
+class Command(BaseCommand):
+    help = "Disables all active tokens matching an email domain, an IP network or a creation window."
+
+    def add_arguments(self, parser):
+        add_token_filter_arguments(parser)
+        parser.add_argument(
+            "--network",
+            action="append",
+            dest="networks",
+            default=[],
+            help="Only include tokens with an IP address in this CIDR network. Can be given multiple times.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="The maximum number of tokens disabled by a single UPDATE. Default: 1000.",
+        )
+
+    def handle(self, *args, **options):  # noqa: ARG002
+        if not any((options["domains"], options["networks"], options["created_after"], options["created_before"])):
+            raise CommandError("Provide at least one of --domain, --network, --created-after or --created-before.")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be a positive number.")
+
+        try:
+            NetworkSet(options["networks"])
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+
+        def disable(alias: str) -> int:
+            queryset = filter_tokens(SolomonToken.objects.using(alias), options)
+            return queryset.bulk_disable(networks=options["networks"], chunk_size=options["chunk_size"])
+
+        disabled = sum(for_each_shard(disable))
+        self.stdout.write(self.style.SUCCESS(f"Disabled {disabled} token(s)."))
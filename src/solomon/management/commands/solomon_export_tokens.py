@@ -0,0 +1,67 @@
+import gzip
+import sys
+from itertools import chain
+
+from django.core.management.base import BaseCommand, CommandError
+
+from solomon.export import EXPORT_FORMATS, iter_token_rows
+from solomon.management.commands._options import add_token_filter_arguments, filter_tokens
+from solomon.models import SolomonToken, TokenStatus
+from solomon.sharding import get_shards
+
+
+class Command(BaseCommand):
+    help = "Streams the issuance and consumption history of the tokens as CSV or JSON Lines."
+
+    def add_arguments(self, parser):
+        add_token_filter_arguments(parser)
+        parser.add_argument(
+            "--status",
+            choices=TokenStatus.values,
+            help="Only include tokens with this status.",
+        )
+        parser.add_argument(
+            "--format",
+            choices=sorted(EXPORT_FORMATS),
+            default="csv",
+            help="The output format. Default: csv.",
+        )
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="The file to write to. Default: stdout.",
+        )
+        parser.add_argument(
+            "--gzip",
+            action="store_true",
+            help="Compress the output with gzip.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="The number of rows fetched from the database at once. Default: 2000.",
+        )
+
+    def handle(self, *args, **options):  # noqa: ARG002
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be a positive number.")
+
+        querysets = [filter_tokens(SolomonToken.objects.using(alias), options) for alias in get_shards()]
+        if options["status"]:
+            querysets = [queryset.with_status(options["status"]) for queryset in querysets]
+
+        chunk_size = options["chunk_size"]
+        rows = chain.from_iterable(iter_token_rows(queryset, chunk_size=chunk_size) for queryset in querysets)
+        lines = EXPORT_FORMATS[options["format"]](rows)
+
+        if options["gzip"]:
+            target = sys.stdout.buffer if options["output"] == "-" else options["output"]
+            with gzip.open(target, "wt", encoding="utf-8", newline="") as stream:
+                stream.writelines(lines)
+        elif options["output"] == "-":
+            for line in lines:
+                self.stdout.write(line, ending="")
+        else:
+            with open(options["output"], "w", encoding="utf-8", newline="") as stream:
+                stream.writelines(lines)
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from solomon.models import SolomonDevice, SolomonToken
+from solomon.sharding import for_each_shard
+
+
+class Command(BaseCommand):
+    help = "Deletes tokens that expired a while ago and expired remembered devices. All shards are purged in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=24 * 60 * 60,
+            help="Only delete tokens that expired at least this many seconds ago. Default: 86400.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="The maximum number of tokens deleted by a single DELETE. Default: 1000.",
+        )
+
+    def handle(self, *args, **options):  # noqa: ARG002
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be a positive number.")
+
+        cutoff = timezone.now() - timedelta(seconds=options["older_than"])
+
+        def purge(alias: str) -> int:
+            queryset = SolomonToken.objects.using(alias).filter(expiry_date__lt=cutoff)
+            deleted = 0
+            while pks := list(queryset.order_by("pk").values_list("pk", flat=True)[: options["chunk_size"]]):
+                deleted += SolomonToken.objects.using(alias).filter(pk__in=pks).delete()[0]
+            return deleted
+
+        deleted = sum(for_each_shard(purge))
+        devices = SolomonDevice.objects.purge_expired(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} token(s) and {devices} expired device(s)."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from solomon.management.commands._options import aware_datetime
+from solomon.stats import rollup_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Adds the token activity of the complete hours since the last run to the hourly token statistics. Run it "
+        "regularly, e.g. every hour, and more often than solomon_purge_tokens."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--until",
+            type=aware_datetime,
+            help="Only roll up the hours before this ISO 8601 date or datetime. Default: now.",
+        )
+
+    def handle(self, *args, **options):  # noqa: ARG002
+        hours = rollup_stats(options["until"])
+        self.stdout.write(self.style.SUCCESS(f"Updated {hours} hour(s)."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from solomon.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads the templates, settings, mail backend and urls of solomon and validates the settings. Shows how long "
+        "the first login of a new process would wait for them."
+    )
+
+    def handle(self, *args, **options):  # noqa: ARG002
+        timings = warm_up()
+        for name, duration in timings.items():
+            self.stdout.write(f"{name}: {duration * 1000:.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"Warmed up in {sum(timings.values()) * 1000:.1f} ms."))
@@ -0,0 +1,71 @@
+from typing import Iterable
+
+from solomon.conf import settings
+from solomon.utils import get_cache
+
+VERIFY_BURN_PREVENTED = "verify_burn_prevented"
+
+
+def _key(name: str) -> str:
+    return f"solomon:metrics:{name}"
+
+
+def increment(name: str, delta: int = 1) -> None:
+    """
+    Increments a counter shared by all processes through the cache configured by SOLOMON_CACHE_ALIAS.
+
+    Args:
+        name (str): The name of the counter.
+        delta (int): The value to add to the counter.
+
+    Returns:
+        None
+    """
+    cache = get_cache()
+    key = _key(name)
+    if cache.add(key, delta, timeout=None):
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, timeout=None)
+
+
+def get_counter(name: str) -> int:
+    """
+    Returns the current value of a counter.
+
+    Args:
+        name (str): The name of the counter.
+
+    Returns:
+        int: The value of the counter, or 0 if it was never incremented or has been evicted.
+    """
+    return get_cache().get(_key(name), 0)
+
+
+def get_counters(names: Iterable[str]) -> dict[str, int]:
+    """
+    Returns the current values of several counters with a single cache lookup.
+
+    Args:
+        names (Iterable[str]): The names of the counters.
+
+    Returns:
+        dict[str, int]: The value of every counter, 0 for counters that were never incremented or have been evicted.
+    """
+    keys = {_key(name): name for name in names}
+    values = get_cache().get_many(keys)
+    return {name: values.get(key, 0) for key, name in keys.items()}
+
+
+def failure_counter(reason: str) -> str:
+    return f"failure:{reason}"
+
+
+def count_failure(sender, reason: str = "", **kwargs) -> None:  # noqa: ARG001
+    """
+    Receiver of the token_event signal that counts failed verifications per reason for the health view.
+    """
+    if settings.SOLOMON_HEALTH_VIEW and reason:
+        increment(failure_counter(reason))
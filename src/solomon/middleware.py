@@ -0,0 +1,21 @@
+from typing import Callable
+
+from django.http import HttpRequest, HttpResponse
+
+from solomon.utils import get_ip_address
+
+
+class ClientIPMiddleware:
+    """
+    Resolves the client IP address once per request.
+
+    The result is stored on the request, so the login view, the token validation and everything else in solomon read
+    the cached value instead of parsing the proxy headers again.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        get_ip_address(request)
+        return self.get_response(request)
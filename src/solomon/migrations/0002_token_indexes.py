@@ -0,0 +1,38 @@
+# Generated by Django 5.1.15 on 2026-10-19 17:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solomon', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='solomontoken',
+            name='consumed_at',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='solomontoken',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='solomontoken',
+            name='disabled_at',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='solomontoken',
+            name='email',
+            field=models.EmailField(db_index=True, max_length=254),
+        ),
+        migrations.AlterField(
+            model_name='solomontoken',
+            name='expiry_date',
+            field=models.DateTimeField(db_index=True, editable=False),
+        ),
+    ]
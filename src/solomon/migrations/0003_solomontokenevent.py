@@ -0,0 +1,27 @@
+# Generated by Django 5.1.15 on 2026-10-19 18:03
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solomon', '0002_token_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolomonTokenEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token_pk', models.BigIntegerField(db_index=True, null=True)),
+                ('email', models.EmailField(max_length=254)),
+                ('event', models.CharField(choices=[('issue', 'Issue'), ('verify', 'Verify'), ('fail', 'Fail'), ('consume', 'Consume')], max_length=16)),
+                ('reason', models.CharField(blank=True, choices=[('disabled', 'Disabled'), ('consumed', 'Consumed'), ('expired', 'Expired'), ('ip_mismatch', 'IP address mismatch'), ('browser_mismatch', 'Browser mismatch')], max_length=32)),
+                ('ip_address', models.GenericIPAddressField(null=True)),
+                ('user_agent', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
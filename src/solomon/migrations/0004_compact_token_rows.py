@@ -0,0 +1,132 @@
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import solomon.fields
+
+
+def _hash(value):
+    return hashlib.blake2b(value.encode(), digest_size=16).digest()
+
+
+def compact_tokens(apps, schema_editor):
+    SolomonRedirect = apps.get_model("solomon", "SolomonRedirect")
+    SolomonToken = apps.get_model("solomon", "SolomonToken")
+    db_alias = schema_editor.connection.alias
+
+    for url in SolomonToken.objects.using(db_alias).values_list("redirect_url", flat=True).distinct():
+        redirect = SolomonRedirect.objects.using(db_alias).create(url=url, url_hash=_hash(url).hex())
+        SolomonToken.objects.using(db_alias).filter(redirect_url=url).update(redirect=redirect)
+
+    tokens = SolomonToken.objects.using(db_alias).only("ip_address", "cookie_value")
+    for token in tokens.iterator(chunk_size=2000):
+        token.ip_packed = token.ip_address
+        # Only tokens that are bound to a browser need the digest of their cookie.
+        token.cookie_digest = _hash(token.cookie_value) if token.cookie_value else None
+        token.save(update_fields=["ip_packed", "cookie_digest"])
+
+
+def expand_tokens(apps, schema_editor):
+    SolomonRedirect = apps.get_model("solomon", "SolomonRedirect")
+    SolomonToken = apps.get_model("solomon", "SolomonToken")
+    db_alias = schema_editor.connection.alias
+
+    for redirect in SolomonRedirect.objects.using(db_alias).iterator():
+        SolomonToken.objects.using(db_alias).filter(redirect=redirect).update(redirect_url=redirect.url)
+
+    tokens = SolomonToken.objects.using(db_alias).only("ip_packed")
+    for token in tokens.iterator(chunk_size=2000):
+        token.ip_address = token.ip_packed
+        # The cookie values can't be restored from their digests, so bound tokens no longer match any browser.
+        token.cookie_value = "-" if token.cookie_digest else ""
+        token.save(update_fields=["ip_address", "cookie_value"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("solomon", "0003_solomontokenevent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SolomonRedirect",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("url", models.TextField()),
+                ("url_hash", models.CharField(max_length=32, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="solomontoken",
+            name="redirect",
+            field=models.ForeignKey(
+                db_index=False,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="solomon.solomonredirect",
+            ),
+        ),
+        migrations.AddField(
+            model_name="solomontoken",
+            name="ip_packed",
+            field=solomon.fields.PackedIPAddressField(null=True),
+        ),
+        migrations.AddField(
+            model_name="solomontoken",
+            name="cookie_digest",
+            field=models.BinaryField(editable=False, max_length=16, null=True),
+        ),
+        # The old columns are relaxed first, so they can be re-added empty when the migration is reversed.
+        migrations.AlterField(
+            model_name="solomontoken",
+            name="cookie_value",
+            field=models.CharField(default="", editable=False, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name="solomontoken",
+            name="redirect_url",
+            field=models.TextField(default=""),
+        ),
+        migrations.AlterField(
+            model_name="solomontoken",
+            name="ip_address",
+            field=models.GenericIPAddressField(null=True),
+        ),
+        migrations.RunPython(compact_tokens, expand_tokens),
+        migrations.RemoveField(
+            model_name="solomontoken",
+            name="cookie_value",
+        ),
+        migrations.RemoveField(
+            model_name="solomontoken",
+            name="redirect_url",
+        ),
+        migrations.RemoveField(
+            model_name="solomontoken",
+            name="ip_address",
+        ),
+        migrations.RenameField(
+            model_name="solomontoken",
+            old_name="ip_packed",
+            new_name="ip_address",
+        ),
+        migrations.AlterField(
+            model_name="solomontoken",
+            name="ip_address",
+            field=solomon.fields.PackedIPAddressField(),
+        ),
+        migrations.AlterField(
+            model_name="solomontoken",
+            name="redirect",
+            field=models.ForeignKey(
+                db_index=False,
+                editable=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="solomon.solomonredirect",
+            ),
+        ),
+    ]
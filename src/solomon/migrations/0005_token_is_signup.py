@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-19 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solomon', '0004_compact_token_rows'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solomontoken',
+            name='is_signup',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+from django.db.models.functions import Lower, Trim
+
+
+def normalize_emails(apps, schema_editor):
+    SolomonToken = apps.get_model("solomon", "SolomonToken")
+    normalized = Lower(Trim("email"))
+    SolomonToken.objects.using(schema_editor.connection.alias).exclude(email=normalized).update(email=normalized)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("solomon", "0005_token_is_signup"),
+    ]
+
+    operations = [
+        # Tokens are looked up by their normalized email address, so the plain index on email is enough and no
+        # functional index on Lower("email") is needed.
+        migrations.RunPython(normalize_emails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.15 on 2026-10-19 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solomon', '0007_solomondevice'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solomontoken',
+            name='code_hash',
+            field=models.CharField(default='', editable=False, max_length=32),
+        ),
+        migrations.AddIndex(
+            model_name='solomontoken',
+            index=models.Index(fields=['email', 'code_hash'], name='solomon_token_code_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.15 on 2026-10-19 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solomon', '0008_token_login_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolomonStatsWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128, unique=True)),
+                ('value', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SolomonTokenStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(unique=True)),
+                ('issued', models.PositiveBigIntegerField(default=0)),
+                ('consumed', models.PositiveBigIntegerField(default=0)),
+                ('disabled', models.PositiveBigIntegerField(default=0)),
+                ('expired', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'token statistics',
+                'verbose_name_plural': 'token statistics',
+            },
+        ),
+    ]
@@ -1,31 +1,235 @@
+import hashlib
+import hmac
 import re
-from datetime import timedelta
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
 
-from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
-from django.db import models
+from django.db import models, router, transaction
 from django.http import HttpRequest
-from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.crypto import get_random_string
+from django.utils.translation import gettext_lazy as _
 
 from solomon.conf import settings
-from solomon.utils import anonymize_ip, get_ip_address
+from solomon.fields import PackedIPAddressField
+from solomon.profiling import span
+from solomon.sharding import get_shard, get_shard_index, get_shards, is_sharded
+from solomon.signals import token_event
+from solomon.utils import (
+    NetworkSet,
+    anonymize_ip,
+    get_user_by_email,
+    get_cache,
+    get_ip_address,
+    normalize_email,
+    normalize_ip,
+)
 
-User = get_user_model()
+
+class TokenStatus(models.TextChoices):
+    ACTIVE = "active", _("Active")
+    CONSUMED = "consumed", _("Consumed")
+    DISABLED = "disabled", _("Disabled")
+    EXPIRED = "expired", _("Expired")
+
+
+class InvalidReason(models.TextChoices):
+    DISABLED = "disabled", _("Disabled")
+    CONSUMED = "consumed", _("Consumed")
+    EXPIRED = "expired", _("Expired")
+    IP_MISMATCH = "ip_mismatch", _("IP address mismatch")
+    BROWSER_MISMATCH = "browser_mismatch", _("Browser mismatch")
+
+
+class TokenEventType(models.TextChoices):
+    ISSUE = "issue", _("Issue")
+    VERIFY = "verify", _("Verify")
+    FAIL = "fail", _("Fail")
+    CONSUME = "consume", _("Consume")
+
+
+class MailPriority(models.IntegerChoices):
+    INTERACTIVE = 0, _("Interactive")
+    BULK = 1, _("Bulk")
+
+
+class SolomonTokenQuerySet(models.QuerySet):
+    def active(self) -> "SolomonTokenQuerySet":
+        return self.filter(consumed_at__isnull=True, disabled_at__isnull=True, expiry_date__gt=timezone.now())
+
+    def consumed(self) -> "SolomonTokenQuerySet":
+        return self.filter(consumed_at__isnull=False)
+
+    def disabled(self) -> "SolomonTokenQuerySet":
+        return self.filter(disabled_at__isnull=False)
+
+    def expired(self) -> "SolomonTokenQuerySet":
+        return self.filter(consumed_at__isnull=True, disabled_at__isnull=True, expiry_date__lte=timezone.now())
+
+    def with_status(self, status: str) -> "SolomonTokenQuerySet":
+        """
+        Filters the tokens by one of the values of TokenStatus.
+
+        Args:
+            status (str): The status to filter by.
+
+        Returns:
+            SolomonTokenQuerySet: The filtered queryset.
+        """
+        return {
+            TokenStatus.ACTIVE: self.active,
+            TokenStatus.CONSUMED: self.consumed,
+            TokenStatus.DISABLED: self.disabled,
+            TokenStatus.EXPIRED: self.expired,
+        }[TokenStatus(status)]()
+
+    def for_domains(self, domains: Iterable[str]) -> "SolomonTokenQuerySet":
+        """
+        Filters the tokens by the domain of their email address.
+
+        Args:
+            domains (Iterable[str]): The email domains, e.g. "example.com".
+
+        Returns:
+            SolomonTokenQuerySet: The filtered queryset.
+        """
+        query = models.Q()
+        for domain in domains:
+            query |= models.Q(email__endswith=f"@{domain.strip().lower()}")
+        return self.filter(query)
+
+    def created_between(
+        self, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> "SolomonTokenQuerySet":
+        """
+        Filters the tokens by their creation date. Both bounds are optional and inclusive.
+
+        Returns:
+            SolomonTokenQuerySet: The filtered queryset.
+        """
+        queryset = self
+        if start is not None:
+            queryset = queryset.filter(created_at__gte=start)
+        if end is not None:
+            queryset = queryset.filter(created_at__lte=end)
+        return queryset
+
+    def bulk_disable(self, networks: Optional[Iterable[str]] = None, chunk_size: int = 1000) -> int:
+        """
+        Disables all active tokens of the queryset.
+
+        The tokens are disabled in chunks of primary keys with one UPDATE per chunk, so the table is never locked for
+        the whole operation. IP networks can't be matched portably in SQL, so they are matched per chunk in Python.
+
+        Args:
+            networks (Optional[Iterable[str]]): Only disable tokens with an IP address in one of these networks.
+            chunk_size (int): The maximum number of tokens updated by a single UPDATE.
+
+        Returns:
+            int: The number of disabled tokens.
+        """
+        network_set = NetworkSet(networks) if networks else None
+        queryset = self.active().order_by("pk")
+        manager = self.model._default_manager.db_manager(self.db)
+
+        disabled = 0
+        last_pk = 0
+        while rows := list(queryset.filter(pk__gt=last_pk).values_list("pk", "ip_address")[:chunk_size]):
+            last_pk = rows[-1][0]
+            pks = [pk for pk, ip_address in rows if network_set is None or ip_address in network_set]
+            if pks:
+                disabled += manager.filter(pk__in=pks).active().update(disabled_at=timezone.now())
+        return disabled
+
+
+class SolomonTokenManager(models.Manager.from_queryset(SolomonTokenQuerySet)):
+    def get_queryset(self) -> SolomonTokenQuerySet:
+        return super().get_queryset().select_related("redirect")
+
+    def for_email(self, email: str) -> SolomonTokenQuerySet:
+        """
+        Returns the tokens on the shard owning the email address.
+        """
+        return self.using(get_shards()[get_shard_index(email)])
+
+    def for_shard(self, index: Optional[int]) -> SolomonTokenQuerySet:
+        """
+        Returns the tokens on the shard with the given index, or no tokens for an unknown index.
+        """
+        if (alias := get_shard(index)) is None:
+            return self.none()
+        return self.using(alias)
+
+
+def hash_value(value: str) -> bytes:
+    """
+    Returns the 16 byte BLAKE2b digest of the value.
+    """
+    return hashlib.blake2b(value.encode(), digest_size=16).digest()
+
+
+class SolomonRedirectManager(models.Manager):
+    def resolve(self, url: str) -> int:
+        """
+        Returns the primary key of the row storing the URL, creating the row if necessary.
+
+        Tokens nearly always redirect to one of a handful of URLs, so the primary keys are cached.
+
+        Args:
+            url (str): The redirect URL.
+
+        Returns:
+            int: The primary key of the SolomonRedirect.
+        """
+        url_hash = hash_value(url).hex()
+        key = f"solomon:redirect:{self.db}:{url_hash}"
+        if (pk := get_cache().get(key)) is None:
+            pk = self.get_or_create(url_hash=url_hash, defaults={"url": url})[0].pk
+            # The row might still be rolled back, so it is only cached once it is committed.
+            transaction.on_commit(lambda: get_cache().set(key, pk, None), using=self.db)
+        return pk
+
+
+class SolomonRedirect(models.Model):
+    url = models.TextField()
+    url_hash = models.CharField(max_length=32, unique=True)
+
+    objects = SolomonRedirectManager()
+
+    def __str__(self) -> str:
+        return self.url
 
 
 class SolomonToken(models.Model):
-    email = models.EmailField()
-    redirect_url = models.TextField()
-    ip_address = models.GenericIPAddressField()
-    expiry_date = models.DateTimeField(editable=False)
+    email = models.EmailField(db_index=True)
+    # Stored in the SolomonRedirect lookup table, use the redirect_url property instead.
+    redirect = models.ForeignKey(
+        SolomonRedirect, on_delete=models.PROTECT, db_index=False, editable=False, related_name="+"
+    )
+    ip_address = PackedIPAddressField()
+    expiry_date = models.DateTimeField(editable=False, db_index=True)
     token_string = models.CharField(max_length=128, editable=False)
-    cookie_value = models.CharField(max_length=64, editable=False)
-    consumed_at = models.DateTimeField(null=True, editable=True)
-    disabled_at = models.DateTimeField(null=True, editable=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Only the digest of the cookie is stored and only if SOLOMON_REQUIRE_SAME_BROWSER is enabled.
+    cookie_digest = models.BinaryField(max_length=16, null=True, editable=False)
+    # The user of a signup token is only created when the token is verified.
+    is_signup = models.BooleanField(default=False, editable=False)
+    # Only the digest of the one-time code is stored and only if SOLOMON_LOGIN_CODE is enabled.
+    code_hash = models.CharField(max_length=32, default="", editable=False)
+    consumed_at = models.DateTimeField(null=True, editable=True, db_index=True)
+    disabled_at = models.DateTimeField(null=True, editable=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    objects = SolomonTokenManager()
+
+    class Meta:
+        indexes = [models.Index(fields=["email", "code_hash"], name="solomon_token_code_idx")]
+
+    # The plain cookie value and code are never stored. They are only known right after creating the token.
+    cookie_value = ""
+    code = ""
+    _redirect_url = None
+    _redirect_url_changed = False
 
     def __str__(self) -> str:
         return f"{self.email} - {self.expiry_date}"
@@ -35,8 +239,15 @@ class SolomonToken(models.Model):
         Overrides the save method to set the cookie value and expiry date for new instances.
 
         If the instance is being created (i.e., it does not have a primary key yet):
+        - Normalizes the email address with normalize_email.
         - Sets the expiry date based on the current time plus the SOLOMON_MAX_TOKEN_LIFETIME
           setting.
+        - If SOLOMON_LOGIN_CODE is enabled, generates the one-time code that can be entered instead of clicking the
+          link.
+        - If SOLOMON_SHARDS is set, stores the token on the shard owning its email address, regardless of the
+          database passed by the caller.
+
+        The redirect URL is stored in the SolomonRedirect table of the same database whenever it has changed.
 
         Args:
             *args: Variable length argument list. **kwargs: Arbitrary keyword arguments.
@@ -45,49 +256,99 @@ class SolomonToken(models.Model):
             None
         """
         if not self.pk:
+            self.email = normalize_email(self.email)
             self.expiry_date = timezone.now() + timedelta(seconds=settings.SOLOMON_MAX_TOKEN_LIFETIME)
             self.token_string = get_random_string(128)
             if settings.SOLOMON_REQUIRE_SAME_BROWSER:
                 self.cookie_value = get_random_string(64)
+                self.cookie_digest = hash_value(self.cookie_value)
+            if settings.SOLOMON_LOGIN_CODE:
+                self.code = get_random_string(settings.SOLOMON_LOGIN_CODE_LENGTH, allowed_chars="0123456789")
+                self.code_hash = hash_value(self.code).hex()
             if self.ip_address and settings.SOLOMON_ANONYMIZE_IP_ADDRESS:
                 self.ip_address = anonymize_ip(self.ip_address)
+            if is_sharded():
+                kwargs["using"] = get_shards()[get_shard_index(self.email)]
+
+        if not self.redirect_id or self._redirect_url_changed:
+            using = kwargs.get("using") or router.db_for_write(self.__class__, instance=self)
+            # Assigned by primary key, because the related instance may live on another shard than the default one.
+            self.redirect_id = SolomonRedirect.objects.db_manager(using).resolve(self.redirect_url)
+            self._redirect_url_changed = False
 
         return super().save(*args, **kwargs)
 
-    def send_email(self, request: HttpRequest) -> None:
+    @property
+    def redirect_url(self) -> str:
+        """
+        The URL the user is redirected to after a successful login.
+        """
+        if self._redirect_url is None:
+            self._redirect_url = self.redirect.url if self.redirect_id else ""
+        return self._redirect_url
+
+    @redirect_url.setter
+    def redirect_url(self, url: str) -> None:
+        self._redirect_url = url
+        self._redirect_url_changed = True
+
+    def send_email(self, request: HttpRequest, priority: int = MailPriority.INTERACTIVE) -> None:
         """
-        Sends a verification email to the user if the request is valid.
+        Sends a verification email to the user if the request is valid, apart from the browser binding.
 
         This method constructs the email subject, text content, and HTML content
         using predefined templates and context data. It then sends the email
-        using Django's send_mail function.
+        using Django's send_mail function. Signup tokens use the SOLOMON_SIGNUP_EMAIL_* templates.
+
+        If SOLOMON_MAIL_SCHEDULER is enabled, the email is queued for the mail scheduler instead and the token is
+        disabled if it can't be delivered.
 
         Args:
             request (HttpRequest): The HTTP request object containing the necessary
                                    data to validate and generate the email content.
+            priority (int): The MailPriority of the email in the mail scheduler. Invitations and other mails nobody
+                is waiting for should be sent with MailPriority.BULK.
 
         Returns:
             None
         """
-        if not self.is_valid(request):
+        from django.core.mail import EmailMultiAlternatives, send_mail
+        from django.template.loader import render_to_string
+
+        # The browser binding can't be checked here, the cookie is only set by the response to this request.
+        if not self.is_valid(request, check_browser=False):
             return
 
         context = {
             "verify_url": self.get_verify_url(request),
             "expiry_date": self.expiry_date,
+            "code": self.code,
         }
-        subject = render_to_string(settings.SOLOMON_EMAIL_SUBJECT_TEMPLATE, context=context)
-        subject = re.sub(r"\s+", " ", subject)
-        text_content = render_to_string(settings.SOLOMON_EMAIL_TXT_TEMPLATE, context=context)
-        html_content = render_to_string(settings.SOLOMON_EMAIL_HTML_TEMPLATE, context=context)
-
-        send_mail(
-            subject.strip(),
-            text_content.strip(),
-            settings.DEFAULT_FROM_EMAIL,
-            [self.email],
-            html_message=html_content.strip(),
-        )
+        prefix = "SOLOMON_SIGNUP_EMAIL" if self.is_signup else "SOLOMON_EMAIL"
+        with span("solomon.send_email.render"):
+            subject = render_to_string(getattr(settings, f"{prefix}_SUBJECT_TEMPLATE"), context=context)
+            subject = re.sub(r"\s+", " ", subject)
+            text_content = render_to_string(getattr(settings, f"{prefix}_TXT_TEMPLATE"), context=context)
+            html_content = render_to_string(getattr(settings, f"{prefix}_HTML_TEMPLATE"), context=context)
+
+        if settings.SOLOMON_MAIL_SCHEDULER:
+            from solomon.mail import mail_scheduler
+
+            message = EmailMultiAlternatives(
+                subject.strip(), text_content.strip(), settings.DEFAULT_FROM_EMAIL, [self.email]
+            )
+            message.attach_alternative(html_content.strip(), "text/html")
+            mail_scheduler.submit(message, priority=priority, on_failure=self.disable)
+            return
+
+        with span("solomon.send_email.deliver"):
+            send_mail(
+                subject.strip(),
+                text_content.strip(),
+                settings.DEFAULT_FROM_EMAIL,
+                [self.email],
+                html_message=html_content.strip(),
+            )
 
     def get_verify_url(self, request: HttpRequest) -> str:
         """
@@ -96,80 +357,227 @@ class SolomonToken(models.Model):
         Returns:
             str: The URL to verify the token.
         """
-        url = reverse("solomon:verify", kwargs={"pk": self.pk, "token_string": self.token_string})
+        kwargs = {"pk": self.pk, "token_string": self.token_string}
+        if is_sharded():
+            kwargs["shard"] = self.shard
+        url = reverse("solomon:verify", kwargs=kwargs)
         return request.build_absolute_uri(url)
 
+    @property
+    def shard(self) -> int:
+        """
+        The index of the shard the token is stored on.
+        """
+        return get_shards().index(self._state.db) if self._state.db in get_shards() else 0
+
     def get_user(self):
         """
-        Retrieves the User object that matches the email of the current instance.
+        Retrieves the User object that matches the email of the current instance, ignoring the case of the stored
+        email address of the user.
 
         Returns:
             User: The User object with a matching email, or None if no match is found.
         """
-        return User.objects.filter(email=self.email).first()
+        return get_user_by_email(self.email)
 
-    def is_valid(self, request: HttpRequest) -> bool:
+    def get_invalid_reason(self, request: HttpRequest, *, check_browser: bool = True) -> Optional[str]:
         """
-        Validates the current object based on the request.
+        Determines why the token can't be used for the request, without changing the token.
 
         This method performs several checks to determine if the current object is valid:
-        1. Checks if the current time is past the expiry date.
-        2. If SOLOMON_REQUIRE_SAME_IP is enabled, it verifies that the IP address of the request matches the stored IP
+        1. Checks if the token has already been disabled or consumed.
+        2. Checks if the current time is past the expiry date.
+        3. If SOLOMON_REQUIRE_SAME_IP is enabled, it verifies that the IP address of the request matches the stored IP
            address.
-        3. If SOLOMON_REQUIRE_SAME_BROWSER is enabled, it verifies that the browser cookie value matches the stored
+        4. If SOLOMON_REQUIRE_SAME_BROWSER is enabled, it verifies that the browser cookie value matches the stored
            cookie value.
 
-        If any of these checks fail, the object is disabled and the method returns False.
-
         Args:
             request (HttpRequest): The HTTP request to validate against.
+            check_browser (bool): Whether to check the browser cookie.
 
         Returns:
-            bool: True if the object is valid, False otherwise.
+            Optional[str]: The InvalidReason of the first failed check, or None if the token is valid.
         """
         if self.disabled_at:
-            return False
+            return InvalidReason.DISABLED
 
         if self.consumed_at:
-            return False
+            return InvalidReason.CONSUMED
 
         if timezone.now() > self.expiry_date:
-            self.disable()
-            return False
+            return InvalidReason.EXPIRED
 
         if settings.SOLOMON_REQUIRE_SAME_IP:
             ip_address = get_ip_address(request)
             if settings.SOLOMON_ANONYMIZE_IP_ADDRESS:
                 ip_address = anonymize_ip(ip_address)
 
-            if self.ip_address != ip_address:
-                self.disable()
-                return False
+            if normalize_ip(self.ip_address) != normalize_ip(ip_address):
+                return InvalidReason.IP_MISMATCH
 
-        if settings.SOLOMON_REQUIRE_SAME_BROWSER:
-            cookie_value = request.COOKIES.get(settings.SOLOMON_COOKIE_NAME)
-            if self.cookie_value != cookie_value:
-                self.disable()
-                return False
+        if settings.SOLOMON_REQUIRE_SAME_BROWSER and check_browser:
+            cookie_value = request.COOKIES.get(settings.SOLOMON_COOKIE_NAME, "")
+            if not self.cookie_digest or not hmac.compare_digest(bytes(self.cookie_digest), hash_value(cookie_value)):
+                return InvalidReason.BROWSER_MISMATCH
 
-        return True
+        return None
+
+    def is_valid(self, request: HttpRequest, *, check_browser: bool = True) -> bool:
+        """
+        Validates the current object based on the request.
+
+        If the token is expired or used from a different IP address or browser, it is disabled. Every failed
+        validation is announced by the token_event signal together with its reason.
+
+        Args:
+            request (HttpRequest): The HTTP request to validate against.
+            check_browser (bool): Whether to check the browser cookie.
+
+        Returns:
+            bool: True if the object is valid, False otherwise.
+        """
+        if (reason := self.get_invalid_reason(request, check_browser=check_browser)) is None:
+            return True
+
+        if reason not in (InvalidReason.DISABLED, InvalidReason.CONSUMED):
+            self.disable()
+
+        self.send_event(TokenEventType.FAIL, request, reason=reason)
+        return False
+
+    def send_event(self, event: str, request: Optional[HttpRequest] = None, reason: str = "") -> None:
+        """
+        Sends the token_event signal for a change of the token's state.
+
+        Args:
+            event (str): The TokenEventType of the change.
+            request (Optional[HttpRequest]): The request that caused the change.
+            reason (str): The InvalidReason of a failed validation.
+
+        Returns:
+            None
+        """
+        token_event.send(sender=self.__class__, token=self, event=event, request=request, reason=reason)
 
     def disable(self) -> None:
         """
         Marks the token as disabled.
 
+        Only the disabled_at column is written, so a concurrent consumption of the token is never reverted.
+
         Returns:
             None
         """
         self.disabled_at = timezone.now()
-        self.save()
+        self.save(update_fields=["disabled_at"])
 
-    def consume(self) -> None:
+    def consume(self) -> bool:
         """
-        Marks the token as consumed.
+        Marks the token as consumed, unless it was consumed or disabled in the meantime.
+
+        The check and the change are a single conditional UPDATE, so a token is consumed exactly once even if the
+        same link is verified by concurrent requests.
 
         Returns:
-            None
+            bool: True if this call consumed the token, False if it was already consumed or disabled.
+        """
+        consumed_at = timezone.now()
+        updated = (
+            type(self)
+            ._default_manager.using(self._state.db)
+            .filter(pk=self.pk, consumed_at__isnull=True, disabled_at__isnull=True)
+            .update(consumed_at=consumed_at)
+        )
+        if updated:
+            self.consumed_at = consumed_at
+        return bool(updated)
+
+
+class SolomonTokenEvent(models.Model):
+    # A plain reference instead of a foreign key, so audit records outlive purged tokens and are inserted without
+    # referential checks.
+    token_pk = models.BigIntegerField(null=True, db_index=True)
+    email = models.EmailField()
+    event = models.CharField(max_length=16, choices=TokenEventType.choices)
+    reason = models.CharField(max_length=32, blank=True, choices=InvalidReason.choices)
+    ip_address = models.GenericIPAddressField(null=True)
+    user_agent = models.CharField(max_length=255, blank=True)
+    # Not auto_now_add, because buffered events must keep the time they happened at, not the time of the flush.
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self) -> str:
+        return f"{self.email} - {self.event} - {self.created_at}"
+
+
+class SolomonDeviceManager(models.Manager):
+    def revoke(self, user) -> int:
+        """
+        Forgets all remembered browsers of the user, e.g. after a password reset or a lost device.
+
+        Returns:
+            int: The number of revoked devices.
+        """
+        return self.filter(user=user).delete()[0]
+
+    def purge_expired(self, chunk_size: int = 1000) -> int:
+        """
+        Deletes the devices whose cookie expired, in chunks of primary keys.
+
+        Returns:
+            int: The number of deleted devices.
         """
-        self.consumed_at = timezone.now()
-        self.save()
+        queryset = self.filter(expiry_date__lt=timezone.now())
+        deleted = 0
+        while pks := list(queryset.order_by("pk").values_list("pk", flat=True)[:chunk_size]):
+            deleted += self.filter(pk__in=pks).delete()[0]
+        return deleted
+
+
+class SolomonDevice(models.Model):
+    """
+    A browser that is remembered after a verified login, so its user can log in again without a magic link.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    # Only the digest of the current cookie secret is stored. It changes on every use of the device.
+    secret_digest = models.BinaryField(max_length=16, editable=False)
+    expiry_date = models.DateTimeField(editable=False, db_index=True)
+    last_used_at = models.DateTimeField(null=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = SolomonDeviceManager()
+
+    def __str__(self) -> str:
+        return f"{self.user} - {self.expiry_date}"
+
+
+class SolomonTokenStats(models.Model):
+    """
+    Hourly rollup of the token activity, maintained by the solomon_rollup_stats command.
+    """
+
+    hour = models.DateTimeField(unique=True)
+    issued = models.PositiveBigIntegerField(default=0)
+    consumed = models.PositiveBigIntegerField(default=0)
+    disabled = models.PositiveBigIntegerField(default=0)
+    expired = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = _("token statistics")
+        verbose_name_plural = _("token statistics")
+
+    def __str__(self) -> str:
+        return f"{self.hour:%Y-%m-%d %H:00}"
+
+
+class SolomonStatsWatermark(models.Model):
+    """
+    The point in time up to which a timestamp column of the tokens on one database was rolled up.
+    """
+
+    name = models.CharField(max_length=128, unique=True)
+    value = models.DateTimeField(null=True)
+
+    def __str__(self) -> str:
+        return f"{self.name} - {self.value}"
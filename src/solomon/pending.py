@@ -0,0 +1,124 @@
+import asyncio
+import time
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.base_user import AbstractBaseUser
+from django.http import HttpRequest
+from django.utils.crypto import constant_time_compare, get_random_string
+
+from solomon.conf import settings
+from solomon.models import SolomonToken, hash_value
+from solomon.utils import get_cache
+
+SESSION_KEY = "_solomon_pending_login"
+CONFIRM_SESSION_KEY = "_solomon_pending_login_confirm"
+CODE_LENGTH = 6
+
+
+def _key(shard: int, token_pk: int) -> str:
+    return f"solomon:pending-login:{shard}:{token_pk}"
+
+
+def _code_key(shard: int, token_pk: int) -> str:
+    return f"solomon:pending-login-code:{shard}:{token_pk}"
+
+
+def _timeout() -> int:
+    return settings.SOLOMON_MAX_TOKEN_LIFETIME + settings.SOLOMON_PENDING_LOGIN_TIMEOUT
+
+
+def register_pending_login(request: HttpRequest, token: SolomonToken) -> str:
+    """
+    Remembers the token in the session of the browser that requested it, so this session can claim the login once
+    the token is consumed on another device.
+
+    Returns:
+        str: The code to show in the waiting browser. It has to be entered on the device the link is clicked on,
+        before the waiting browser is logged in as well.
+    """
+    code = get_random_string(CODE_LENGTH, allowed_chars="0123456789")
+    get_cache().set(_code_key(token.shard, token.pk), hash_value(code).hex(), timeout=_timeout())
+    request.session[SESSION_KEY] = [token.shard, token.pk]
+    return code
+
+
+def complete_pending_login(token: SolomonToken, user: AbstractBaseUser) -> None:
+    """
+    Publishes the user of a consumed token to the session waiting for it.
+    """
+    get_cache().set(_key(token.shard, token.pk), user.pk, timeout=_timeout())
+
+
+def resolve_pending_login(request: HttpRequest, token: SolomonToken, user: AbstractBaseUser) -> bool:
+    """
+    Handles the pending login of a token that was just consumed by the request.
+
+    A login pending in the same session is completed right away. A login pending in another browser is only
+    remembered in the session, until the code shown there is confirmed with confirm_pending_login(). Otherwise,
+    whoever requested a link for somebody else's email address would be logged in as soon as its owner clicks it.
+
+    Returns:
+        bool: Whether a login pending in another browser awaits confirmation.
+    """
+    if request.session.get(SESSION_KEY) == [token.shard, token.pk]:
+        complete_pending_login(token, user)
+        return False
+    if get_cache().get(_code_key(token.shard, token.pk)) is None:
+        return False
+    request.session[CONFIRM_SESSION_KEY] = [token.shard, token.pk]
+    return True
+
+
+def confirm_pending_login(token: SolomonToken, user: AbstractBaseUser, code: str) -> bool:
+    """
+    Completes the login pending in another browser, if the code shown there was entered.
+
+    Returns:
+        bool: Whether the code matched and the login was completed.
+    """
+    cache = get_cache()
+    digest = cache.get(_code_key(token.shard, token.pk))
+    if digest is None or not constant_time_compare(digest, hash_value(code).hex()):
+        return False
+    cache.delete(_code_key(token.shard, token.pk))
+    complete_pending_login(token, user)
+    return True
+
+
+def claim_login(shard: int, token_pk: int) -> Optional[int]:
+    """
+    Returns the published user of the pending token and deletes it, so it completes only one pending login.
+    """
+    cache = get_cache()
+    key = _key(shard, token_pk)
+    user_pk = cache.get(key)
+    if user_pk is not None and cache.delete(key):
+        return user_pk
+    return None
+
+
+async def wait_for_login(shard: int, token_pk: int) -> Optional[int]:
+    """
+    Waits until the token is consumed on any device, without blocking a thread.
+
+    The cache is polled every SOLOMON_PENDING_LOGIN_POLL_INTERVAL seconds for at most SOLOMON_PENDING_LOGIN_TIMEOUT
+    seconds. The async cache methods of Django's cache backends run in the single thread-sensitive executor, which
+    would serialize all waiting clients, so the cache is polled from the thread pool instead.
+
+    Args:
+        shard (int): The index of the shard the pending token is stored on.
+        token_pk (int): The primary key of the pending token.
+
+    Returns:
+        Optional[int]: The primary key of the user to log in, or None if the token wasn't consumed in time.
+    """
+    claim = sync_to_async(claim_login, thread_sensitive=False)
+    deadline = time.monotonic() + settings.SOLOMON_PENDING_LOGIN_TIMEOUT
+
+    while True:
+        if (user_pk := await claim(shard, token_pk)) is not None:
+            return user_pk
+        if time.monotonic() >= deadline:
+            return None
+        await asyncio.sleep(settings.SOLOMON_PENDING_LOGIN_POLL_INTERVAL)
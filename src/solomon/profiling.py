@@ -0,0 +1,132 @@
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from typing import Any, Callable, Iterator, Optional
+
+from django.utils.module_loading import import_string
+
+from solomon.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=8)
+def _import_callback(path: str) -> Callable[[str, float, dict[str, Any]], None]:
+    return import_string(path)
+
+
+@lru_cache(maxsize=1)
+def _get_tracer() -> Any:
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        return None
+    return trace.get_tracer("solomon")
+
+
+def get_span_callback() -> Optional[Callable[[str, float, dict[str, Any]], None]]:
+    """
+    Returns the callable configured by SOLOMON_PROFILING_SPAN_CALLBACK.
+    """
+    if not settings.SOLOMON_PROFILING_SPAN_CALLBACK:
+        return None
+    return _import_callback(settings.SOLOMON_PROFILING_SPAN_CALLBACK)
+
+
+def get_tracer() -> Any:
+    """
+    Returns the OpenTelemetry tracer of solomon, if SOLOMON_PROFILING_OPENTELEMETRY is enabled and the
+    opentelemetry-api package is installed.
+    """
+    if not settings.SOLOMON_PROFILING_OPENTELEMETRY:
+        return None
+    return _get_tracer()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[None]:
+    """
+    Times a stage of the login flow.
+
+    The duration is passed to the SOLOMON_PROFILING_SPAN_CALLBACK as callback(name, seconds, attributes), also if
+    the stage raises. With SOLOMON_PROFILING_OPENTELEMETRY, the stage is recorded as an OpenTelemetry span as well.
+    Without either, the stage is not timed at all. Errors of the callback are logged, they never fail the stage.
+
+    Args:
+        name (str): The name of the stage, e.g. "solomon.authenticate.consume".
+        **attributes (Any): Attributes of the span.
+    """
+    callback = get_span_callback()
+    tracer = get_tracer()
+    if callback is None and tracer is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        if tracer is None:
+            yield
+        else:
+            with tracer.start_as_current_span(name, attributes=attributes):
+                yield
+    finally:
+        if callback is not None:
+            try:
+                callback(name, time.perf_counter() - start, attributes)
+            except Exception:
+                logger.exception("The profiling span callback failed for %s.", name)
+
+
+def dump_profile(name: str, func: Callable, *args, **kwargs) -> Any:
+    """
+    Calls the function under cProfile and writes the stats to SOLOMON_PROFILING_DIR.
+
+    The files are named <name>-<time in ns>-<pid>.prof and can be read with pstats or snakeviz. If another profiler
+    is already active in the thread, the function is called without profiling. Errors writing the file are logged,
+    they never fail the call.
+
+    Returns:
+        Any: The return value of the function.
+    """
+    import cProfile
+
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        return func(*args, **kwargs)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profile.disable()
+        filename = f"{name}-{time.time_ns()}-{os.getpid()}.prof"
+        try:
+            os.makedirs(settings.SOLOMON_PROFILING_DIR, exist_ok=True)
+            profile.dump_stats(os.path.join(settings.SOLOMON_PROFILING_DIR, filename))
+        except Exception:
+            logger.exception("Writing the profile %s failed.", filename)
+
+
+def profiled(name: str) -> Callable[[Callable], Callable]:
+    """
+    Decorates a view, so it is timed as a span and profiled for SOLOMON_PROFILING_SAMPLE_RATE of its requests.
+
+    Args:
+        name (str): The name of the span and the prefix of the profile files.
+    """
+
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with span(f"solomon.{name}"):
+                rate = settings.SOLOMON_PROFILING_SAMPLE_RATE
+                if rate and random.random() < rate:  # noqa: S311
+                    return dump_profile(name, view, *args, **kwargs)
+                return view(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
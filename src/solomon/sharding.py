@@ -0,0 +1,77 @@
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from solomon.conf import settings
+from solomon.utils import normalize_email
+
+T = TypeVar("T")
+
+
+def get_shards() -> list[str]:
+    """
+    Returns the database aliases the tokens are spread across.
+
+    Returns:
+        list[str]: SOLOMON_SHARDS, or only the default database if sharding is disabled.
+    """
+    return list(settings.SOLOMON_SHARDS or [DEFAULT_DB_ALIAS])
+
+
+def is_sharded() -> bool:
+    return bool(settings.SOLOMON_SHARDS)
+
+
+def get_shard_index(email: str) -> int:
+    """
+    Returns the index of the shard owning the tokens of an email address.
+
+    CRC32 is stable across processes and Python versions, unlike hash().
+    """
+    return zlib.crc32(normalize_email(email).encode()) % len(get_shards())
+
+
+def get_shard(index: Optional[int]) -> Optional[str]:
+    """
+    Returns the database alias of a shard index, e.g. from a verify url.
+
+    Verify urls without a shard were issued before SOLOMON_SHARDS was set, so their tokens are in the default database.
+
+    Returns:
+        Optional[str]: The database alias, or None if the index is unknown.
+    """
+    shards = get_shards()
+    if index is None:
+        return DEFAULT_DB_ALIAS
+    if 0 <= index < len(shards):
+        return shards[index]
+    return None
+
+
+def for_each_shard(func: Callable[[str], T], *, parallel: bool = True) -> list[T]:
+    """
+    Calls the function with the database alias of every shard.
+
+    The shards are processed in parallel threads, every thread closes its database connection when it is done.
+
+    Args:
+        func (Callable[[str], T]): The function to call per database alias.
+        parallel (bool): Process the shards in parallel threads.
+
+    Returns:
+        list[T]: The results in the order of the shards.
+    """
+    shards = get_shards()
+    if not parallel or len(shards) == 1:
+        return [func(alias) for alias in shards]
+
+    def run(alias: str) -> T:
+        try:
+            return func(alias)
+        finally:
+            connections[alias].close()
+
+    with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        return list(executor.map(run, shards))
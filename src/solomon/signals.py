@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent whenever the state of a token changes. Arguments: token, event (a TokenEventType), request and reason (an
+# InvalidReason for failed validations, otherwise an empty string).
+token_event = Signal()
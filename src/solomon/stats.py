@@ -0,0 +1,87 @@
+import datetime
+from collections import Counter
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from solomon.models import SolomonStatsWatermark, SolomonToken, SolomonTokenStats
+from solomon.sharding import get_shards
+
+# The timestamp column each statistic is rolled up from, with the condition a token must meet to be counted.
+ROLLUPS = {
+    "issued": ("created_at", Q()),
+    "consumed": ("consumed_at", Q()),
+    "disabled": ("disabled_at", Q()),
+    # Tokens used after their expiry are disabled by the verification, they still count as expired.
+    "expired": (
+        "expiry_date",
+        Q(consumed_at__isnull=True) & (Q(disabled_at__isnull=True) | Q(disabled_at__gte=F("expiry_date"))),
+    ),
+}
+
+
+def count_per_hour(alias: str, column: str, condition: Q, start: Optional[datetime.datetime], end: datetime.datetime):
+    queryset = SolomonToken.objects.using(alias).filter(condition, **{f"{column}__lt": end})
+    if start is not None:
+        queryset = queryset.filter(**{f"{column}__gte": start})
+    return (
+        queryset.annotate(stats_hour=TruncHour(column, tzinfo=datetime.timezone.utc))
+        .values("stats_hour")
+        .annotate(count=Count("pk"))
+        .order_by()
+    )
+
+
+def rollup_stats(until: Optional[datetime.datetime] = None) -> int:
+    """
+    Adds the token activity since the last rollup to the hourly SolomonTokenStats.
+
+    Every timestamp column of every shard has its own watermark, so each run only aggregates the rows that changed
+    since the previous run, using the indexes on the columns. Only complete hours are rolled up, because tokens can
+    still be created, consumed or disabled in the current hour. The watermarks are locked while the counts are
+    added, so concurrent runs never count a row twice. The rollup must run more often than solomon_purge_tokens
+    deletes tokens, otherwise the purged tokens are never counted.
+
+    Args:
+        until (Optional[datetime.datetime]): Roll up the hours before this point in time. Defaults to now.
+
+    Returns:
+        int: The number of hours that were changed.
+    """
+    until = (until or timezone.now()).astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+    names = [f"{alias}:{name}" for alias in get_shards() for name in ROLLUPS]
+    for name in names:
+        SolomonStatsWatermark.objects.get_or_create(name=name)
+
+    with transaction.atomic():
+        watermarks = dict(
+            SolomonStatsWatermark.objects.select_for_update().filter(name__in=names).values_list("name", "value")
+        )
+
+        counts: dict[datetime.datetime, Counter] = {}
+        for alias in get_shards():
+            for name, (column, condition) in ROLLUPS.items():
+                start = watermarks[f"{alias}:{name}"]
+                if start is not None and start >= until:
+                    continue
+                for row in count_per_hour(alias, column, condition, start, until):
+                    counts.setdefault(row["stats_hour"], Counter())[name] += row["count"]
+
+        existing = SolomonTokenStats.objects.select_for_update().in_bulk(list(counts), field_name="hour")
+        for hour, hour_counts in counts.items():
+            stats = existing.get(hour) or SolomonTokenStats(hour=hour)
+            for name, count in hour_counts.items():
+                setattr(stats, name, getattr(stats, name) + count)
+            existing[hour] = stats
+        changed = [stats for stats in existing.values() if stats.pk]
+        SolomonTokenStats.objects.bulk_create([stats for stats in existing.values() if stats.pk is None])
+        SolomonTokenStats.objects.bulk_update(changed, list(ROLLUPS))
+
+        SolomonStatsWatermark.objects.filter(name__in=names).filter(Q(value__lt=until) | Q(value__isnull=True)).update(
+            value=until
+        )
+    return len(counts)
@@ -0,0 +1,169 @@
+import hashlib
+import re
+from typing import Optional
+
+from django.utils import timezone
+
+from solomon.conf import settings
+from solomon.models import SolomonToken
+from solomon.sharding import get_shard_index
+from solomon.utils import get_cache
+
+# Token strings are generated by get_random_string(128), so anything else can be rejected without a query.
+TOKEN_STRING_RE = re.compile(r"^[a-zA-Z0-9]{128}$")
+
+
+def is_well_formed(token_string: str) -> bool:
+    return TOKEN_STRING_RE.match(token_string) is not None
+
+
+def _dead_token_key(pk: int, token_string: str) -> str:
+    digest = hashlib.sha256(f"{pk}:{token_string}".encode()).hexdigest()[:32]
+    return f"solomon:dead-token:{digest}"
+
+
+def is_dead_token(pk: int, token_string: str) -> bool:
+    """
+    Checks the negative cache for a verify link that is known to be unknown or unusable.
+
+    Returns:
+        bool: True if the link failed before and can be rejected without a query.
+    """
+    if not settings.SOLOMON_NEGATIVE_CACHE_TIMEOUT:
+        return False
+    return get_cache().get(_dead_token_key(pk, token_string)) is not None
+
+
+def mark_dead_token(pk: int, token_string: str) -> None:
+    """
+    Stores a failed verify link in the negative cache.
+
+    A token never becomes valid again once it failed verification, so caching the failure is always safe.
+    """
+    if settings.SOLOMON_NEGATIVE_CACHE_TIMEOUT:
+        get_cache().set(_dead_token_key(pk, token_string), 1, timeout=settings.SOLOMON_NEGATIVE_CACHE_TIMEOUT)
+
+
+def _failure_key(ip_address: str) -> str:
+    return f"solomon:verify-failures:{ip_address}"
+
+
+def is_blocked(ip_address: str) -> bool:
+    """
+    Checks whether the IP address exceeded SOLOMON_VERIFY_FAILURE_LIMIT failed verifications within the window.
+
+    Returns:
+        bool: True if requests from the IP address should be rejected.
+    """
+    if not settings.SOLOMON_VERIFY_FAILURE_LIMIT:
+        return False
+    return get_cache().get(_failure_key(ip_address), 0) >= settings.SOLOMON_VERIFY_FAILURE_LIMIT
+
+
+def register_failure(ip_address: str) -> None:
+    """
+    Counts a failed verification for the IP address. The counter expires SOLOMON_VERIFY_FAILURE_WINDOW seconds after
+    the first failure.
+    """
+    if not settings.SOLOMON_VERIFY_FAILURE_LIMIT:
+        return
+
+    cache = get_cache()
+    key = _failure_key(ip_address)
+    if cache.add(key, 1, timeout=settings.SOLOMON_VERIFY_FAILURE_WINDOW):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=settings.SOLOMON_VERIFY_FAILURE_WINDOW)
+
+
+# Reasons of check_verify_link() for rejecting a verify link without a query.
+MALFORMED = "malformed"
+DEAD = "dead"
+
+
+def check_verify_link(ip_address: str, pk: int, token_string: str) -> Optional[str]:
+    """
+    Runs the checks of a verify link that need no query. A rejected link is counted as a failure of the IP address.
+
+    Returns:
+        Optional[str]: MALFORMED or DEAD if the link can be rejected right away, otherwise None.
+    """
+    if not is_well_formed(token_string):
+        reason = MALFORMED
+    elif is_dead_token(pk, token_string):
+        reason = DEAD
+    else:
+        return None
+    register_failure(ip_address)
+    return reason
+
+
+def reject_verify_link(ip_address: str, pk: int, token_string: str) -> None:
+    """
+    Remembers a verify link that failed after its token was looked up, in the negative cache and as a failure of the
+    IP address.
+    """
+    mark_dead_token(pk, token_string)
+    register_failure(ip_address)
+
+
+def _code_attempts_key(email: str) -> str:
+    digest = hashlib.sha256(email.encode()).hexdigest()[:32]
+    return f"solomon:code-attempts:{digest}"
+
+
+def _token_code_attempts_key(shard: int, pk: int) -> str:
+    return f"solomon:token-code-attempts:{shard}:{pk}"
+
+
+def _increment(key: str, timeout: int) -> int:
+    """
+    Increments the counter in the cache, which expires timeout seconds after its last increment.
+
+    Returns:
+        int: The new value of the counter.
+    """
+    cache = get_cache()
+    if cache.add(key, 1, timeout=timeout):
+        return 1
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=timeout)
+        return 1
+    cache.touch(key, timeout=timeout)
+    return count
+
+
+def is_code_locked(email: str) -> bool:
+    """
+    Checks whether SOLOMON_LOGIN_CODE_EMAIL_MAX_ATTEMPTS wrong codes were entered for the email address.
+
+    Returns:
+        bool: True if no further codes should be checked for the email address.
+    """
+    return get_cache().get(_code_attempts_key(email), 0) >= settings.SOLOMON_LOGIN_CODE_EMAIL_MAX_ATTEMPTS
+
+
+def register_code_failure(email: str) -> None:
+    """
+    Counts a wrong code for the email address and for each of its active tokens with a code.
+
+    A token is disabled after SOLOMON_LOGIN_CODE_MAX_ATTEMPTS wrong codes, so each code can only be guessed a few
+    times. The counter of the email address limits the guesses across all of its tokens, because new tokens can be
+    requested by anybody. It is never reset and expires SOLOMON_MAX_TOKEN_LIFETIME seconds after the last wrong code.
+    """
+    timeout = settings.SOLOMON_MAX_TOKEN_LIFETIME
+    _increment(_code_attempts_key(email), timeout)
+
+    shard = get_shard_index(email)
+    tokens = SolomonToken.objects.for_email(email).filter(email=email).exclude(code_hash="").active()
+    exhausted = [
+        pk
+        for pk in tokens.values_list("pk", flat=True)
+        if _increment(_token_code_attempts_key(shard, pk), timeout) >= settings.SOLOMON_LOGIN_CODE_MAX_ATTEMPTS
+    ]
+    if exhausted:
+        tokens.filter(pk__in=exhausted).update(disabled_at=timezone.now())
@@ -1,11 +1,29 @@
 from django.urls import path
 
-from solomon.views import login_view, logout_view, verify_view
+from solomon.api import api_health_view, api_login_view, api_status_view, api_verify_view
+from solomon.views import (
+    login_code_view,
+    login_view,
+    logout_view,
+    pending_login_confirm_view,
+    pending_login_view,
+    signup_view,
+    verify_view,
+)
 
 app_name = "solomon"
 
 urlpatterns = [
     path("login/", login_view, name="login"),
+    path("signup/", signup_view, name="signup"),
     path("verify/<int:pk>/<str:token_string>/", verify_view, name="verify"),
+    path("verify/<int:shard>/<int:pk>/<str:token_string>/", verify_view, name="verify"),
+    path("login/code/", login_code_view, name="login_code"),
+    path("login/pending/", pending_login_view, name="pending_login"),
+    path("login/pending/confirm/", pending_login_confirm_view, name="pending_login_confirm"),
     path("logout/", logout_view, name="logout"),
+    path("api/login/", api_login_view, name="api_login"),
+    path("api/verify/", api_verify_view, name="api_verify"),
+    path("api/status/", api_status_view, name="api_status"),
+    path("api/health/", api_health_view, name="api_health"),
 ]
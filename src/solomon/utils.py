@@ -1,14 +1,86 @@
 import ipaddress
+from functools import lru_cache
+from typing import Iterable, Optional
 
 from django.contrib.auth import get_user_model
 from django.contrib.auth.base_user import AbstractBaseUser
+from django.core.cache import BaseCache, caches
+from django.db import IntegrityError, connections, transaction
+from django.db.models import QuerySet
+from django.db.models.functions import Lower
 from django.http import HttpRequest
 
+from solomon.conf import settings
+
+IP_ADDRESS_META_KEY = "SOLOMON_IP_ADDRESS"
+
+
+def get_cache() -> BaseCache:
+    """
+    Returns the cache configured by SOLOMON_CACHE_ALIAS.
+    """
+    return caches[settings.SOLOMON_CACHE_ALIAS]
+
+
+def normalize_email(email: str) -> str:
+    """
+    Returns the canonical form of an email address, in which solomon stores and looks up all addresses.
+
+    The whole address is lowercased. Mail servers treat the local part as case-sensitive in theory, but practically
+    never do, and users don't remember the case they signed up with.
+    """
+    return email.strip().lower()
+
+
+def filter_users_by_email(email: str) -> QuerySet:
+    """
+    Returns the users with the email address, ignoring the case of the stored addresses.
+
+    The lookup compares Lower(<email field>), so it only seeks an index if the user model has a functional index on
+    it. The solomon.W003 check recommends one. Use get_user_by_email() to find a single user without a scan.
+
+    Args:
+        email (str): The email address.
+
+    Returns:
+        QuerySet: The matching users, oldest first.
+    """
+    User = get_user_model()  # noqa: N806
+    return (
+        User._default_manager.alias(solomon_email=Lower(User.get_email_field_name()))
+        .filter(solomon_email=normalize_email(email))
+        .order_by("pk")
+    )
+
+
+def get_user_by_email(email: str) -> Optional[AbstractBaseUser]:
+    """
+    Returns the user with the email address, ignoring the case of the stored addresses.
+
+    Users whose address is stored in its normalized form are found by an exact lookup, which can use a plain index on
+    the email field. Only if it misses, the case-insensitive lookup of filter_users_by_email() runs.
+
+    Args:
+        email (str): The email address.
+
+    Returns:
+        Optional[AbstractBaseUser]: The oldest user with the exact address, otherwise the oldest user with the address
+        in any case, or None.
+    """
+    User = get_user_model()  # noqa: N806
+    email = normalize_email(email)
+    exact = User._default_manager.filter(**{User.get_email_field_name(): email}).order_by("pk").first()
+    return exact or filter_users_by_email(email).first()
+
 
 def get_or_create_user(email: str) -> AbstractBaseUser:
     """
     Retrieves an existing user by email or creates a new user if one does not exist.
 
+    Concurrent calls for the same email address, e.g. from two browser tabs, return the same user. If the user model
+    has a unique field set from the email (like the username), the losing INSERT fails and the winner is returned.
+    Otherwise both users are inserted and the younger one is deleted again.
+
     Args:
         email (str): The email address of the user.
 
@@ -17,36 +89,244 @@ def get_or_create_user(email: str) -> AbstractBaseUser:
     """
     User = get_user_model()  # noqa: N806
 
-    email = email.lower()
+    email = normalize_email(email)
+    if user := get_user_by_email(email):
+        return user
 
-    try:
-        return User.objects.get(email=email)
-    except User.DoesNotExist:
-        pass
+    users = filter_users_by_email(email)
 
-    user_details = {"email": email}
+    user_details = {User.get_email_field_name(): email}
     if "username" in [field.name for field in User._meta.get_fields()]:  # pragma: no cov
         user_details["username"] = email
 
-    user = User.objects.create(**user_details)
+    user = User(**user_details)
     user.set_unusable_password()
-    user.save()
+    try:
+        with transaction.atomic():
+            user.save()
+    except IntegrityError:
+        if (existing := users.first()) is None:
+            raise
+        return existing
 
+    if (oldest := users.first()) != user:
+        user.delete()
+        return oldest
     return user
 
 
+class NetworkSet:
+    """
+    Prebuilt lookup structure for a set of IP networks, e.g. the trusted proxies.
+
+    The networks are grouped by IP version and prefix length, so a membership test costs one mask operation and one
+    set lookup per distinct prefix length instead of a scan over all configured networks.
+    """
+
+    def __init__(self, cidrs: Iterable[str]) -> None:
+        networks: dict[tuple[int, int], set[int]] = {}
+        for cidr in cidrs:
+            network = ipaddress.ip_network(cidr, strict=False)
+            networks.setdefault((network.version, network.prefixlen), set()).add(int(network.network_address))
+
+        self._lookups = []
+        for (version, prefixlen), addresses in networks.items():
+            bits = 32 if version == 4 else 128
+            mask = ((1 << prefixlen) - 1) << (bits - prefixlen)
+            self._lookups.append((version, mask, frozenset(addresses)))
+
+    def __contains__(self, ip_address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return False
+
+        value = int(ip)
+        return any(version == ip.version and value & mask in addresses for version, mask, addresses in self._lookups)
+
+
+@lru_cache(maxsize=None)
+def get_trusted_proxies() -> Optional[NetworkSet]:
+    """
+    Returns the compiled SOLOMON_TRUSTED_PROXIES, or None if the X-Forwarded-For header is trusted blindly.
+
+    The networks are compiled once and shared by all requests, until clear_settings_caches() clears them.
+    """
+    if settings.SOLOMON_TRUSTED_PROXIES is None:
+        return None
+    return NetworkSet(settings.SOLOMON_TRUSTED_PROXIES)
+
+
+def normalize_domain(domain: str) -> str:
+    """
+    Returns the canonical form of a configured email domain. "*.example.com" and ".example.com" both mean
+    "example.com", which already matches all of its subdomains.
+    """
+    domain = domain.strip().lower().rstrip(".")
+    if domain.startswith("*."):
+        domain = domain[2:]
+    return domain.lstrip(".")
+
+
+class DomainSet:
+    """
+    Prebuilt lookup structure for a set of email domains, e.g. a blocklist of disposable-address providers.
+
+    A domain matches if it or one of its parent domains is in the set. The membership test looks up every suffix of
+    the domain that starts at a label boundary, so it costs one set lookup per label, regardless of the size of the
+    set.
+    """
+
+    def __init__(self, domains: Iterable[str]) -> None:
+        self._domains = frozenset(filter(None, map(normalize_domain, domains)))
+
+    def __len__(self) -> int:
+        return len(self._domains)
+
+    def __contains__(self, domain: str) -> bool:
+        domain = domain.lower().rstrip(".")
+        while domain:
+            if domain in self._domains:
+                return True
+            domain = domain.partition(".")[2]
+        return False
+
+
+def read_domains(path: str) -> list[str]:
+    """
+    Reads a domain list with one domain per line. Blank lines and lines starting with "#" are ignored.
+    """
+    with open(path, encoding="utf-8") as f:
+        return [line for line in map(str.strip, f) if line and not line.startswith("#")]
+
+
+@lru_cache(maxsize=None)
+def get_allowed_email_domains() -> Optional[DomainSet]:
+    """
+    Returns the compiled SOLOMON_ALLOWED_EMAIL_DOMAINS, or None if all domains are allowed.
+
+    The domains are compiled once and shared by all requests, until clear_settings_caches() clears them.
+    """
+    if settings.SOLOMON_ALLOWED_EMAIL_DOMAINS is None:
+        return None
+    return DomainSet(settings.SOLOMON_ALLOWED_EMAIL_DOMAINS)
+
+
+@lru_cache(maxsize=None)
+def get_blocked_email_domains() -> DomainSet:
+    """
+    Returns the compiled SOLOMON_BLOCKED_EMAIL_DOMAINS and the domains of SOLOMON_BLOCKED_EMAIL_DOMAINS_FILE.
+
+    The file is only read once, and the domains are shared by all requests, until clear_settings_caches() clears
+    them.
+    """
+    domains = list(settings.SOLOMON_BLOCKED_EMAIL_DOMAINS or ())
+    if settings.SOLOMON_BLOCKED_EMAIL_DOMAINS_FILE:
+        domains += read_domains(settings.SOLOMON_BLOCKED_EMAIL_DOMAINS_FILE)
+    return DomainSet(domains)
+
+
+def clear_settings_caches(setting: str, **kwargs) -> None:  # noqa: ARG001
+    """
+    Clears the compiled lookup structures when a setting of solomon changes, e.g. in tests. Connected to Django's
+    setting_changed signal.
+    """
+    if setting.startswith("SOLOMON_"):
+        get_trusted_proxies.cache_clear()
+        get_allowed_email_domains.cache_clear()
+        get_blocked_email_domains.cache_clear()
+
+
+def is_email_domain_allowed(email: str) -> bool:
+    """
+    Checks the domain of an email address against SOLOMON_ALLOWED_EMAIL_DOMAINS and the blocked domains.
+
+    Args:
+        email (str): The normalized email address.
+
+    Returns:
+        bool: Whether logins with the email address are allowed.
+    """
+    domain = email.rpartition("@")[2]
+    if (allowed := get_allowed_email_domains()) is not None and domain not in allowed:
+        return False
+    return domain not in get_blocked_email_domains()
+
+
+def is_valid_ip(ip_address: str) -> bool:
+    """
+    Checks whether the given string is a valid IPv4 or IPv6 address.
+
+    Returns:
+        bool: True if the string is a valid IP address, otherwise False.
+    """
+    try:
+        ipaddress.ip_address(ip_address)
+    except ValueError:
+        return False
+    return True
+
+
+def normalize_ip(ip_address: Optional[str]) -> Optional[str]:
+    """
+    Returns the canonical representation of an IP address, or None if it is not a valid IP address.
+    """
+    try:
+        return str(ipaddress.ip_address(ip_address))
+    except ValueError:
+        return None
+
+
+def resolve_ip_address(request: HttpRequest) -> str:
+    """
+    Resolves the client IP address of the request.
+
+    If SOLOMON_TRUSTED_PROXIES is None, the last entry of the X-Forwarded-For header is trusted blindly, unless it is
+    not a valid IP address. Otherwise the X-Forwarded-For header is only used if the request comes from a trusted
+    proxy. It is then walked from right to left and the first address that is not a trusted proxy itself is returned.
+    The returned address may still be invalid, e.g. if REMOTE_ADDR is empty.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        str: The IP address of the client.
+    """
+    remote_addr = request.META.get("REMOTE_ADDR", "")
+    forwarded_for = request.headers.get("x-forwarded-for", "")
+
+    if (proxies := get_trusted_proxies()) is None:
+        if forwarded_for and is_valid_ip(hop := forwarded_for.split(",")[-1].strip()):
+            return hop
+        return remote_addr
+
+    if not forwarded_for or remote_addr not in proxies:
+        return remote_addr
+
+    client = remote_addr
+    for hop in reversed(forwarded_for.split(",")):
+        hop = hop.strip()
+        if not is_valid_ip(hop):
+            break
+        client = hop
+        if hop not in proxies:
+            break
+    return client
+
+
 def get_ip_address(request: HttpRequest) -> str:
     """
     Returns the IP address of the request.
 
+    The address is resolved once per request and memoized in request.META, so all code paths of solomon share the
+    result. The ClientIPMiddleware resolves it upfront for every request.
+
     Returns:
         str: The IP address of the request.
     """
-    ip_address = request.headers.get("x-forwarded-for", "")
-    if ip_address:
-        return ip_address.split(",")[-1].strip()
-
-    return request.META.get("REMOTE_ADDR", "")
+    if (ip_address := request.META.get(IP_ADDRESS_META_KEY)) is None:
+        ip_address = request.META[IP_ADDRESS_META_KEY] = resolve_ip_address(request)
+    return ip_address
 
 
 def anonymize_ip(ip_address: str, ipv4_mask: int = 16, ipv6_mask: int = 64) -> str:
@@ -67,3 +347,30 @@ def anonymize_ip(ip_address: str, ipv4_mask: int = 16, ipv6_mask: int = 64) -> s
     else:
         network = ipaddress.IPv6Network(f"{ip}/{ipv6_mask}", strict=False)
     return str(network.network_address)
+
+
+def estimate_count(queryset: QuerySet, limit: int) -> int:
+    """
+    Counts the rows of a queryset without scanning a large table.
+
+    On PostgreSQL the row count of an unfiltered queryset is taken from the planner statistics in pg_class. In all
+    other cases the count is capped at the given limit, so the database stops counting after `limit` rows.
+
+    Args:
+        queryset (QuerySet): The queryset to count.
+        limit (int): The maximum number of rows to count exactly.
+
+    Returns:
+        int: The estimated number of rows.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql" and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row and row[0] > limit:
+            return int(row[0])
+
+    return queryset.order_by()[:limit].count()
@@ -1,35 +1,71 @@
 from typing import Optional
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth import authenticate, get_user_model, login, logout
-from django.http import HttpRequest, HttpResponse
+from django.contrib.auth.base_user import AbstractBaseUser
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import redirect, render
-from django.utils.http import url_has_allowed_host_and_scheme
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.cache import add_never_cache_headers
+from django.utils.http import url_has_allowed_host_and_scheme, urlencode
+from django.utils.translation import get_language
+from django.utils.translation import gettext_lazy as _
 from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_exempt
 
 from solomon.conf import settings
 from solomon.decorators import login_not_required
-from solomon.forms import LoginForm
-from solomon.models import SolomonToken
-from solomon.utils import get_ip_address
-
-User = get_user_model()
+from solomon.devices import login_remembered_device, remember_device
+from solomon.forms import LoginCodeForm, LoginForm, PendingLoginConfirmForm, SignupForm
+from solomon.mail import MailUnavailable, check_mail_available, send_token_email
+from solomon.metrics import VERIFY_BURN_PREVENTED, increment
+from solomon.models import InvalidReason, SolomonToken, TokenEventType, hash_value
+from solomon.pending import (
+    CONFIRM_SESSION_KEY,
+    SESSION_KEY,
+    confirm_pending_login,
+    register_pending_login,
+    resolve_pending_login,
+    wait_for_login,
+)
+from solomon.profiling import profiled, span
+from solomon.throttling import (
+    check_verify_link,
+    is_blocked,
+    is_code_locked,
+    mark_dead_token,
+    register_code_failure,
+    register_failure,
+    reject_verify_link,
+)
+from solomon.utils import get_cache, get_ip_address
 
 
 @csrf_exempt
 @never_cache
 @login_not_required
+@profiled("login_view")
 def login_view(request: HttpRequest) -> HttpResponse:
     """
     Handles the login view for the application.
 
     This view processes both GET and POST requests. For POST requests, it validates
     the login form, logs out the current user, saves the token, sends an email with
-    the token, and renders the login done template. If the setting SOLOMON_REQUIRE_SAME_BROWSER
-    is enabled, it sets a cookie with the token value.
+    the token, and renders the login done template. If the mail can't be delivered at the moment, no token is created
+    or the token is disabled again, and a 503 response is rendered. If the setting SOLOMON_REQUIRE_SAME_BROWSER
+    is enabled, it sets a cookie with the token value. If SOLOMON_CROSS_DEVICE_LOGIN is enabled,
+    the login done template gets the url of the pending login view to wait for the link being clicked, and the code
+    to confirm the login on the device the link is clicked on.
+
+    If SOLOMON_REMEMBER_DEVICE is enabled and the browser was remembered for the submitted email address, the user is
+    logged in and redirected right away, without a token or mail.
+
+    The IP address is always resolved from the POST request and the redirect URL is only taken from the POST data
+    or the "next" query parameter if it is safe.
 
-    For GET requests, it initializes the login form with the redirect URL and the
-    anonymized IP address if the setting SOLOMON_ANONYMIZE_IP_ADDRESS is enabled.
+    For GET requests, it renders the login form with the redirect URL. If SOLOMON_LOGIN_PAGE_CACHE_TIMEOUT is set,
+    the page of anonymous users is rendered without any per-request values instead and cached per language.
 
     Args:
         request (HttpRequest): The HTTP request object.
@@ -38,35 +74,134 @@ def login_view(request: HttpRequest) -> HttpResponse:
         HttpResponse: The HTTP response object with the rendered template.
     """
     if request.method == "POST":
-        form = LoginForm(request.POST)
-        if form.is_valid():
-            logout(request)
+        data = request.POST.copy()
+        data["redirect_url"] = get_token_redirect_url(request)
+        form = LoginForm(data, ip_address=get_ip_address(request))
+        with span("solomon.login.validate"):
+            is_valid = form.is_valid()
+        if is_valid:
+            if settings.SOLOMON_REMEMBER_DEVICE:
+                response = redirect(form.cleaned_data["redirect_url"])
+                if login_remembered_device(request, form.cleaned_data["email"], response):
+                    return response
+            return issue_token(request, form, settings.SOLOMON_LOGIN_DONE_TEMPLATE)
+    else:
+        if settings.SOLOMON_LOGIN_PAGE_CACHE_TIMEOUT is not None and not request.user.is_authenticated:
+            return render_cached_login_page()
+        form = LoginForm(initial={"redirect_url": get_token_redirect_url(request)})
+
+    context = {"form": form}
+    return render(request, settings.SOLOMON_LOGIN_TEMPLATE, context)
+
 
-            token = form.save()
-            token.send_email(request)
+@csrf_exempt
+@never_cache
+@login_not_required
+@profiled("signup_view")
+def signup_view(request: HttpRequest) -> HttpResponse:
+    """
+    Handles the signup view for the application.
+
+    Works like the login view, but the token is marked as a signup token. No user is created until the link is
+    verified, so abandoned signups never reach the user table. Email addresses of existing users simply get a login
+    link.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
 
-            response = render(request, settings.SOLOMON_LOGIN_DONE_TEMPLATE)
-            if settings.SOLOMON_REQUIRE_SAME_BROWSER:
-                response.set_cookie(settings.SOLOMON_COOKIE_NAME, token.cookie_value)
-            return response
+    Returns:
+        HttpResponse: The HTTP response object with the rendered template.
+    """
+    if request.method == "POST":
+        data = request.POST.copy()
+        data["redirect_url"] = get_token_redirect_url(request)
+        form = SignupForm(data, ip_address=get_ip_address(request))
+        if form.is_valid():
+            return issue_token(request, form, settings.SOLOMON_SIGNUP_DONE_TEMPLATE)
     else:
-        ip_address = get_ip_address(request)
-        form = LoginForm(
-            initial={
-                "redirect_url": get_token_redirect_url(request),
-                "ip_address": ip_address,
-            }
-        )
+        form = SignupForm(initial={"redirect_url": get_token_redirect_url(request)})
 
     context = {"form": form}
-    return render(request, settings.SOLOMON_LOGIN_TEMPLATE, context)
+    return render(request, settings.SOLOMON_SIGNUP_TEMPLATE, context)
+
+
+def issue_token(request: HttpRequest, form: LoginForm, template_name: str) -> HttpResponse:
+    """
+    Saves the token of a valid login or signup form, sends its email and renders the given done template.
+
+    If SOLOMON_LOGIN_CODE is enabled, the done template gets the url of the login code page for the token's email
+    address.
+
+    Returns:
+        HttpResponse: The rendered done template, or a 503 response if the mail can't be delivered at the moment.
+    """
+    try:
+        check_mail_available()
+    except MailUnavailable as e:
+        return mail_unavailable(request, e)
+
+    logout(request)
+
+    with span("solomon.login.save"):
+        token = form.save()
+    token.send_event(TokenEventType.ISSUE, request)
+    try:
+        with span("solomon.login.send_email"):
+            send_token_email(token, request)
+    except MailUnavailable as e:
+        return mail_unavailable(request, e)
+
+    context = {}
+    if settings.SOLOMON_CROSS_DEVICE_LOGIN:
+        context["pending_login_code"] = register_pending_login(request, token)
+        context["pending_login_url"] = reverse("solomon:pending_login")
+    if settings.SOLOMON_LOGIN_CODE:
+        context["login_code_url"] = f"{reverse('solomon:login_code')}?{urlencode({'email': token.email})}"
+
+    response = render(request, template_name, context)
+    if settings.SOLOMON_REQUIRE_SAME_BROWSER:
+        response.set_cookie(settings.SOLOMON_COOKIE_NAME, token.cookie_value)
+    return response
+
+
+def render_cached_login_page() -> HttpResponse:
+    """
+    Renders the login page once per language, template and SOLOMON_LOGIN_PAGE_CACHE_VERSION and caches it.
+
+    The page is rendered without the request, so no context processor adds per-request values like messages, the
+    CSRF token or the user to the page shared by all anonymous users. The form posts to the current url, so the
+    "next" query parameter is still used as redirect URL, and the IP address is resolved when the form is posted.
+
+    Returns:
+        HttpResponse: The cached login page.
+    """
+    key = (
+        f"solomon:login-page:{settings.SOLOMON_LOGIN_PAGE_CACHE_VERSION}:{get_language()}:"
+        f"{settings.SOLOMON_LOGIN_TEMPLATE}"
+    )
+    if (content := get_cache().get(key)) is None:
+        content = render_to_string(settings.SOLOMON_LOGIN_TEMPLATE, {"form": LoginForm()})
+        get_cache().set(key, content, settings.SOLOMON_LOGIN_PAGE_CACHE_TIMEOUT)
+    return HttpResponse(content)
+
+
+def mail_unavailable(request: HttpRequest, error: MailUnavailable) -> HttpResponse:
+    """
+    Renders the response for a login that was rejected, because the mail can't be delivered at the moment.
+
+    Returns:
+        HttpResponse: A 503 response asking the user to try again shortly.
+    """
+    response = render(request, settings.SOLOMON_MAIL_UNAVAILABLE_TEMPLATE, status=503)
+    response["Retry-After"] = str(error.retry_after)
+    return response
 
 
 def get_token_redirect_url(request: HttpRequest) -> Optional[str]:
     """
     Determines a safe redirect URL from the request.
 
-    This method checks the 'next' parameter in both POST and GET requests to
+    This method checks the 'redirect_url' parameter of POST requests and the 'next' parameter of the query string to
     determine the URL to redirect to. It ensures that the URL is safe by
     verifying it against the allowed hosts specified in the settings.
 
@@ -74,7 +209,17 @@ def get_token_redirect_url(request: HttpRequest) -> Optional[str]:
         Optional[str]: The safe redirect URL if it is valid and allowed, otherwise None.
     """
 
-    if not (redirect_to := request.POST.get("redirect_url")):
+    return get_safe_redirect_url(request, request.POST.get("redirect_url") or request.GET.get("next"))
+
+
+def get_safe_redirect_url(request: HttpRequest, redirect_to: Optional[str]) -> Optional[str]:
+    """
+    Returns the given URL if it is safe to redirect to, otherwise the LOGIN_REDIRECT_URL.
+
+    Returns:
+        Optional[str]: The safe redirect URL if it is valid and allowed, otherwise LOGIN_REDIRECT_URL.
+    """
+    if not redirect_to:
         return settings.LOGIN_REDIRECT_URL
 
     allowed_hosts = settings.ALLOWED_HOSTS
@@ -93,29 +238,229 @@ def get_token_redirect_url(request: HttpRequest) -> Optional[str]:
 @csrf_exempt
 @never_cache
 @login_not_required
-def verify_view(request: HttpRequest, pk: int, token_string: str) -> HttpResponse:
+@profiled("verify_view")
+def verify_view(request: HttpRequest, pk: int, token_string: str, shard: Optional[int] = None) -> HttpResponse:
     """
     Handles the verification view for the application.
 
     This view validates the token based on the primary key and the token string.
     If the token is valid, it logs in the user and redirects to the token's redirect URL.
 
+    Malformed links and links that failed before are rejected from the negative cache without a query. If
+    SOLOMON_VERIFY_FAILURE_LIMIT is set, IP addresses with too many failed verifications are blocked.
+
+    If SOLOMON_VERIFY_CONFIRM is enabled, only POST requests log in. Other requests render a confirmation page
+    without changing the token.
+
+    If SOLOMON_REMEMBER_DEVICE is enabled, the browser is remembered for later logins of the user.
+
     Args:
         request (HttpRequest): The HTTP request object.
         pk (int): The primary key of the token.
         token_string (str): The token string of the token.
+        shard (Optional[int]): The index of the shard the token is stored on, if SOLOMON_SHARDS is set.
 
     Returns:
         HttpResponse: The HTTP response object with the rendered template.
     """
-    if not (user := authenticate(request, token_pk=pk, token_string=token_string)):
+    ip_address = get_ip_address(request)
+    if is_blocked(ip_address):
+        return HttpResponse(status=429)
+
+    if check_verify_link(ip_address, pk, token_string) is not None:
+        return render(request, settings.SOLOMON_LOGIN_FAILED_TEMPLATE, {})
+
+    if settings.SOLOMON_VERIFY_CONFIRM and request.method != "POST":
+        return verify_confirm(request, pk, token_string, shard)
+
+    if not (user := authenticate(request, token_pk=pk, token_string=token_string, token_shard=shard)):
+        reject_verify_link(ip_address, pk, token_string)
         return render(request, settings.SOLOMON_LOGIN_FAILED_TEMPLATE, {})
 
     login(request, user)
 
-    token = SolomonToken.objects.get(pk=pk)
+    token = SolomonToken.objects.for_shard(shard).get(pk=pk)
+    response = redirect_after_login(request, token, user)
+    if settings.SOLOMON_REMEMBER_DEVICE:
+        remember_device(request, response, user)
+    return response
+
+
+@csrf_exempt
+@never_cache
+@login_not_required
+@profiled("login_code_view")
+def login_code_view(request: HttpRequest) -> HttpResponse:
+    """
+    Logs in with the one-time code of a token, as an alternative to clicking its link.
+
+    The token is looked up by the email address and the digest of the code. It is validated and consumed like a
+    clicked link, so either path completes the login once. Every wrong code counts against each active token of the
+    email address, which is disabled after SOLOMON_LOGIN_CODE_MAX_ATTEMPTS wrong codes. After
+    SOLOMON_LOGIN_CODE_EMAIL_MAX_ATTEMPTS wrong codes, the email address is locked until SOLOMON_MAX_TOKEN_LIFETIME
+    has passed since the last one. If SOLOMON_VERIFY_FAILURE_LIMIT is set, wrong codes also count as failures of the
+    IP address.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: A redirect to the token's redirect URL, or the login code page with the errors.
+    """
+    if not settings.SOLOMON_LOGIN_CODE:
+        raise Http404
+
+    if request.method != "POST":
+        form = LoginCodeForm(initial={"email": request.GET.get("email", "")})
+        return render(request, settings.SOLOMON_LOGIN_CODE_TEMPLATE, {"form": form})
+
+    ip_address = get_ip_address(request)
+    if is_blocked(ip_address):
+        return HttpResponse(status=429)
+
+    form = LoginCodeForm(request.POST)
+    if form.is_valid():
+        email, code = form.cleaned_data["email"], form.cleaned_data["code"]
+        if is_code_locked(email):
+            form.add_error(None, _("Too many wrong codes. Please try again later."))
+        else:
+            token = (
+                SolomonToken.objects.for_email(email)
+                .filter(email=email, code_hash=hash_value(code).hex())
+                .active()
+                .order_by("-created_at")
+                .first()
+            )
+            if token and (user := authenticate(request, token=token)):
+                login(request, user)
+                return redirect_after_login(request, token, user)
+            register_code_failure(email)
+            register_failure(ip_address)
+            form.add_error("code", _("This code is invalid or has expired."))
+
+    return render(request, settings.SOLOMON_LOGIN_CODE_TEMPLATE, {"form": form})
+
+
+def redirect_after_login(request: HttpRequest, token: SolomonToken, user: AbstractBaseUser) -> HttpResponse:
+    """
+    Redirects to the token's redirect URL after its link or code logged in the user.
+
+    If SOLOMON_CROSS_DEVICE_LOGIN is enabled and another browser waits for the token, the user is redirected to the
+    pending login confirm page instead.
+
+    Returns:
+        HttpResponse: The redirect.
+    """
+    if settings.SOLOMON_CROSS_DEVICE_LOGIN and resolve_pending_login(request, token, user):
+        return redirect("solomon:pending_login_confirm")
     return redirect(token.redirect_url)
 
 
+@never_cache
+@login_not_required
+def pending_login_confirm_view(request: HttpRequest) -> HttpResponse:
+    """
+    Asks the user who clicked a link whether the browser that requested it should be logged in as well.
+
+    The waiting browser is only logged in after the code it shows is entered here, so nobody can request a link for
+    somebody else's email address and wait for its owner to click it.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: The confirm page, or a redirect to the token's redirect URL once the login was confirmed.
+    """
+    if not settings.SOLOMON_CROSS_DEVICE_LOGIN or not request.user.is_authenticated:
+        raise Http404
+    if (pending := request.session.get(CONFIRM_SESSION_KEY)) is None:
+        raise Http404
+    shard, token_pk = pending
+    if (token := SolomonToken.objects.for_shard(shard).filter(pk=token_pk).first()) is None:
+        raise Http404
+
+    form = PendingLoginConfirmForm(request.POST or None)
+    if form.is_valid():
+        if confirm_pending_login(token, request.user, form.cleaned_data["code"]):
+            del request.session[CONFIRM_SESSION_KEY]
+            return redirect(token.redirect_url)
+        form.add_error("code", _("This code doesn't match the code shown on the other device."))
+
+    context = {"form": form, "redirect_url": token.redirect_url}
+    return render(request, settings.SOLOMON_PENDING_LOGIN_CONFIRM_TEMPLATE, context)
+
+
+@login_not_required
+async def pending_login_view(request: HttpRequest) -> HttpResponse:
+    """
+    Long-poll view for the browser that requested a magic link.
+
+    It waits until the token remembered in the session is consumed, possibly on another device, and then logs in the
+    session as well. On another device, the login has to be confirmed with the code shown by this browser first. The
+    view is async, so waiting clients don't occupy a thread when served by ASGI.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: A JSON response with the status "complete" and the redirect url, "pending" if the token wasn't
+        consumed within SOLOMON_PENDING_LOGIN_TIMEOUT seconds, or "unknown" if the session has no pending login.
+    """
+    if not settings.SOLOMON_CROSS_DEVICE_LOGIN:
+        raise Http404
+
+    pending = await sync_to_async(request.session.get)(SESSION_KEY)
+    if pending is None:
+        response = JsonResponse({"status": "unknown"}, status=404)
+    elif (user_pk := await wait_for_login(*pending)) is None:
+        response = JsonResponse({"status": "pending"})
+    else:
+        redirect_url = await sync_to_async(login_pending_user)(request, *pending, user_pk)
+        response = JsonResponse({"status": "complete", "redirect_url": redirect_url})
+
+    add_never_cache_headers(response)
+    return response
+
+
+def login_pending_user(request: HttpRequest, shard: int, token_pk: int, user_pk: int) -> str:
+    """
+    Logs in the user of a pending login and returns the redirect url of its token.
+    """
+    user = get_user_model().objects.get(pk=user_pk)
+    token = SolomonToken.objects.for_shard(shard).get(pk=token_pk)
+    login(request, user, backend="solomon.backends.SolomonBackend")
+    request.session.pop(SESSION_KEY, None)
+    return token.redirect_url
+
+
+def verify_confirm(request: HttpRequest, pk: int, token_string: str, shard: Optional[int] = None) -> HttpResponse:
+    """
+    Renders the confirmation page of the verify view without writing to the database.
+
+    Mail scanners and link prefetchers only issue GET requests, so they no longer disable a token for a different IP
+    address or browser. Every such request is counted in the VERIFY_BURN_PREVENTED metric.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        pk (int): The primary key of the token.
+        token_string (str): The token string of the token.
+        shard (Optional[int]): The index of the shard the token is stored on, if SOLOMON_SHARDS is set.
+
+    Returns:
+        HttpResponse: The confirmation page, or the failed page if the token can't be used anymore.
+    """
+    token = SolomonToken.objects.for_shard(shard).filter(pk=pk, token_string=token_string).first()
+    reason = token.get_invalid_reason(request) if token else None
+
+    if not token or reason in (InvalidReason.DISABLED, InvalidReason.CONSUMED, InvalidReason.EXPIRED):
+        mark_dead_token(pk, token_string)
+        return render(request, settings.SOLOMON_LOGIN_FAILED_TEMPLATE, {})
+
+    if reason is not None:
+        increment(VERIFY_BURN_PREVENTED)
+
+    return render(request, settings.SOLOMON_VERIFY_CONFIRM_TEMPLATE, {})
+
+
 def logout_view(request: HttpRequest) -> HttpResponse:
     return render(request, settings.SOLOMON_LOGOUT_TEMPLATE_NAME)
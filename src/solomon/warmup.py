@@ -0,0 +1,87 @@
+import logging
+import time
+from typing import Callable
+
+from django.core.checks import ERROR
+from django.template.loader import get_template
+from django.urls import NoReverseMatch, reverse
+from django.utils.module_loading import import_string
+
+from solomon.checks import check_settings
+from solomon.conf import SesameAuthAppConfig, settings
+from solomon.utils import get_allowed_email_domains, get_blocked_email_domains, get_trusted_proxies
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_settings() -> None:
+    for name in dir(SesameAuthAppConfig):
+        if name.isupper():
+            getattr(settings, f"SOLOMON_{name}")
+
+
+def load_templates() -> None:
+    for name in dir(SesameAuthAppConfig):
+        if name.endswith("_TEMPLATE"):
+            get_template(getattr(settings, f"SOLOMON_{name}"))
+
+
+def import_mail_backend() -> None:
+    import_string(settings.EMAIL_BACKEND)
+    if settings.SOLOMON_MAIL_QUEUE_DEPTH_CALLBACK:
+        import_string(settings.SOLOMON_MAIL_QUEUE_DEPTH_CALLBACK)
+
+
+def reverse_urls() -> None:
+    try:
+        reverse("solomon:verify", kwargs={"pk": 1, "token_string": "x"})
+    except NoReverseMatch:
+        # The sharded pattern is the only one if SOLOMON_SHARDS is set, and the urls might not be included at all.
+        reverse("solomon:verify", kwargs={"shard": 0, "pk": 1, "token_string": "x"})
+
+
+def build_network_sets() -> None:
+    get_trusted_proxies()
+
+
+def build_domain_sets() -> None:
+    get_allowed_email_domains()
+    get_blocked_email_domains()
+
+
+def validate_settings() -> None:
+    for message in check_settings(None):
+        logger.log(logging.ERROR if message.level >= ERROR else logging.WARNING, "%s", message)
+
+
+WARMUP_STEPS: dict[str, Callable[[], None]] = {
+    "settings": resolve_settings,
+    "checks": validate_settings,
+    "templates": load_templates,
+    "mail backend": import_mail_backend,
+    "urls": reverse_urls,
+    "trusted proxies": build_network_sets,
+    "email domains": build_domain_sets,
+}
+
+
+def warm_up() -> dict[str, float]:
+    """
+    Does the work that would otherwise slow down the first login request of a new process.
+
+    Every step is timed and logged. A failing step is logged and doesn't stop the other steps, so a broken warm-up
+    never prevents the process from starting.
+
+    Returns:
+        dict[str, float]: The duration of every step in seconds.
+    """
+    timings = {}
+    for name, step in WARMUP_STEPS.items():
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception("Warm-up of %s failed.", name)
+        timings[name] = time.perf_counter() - start
+        logger.info("Warmed up %s in %.1f ms.", name, timings[name] * 1000)
+    return timings
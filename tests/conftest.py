@@ -1,9 +1,50 @@
 import pytest
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
 from django.urls import reverse
 
+from solomon.mail import mail_circuit_breaker
 from solomon.models import SolomonToken
 
 
+def enable_wal(sender, connection, **kwargs):  # noqa: ARG001
+    if connection.vendor == "sqlite" and not connection.is_in_memory_db():
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+
+
+connection_created.connect(enable_wal)
+
+concurrency_stats_key = pytest.StashKey[list[str]]()
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):  # noqa: ARG001
+    if stats := config.stash.get(concurrency_stats_key, None):
+        terminalreporter.section("concurrency")
+        for line in stats:
+            terminalreporter.write_line(line)
+
+
+@pytest.fixture
+def concurrency_stats(request) -> list[str]:
+    """
+    Collects the throughput and lock-wait statistics of the concurrency tests for the terminal summary.
+    """
+    return request.config.stash.setdefault(concurrency_stats_key, [])
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_mail_circuit_breaker():
+    yield
+    mail_circuit_breaker.reset()
+
+
 @pytest.fixture
 def active_user(django_user_model, faker):
     return django_user_model.objects.create_user(
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import os
 import pathlib
+import tempfile
 from typing import Any
 
 BASE_DIR = pathlib.Path(__file__).resolve().parent
@@ -25,7 +27,19 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": ":memory:",
-    }
+        # A file-backed database in WAL mode (see conftest.py), so the concurrency tests can run threads with their
+        # own connections against it.
+        "OPTIONS": {"timeout": 30},
+        "TEST": {"NAME": str(pathlib.Path(tempfile.gettempdir()) / f"solomon-test-{os.getpid()}.sqlite3")},
+    },
+    "shard1": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    },
+    "shard2": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    },
 }
 
 MIDDLEWARE = [
@@ -36,6 +50,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "solomon.middleware.ClientIPMiddleware",
 ]
 
 TEMPLATES: list[dict[str, Any]] = [
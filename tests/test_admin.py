@@ -1,9 +1,13 @@
+from unittest.mock import Mock
+
 import pytest
 from django.contrib.admin.sites import AdminSite
+from django.db import connection
 from django.test import RequestFactory
+from django.urls import reverse
 
-from solomon.admin import SolomonTokenAdmin
-from solomon.models import SolomonToken
+from solomon.admin import EstimatedCountPaginator, SolomonDeviceAdmin, SolomonTokenAdmin, TokenStatusListFilter
+from solomon.models import SolomonDevice, SolomonToken, SolomonTokenStats, TokenStatus
 
 
 @pytest.fixture
@@ -43,7 +47,57 @@ def test_list_display(token_admin):
 
 
 def test_search_fields(token_admin):
-    assert token_admin.search_fields == ("email",)
+    assert token_admin.search_fields == ("^email",)
+
+
+def test_changelist_settings(token_admin):
+    assert token_admin.paginator is EstimatedCountPaginator
+    assert token_admin.show_full_result_count is False
+    assert token_admin.date_hierarchy == "created_at"
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "search_term, found",
+    [
+        ("test@example.com", True),
+        ("TEST@example.com ", True),
+        ("test", True),
+        ("est", False),
+        ("other@example.com", False),
+        ("", True),
+    ],
+)
+def test_get_search_results(token_admin, request_factory, token, search_term, found):
+    request = request_factory.get("/")
+    queryset, may_have_duplicates = token_admin.get_search_results(request, SolomonToken.objects.all(), search_term)
+    assert not may_have_duplicates
+    assert (token in queryset) == found
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("status", TokenStatus.values)
+def test_status_list_filter(token_admin, request_factory, token, status):
+    if status == TokenStatus.CONSUMED:
+        token.consume()
+    elif status == TokenStatus.DISABLED:
+        token.disable()
+    elif status == TokenStatus.EXPIRED:
+        SolomonToken.objects.filter(pk=token.pk).update(expiry_date=token.created_at)
+
+    request = request_factory.get("/")
+    for value in TokenStatus.values:
+        list_filter = TokenStatusListFilter(request, {"status": [value]}, SolomonToken, token_admin)
+        queryset = list_filter.queryset(request, SolomonToken.objects.all())
+        assert (token in queryset) == (value == status)
+
+
+@pytest.mark.django_db
+def test_estimated_count_paginator(settings, token):
+    settings.SOLOMON_ADMIN_COUNT_LIMIT = 1
+    SolomonToken.objects.create(email="test@example.com", ip_address="127.0.0.1", redirect_url="/")
+    paginator = EstimatedCountPaginator(SolomonToken.objects.order_by("pk"), 100)
+    assert paginator.count == 1
 
 
 @pytest.mark.django_db
@@ -78,3 +132,106 @@ def test_is_consumed_boolean(token_admin):
 
 def test_is_disabled_boolean(token_admin):
     assert token_admin.is_disabled.boolean is True
+
+
+@pytest.mark.django_db
+def test_has_disable_permission(token_admin, request_factory, admin_user, django_user_model):
+    request = request_factory.get("/")
+    request.user = admin_user
+    assert token_admin.has_disable_permission(request)
+    request.user = django_user_model.objects.create_user("staff", is_staff=True)
+    assert not token_admin.has_disable_permission(request)
+
+
+@pytest.mark.django_db
+def test_disable_tokens_action(token_admin, token):
+    token_admin.message_user = Mock()
+    token_admin.disable_tokens(None, SolomonToken.objects.filter(pk=token.pk))
+    token.refresh_from_db()
+    assert token.disabled_at is not None
+    assert token_admin.message_user.call_args.args[1] == "1 token was disabled."
+
+
+@pytest.mark.django_db
+def test_disable_tokens_for_domains_action(token_admin, token):
+    other = SolomonToken.objects.create(email="other@example.com", ip_address="10.0.0.1", redirect_url="/")
+    foreign = SolomonToken.objects.create(email="other@example.org", ip_address="10.0.0.1", redirect_url="/")
+    token_admin.message_user = Mock()
+    token_admin.disable_tokens_for_domains(None, SolomonToken.objects.filter(pk=token.pk))
+    other.refresh_from_db()
+    foreign.refresh_from_db()
+    assert other.disabled_at is not None
+    assert foreign.disabled_at is None
+    assert token_admin.message_user.call_args.args[1] == "2 tokens were disabled."
+
+
+@pytest.mark.django_db
+def test_disable_tokens_for_networks_action(token_admin, token):
+    neighbour = SolomonToken.objects.create(email="other@example.com", ip_address="127.0.0.2", redirect_url="/")
+    stranger = SolomonToken.objects.create(email="other@example.com", ip_address="127.0.1.1", redirect_url="/")
+    token_admin.message_user = Mock()
+    token_admin.disable_tokens_for_networks(None, SolomonToken.objects.filter(pk=token.pk))
+    neighbour.refresh_from_db()
+    stranger.refresh_from_db()
+    assert neighbour.disabled_at is not None
+    assert stranger.disabled_at is None
+
+
+@pytest.mark.django_db
+def test_disable_tokens_for_networks_action_skips_tokens_without_ip_address(token_admin, token):
+    neighbour = SolomonToken.objects.create(email="other@example.com", ip_address="127.0.0.2", redirect_url="/")
+    legacy = SolomonToken.objects.create(email="other@example.com", ip_address="10.0.0.1", redirect_url="/")
+    with connection.cursor() as cursor:
+        cursor.execute(f"UPDATE {SolomonToken._meta.db_table} SET ip_address = X'' WHERE id = %s", [legacy.pk])
+    assert SolomonToken.objects.get(pk=legacy.pk).ip_address is None
+
+    token_admin.message_user = Mock()
+    token_admin.disable_tokens_for_networks(None, SolomonToken.objects.filter(pk__in=[token.pk, legacy.pk]))
+    neighbour.refresh_from_db()
+    assert neighbour.disabled_at is not None
+    assert token_admin.message_user.call_args.args[1] == "2 tokens were disabled."
+
+    token_admin.disable_tokens_for_networks(None, SolomonToken.objects.filter(pk=legacy.pk))
+    assert token_admin.message_user.call_args.args[1] == "0 tokens were disabled."
+
+
+@pytest.mark.django_db
+def test_revoke_devices_of_users_action(admin_site, django_user_model):
+    user, other_user = django_user_model.objects.create(username="user"), django_user_model.objects.create()
+    devices = [
+        SolomonDevice.objects.create(user=owner, secret_digest=b"x" * 16, expiry_date="2100-01-01T00:00:00Z")
+        for owner in (user, user, other_user)
+    ]
+    device_admin = SolomonDeviceAdmin(SolomonDevice, admin_site)
+    device_admin.message_user = Mock()
+    device_admin.revoke_devices_of_users(None, SolomonDevice.objects.filter(pk=devices[0].pk))
+    assert list(SolomonDevice.objects.all()) == [devices[2]]
+    assert device_admin.message_user.call_args.args[1] == "2 devices were revoked."
+
+
+@pytest.mark.django_db
+def test_token_stats_changelist(admin_client):
+    SolomonTokenStats.objects.create(hour="2024-05-01T10:00:00Z", issued=3, consumed=2)
+    response = admin_client.get(reverse("admin:solomon_solomontokenstats_changelist"))
+    assert response.status_code == 200
+    assert reverse("admin:solomon_solomontokenstats_daily") in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_token_stats_daily_view(admin_client):
+    SolomonTokenStats.objects.create(hour="2024-05-01T10:00:00Z", issued=3, consumed=2)
+    SolomonTokenStats.objects.create(hour="2024-05-01T11:00:00Z", issued=1, expired=1)
+    SolomonTokenStats.objects.create(hour="2024-05-02T11:00:00Z", disabled=4)
+    response = admin_client.get(reverse("admin:solomon_solomontokenstats_daily"))
+    assert response.status_code == 200
+    assert [(day["issued"], day["consumed"], day["disabled"], day["expired"]) for day in response.context["days"]] == [
+        (0, 0, 4, 0),
+        (4, 2, 0, 1),
+    ]
+
+
+@pytest.mark.django_db
+def test_token_stats_daily_view_requires_permission(client, django_user_model):
+    client.force_login(django_user_model.objects.create_user("staff", is_staff=True))
+    response = client.get(reverse("admin:solomon_solomontokenstats_daily"))
+    assert response.status_code == 403
@@ -0,0 +1,160 @@
+from datetime import timedelta
+
+import pytest
+import time_machine
+from django.urls import reverse
+
+from solomon.models import SolomonToken
+
+
+@pytest.fixture
+def relaxed(settings):
+    settings.SOLOMON_REQUIRE_SAME_IP = False
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+    return settings
+
+
+def post_json(client, name, data):
+    return client.post(reverse(f"solomon:{name}"), data, content_type="application/json")
+
+
+@pytest.mark.django_db
+def test_api_login(client, active_user, mailoutbox, settings):
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = True
+    response = post_json(client, "api_login", {"email": active_user.email, "redirect_url": "/dashboard/"})
+    assert response.status_code == 202
+    assert response.content == b'{"status":"sent"}'
+    assert response.cookies.get(settings.SOLOMON_COOKIE_NAME) is not None
+    token = SolomonToken.objects.get()
+    assert token.redirect_url == "/dashboard/"
+    assert token.ip_address == "127.0.0.1"
+    assert len(mailoutbox) == 1
+
+
+@pytest.mark.django_db
+def test_api_login_with_unsafe_redirect_url(client, active_user):
+    post_json(client, "api_login", {"email": active_user.email, "redirect_url": "https://evil.example.com/"})
+    assert SolomonToken.objects.get().redirect_url != "https://evil.example.com/"
+
+
+@pytest.mark.django_db
+def test_api_login_with_invalid_email(client):
+    response = post_json(client, "api_login", {"email": "not-an-email"})
+    assert response.status_code == 400
+    assert "email" in response.json()["errors"]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "extra",
+    [
+        {"HTTP_X_FORWARDED_FOR": "garbage", "REMOTE_ADDR": ""},
+        {"REMOTE_ADDR": ""},
+    ],
+)
+def test_api_login_without_valid_ip_address(client, active_user, extra):
+    response = client.post(
+        reverse("solomon:api_login"), {"email": active_user.email}, content_type="application/json", **extra
+    )
+    assert response.status_code == 400
+    assert "__all__" in response.json()["errors"]
+    assert not SolomonToken.objects.exists()
+
+
+@pytest.mark.django_db
+def test_api_login_with_invalid_json(client):
+    response = client.post(reverse("solomon:api_login"), "{", content_type="application/json")
+    assert response.status_code == 400
+    assert response.json() == {"error": "invalid_json"}
+
+
+def test_api_login_requires_post(client):
+    assert client.get(reverse("solomon:api_login")).status_code == 405
+
+
+@pytest.mark.django_db
+def test_api_verify(relaxed, client, token, active_user):
+    response = post_json(client, "api_verify", {"pk": token.pk, "token": token.token_string})
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok", "redirect_url": token.redirect_url}
+
+    response = client.get(reverse("solomon:api_status"))
+    assert response.json() == {"authenticated": True, "email": active_user.email}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "data, status, error",
+    [
+        ({"pk": 1, "token": "a" * 128}, 404, "not_found"),
+        ({"pk": 1, "token": "guess"}, 404, "not_found"),
+        ({"pk": "1"}, 404, "not_found"),
+    ],
+)
+def test_api_verify_with_unknown_token(client, data, status, error):
+    response = post_json(client, "api_verify", data)
+    assert response.status_code == status
+    assert response.json() == {"error": error}
+
+
+@pytest.mark.django_db
+def test_api_verify_with_consumed_token(relaxed, client, invalid_token):
+    response = post_json(client, "api_verify", {"pk": invalid_token.pk, "token": invalid_token.token_string})
+    assert response.status_code == 410
+    assert response.json() == {"error": "consumed"}
+
+    response = post_json(client, "api_verify", {"pk": invalid_token.pk, "token": invalid_token.token_string})
+    assert response.status_code == 410
+    assert response.json() == {"error": "invalid"}
+
+
+@pytest.mark.django_db
+def test_api_verify_with_expired_token(relaxed, client, token):
+    with time_machine.travel(token.expiry_date + timedelta(seconds=1)):
+        response = post_json(client, "api_verify", {"pk": token.pk, "token": token.token_string})
+    assert response.status_code == 410
+    assert response.json() == {"error": "expired"}
+    token.refresh_from_db()
+    assert token.disabled_at is not None
+
+
+@pytest.mark.django_db
+def test_api_verify_with_different_browser(relaxed, client, token):
+    relaxed.SOLOMON_REQUIRE_SAME_BROWSER = True
+    response = post_json(client, "api_verify", {"pk": token.pk, "token": token.token_string})
+    assert response.status_code == 403
+    assert response.json() == {"error": "browser_mismatch"}
+
+
+@pytest.mark.django_db
+def test_api_verify_with_unknown_user(relaxed, client, faker):
+    token = SolomonToken.objects.create(email=faker.email(), ip_address="127.0.0.1", redirect_url="/")
+    response = post_json(client, "api_verify", {"pk": token.pk, "token": token.token_string})
+    assert response.status_code == 403
+    assert response.json() == {"error": "unknown_user"}
+
+
+@pytest.mark.django_db
+def test_api_verify_with_blocked_ip(client, settings):
+    settings.SOLOMON_VERIFY_FAILURE_LIMIT = 1
+    post_json(client, "api_verify", {"pk": 1, "token": "guess"})
+    response = post_json(client, "api_verify", {"pk": 1, "token": "guess"})
+    assert response.status_code == 429
+
+
+@pytest.mark.django_db
+def test_api_status_anonymous(client):
+    response = client.get(reverse("solomon:api_status"))
+    assert response.content == b'{"authenticated":false,"email":null}'
+
+
+@pytest.mark.django_db
+def test_api_login_with_full_mail_queue(client, active_user, settings, monkeypatch):
+    settings.SOLOMON_MAIL_QUEUE_DEPTH_CALLBACK = "tests.test_mail.get_test_queue_depth"
+    settings.SOLOMON_MAIL_MAX_QUEUE_DEPTH = 1
+    monkeypatch.setattr("tests.test_mail.queue_depth", 1)
+    response = post_json(client, "api_login", {"email": active_user.email})
+    assert response.status_code == 503
+    assert response.json() == {"error": "mail_unavailable"}
+    assert response["Retry-After"] == str(settings.SOLOMON_MAIL_UNAVAILABLE_RETRY_AFTER)
+    assert not SolomonToken.objects.exists()
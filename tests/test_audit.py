@@ -0,0 +1,111 @@
+import pytest
+from django.db import DatabaseError
+
+from solomon.audit import EventBuffer, event_buffer
+from solomon.backends import SolomonBackend
+from solomon.models import InvalidReason, SolomonTokenEvent, TokenEventType
+
+
+@pytest.fixture
+def audit_log(settings):
+    settings.SOLOMON_AUDIT_LOG = True
+    settings.SOLOMON_AUDIT_SYNCHRONOUS = True
+    settings.SOLOMON_REQUIRE_SAME_IP = False
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+    return settings
+
+
+def events():
+    return list(SolomonTokenEvent.objects.order_by("pk").values_list("event", "reason"))
+
+
+@pytest.mark.django_db
+def test_no_events_without_audit_log(settings, token, rf):
+    settings.SOLOMON_AUDIT_LOG = False
+    token.disable()
+    assert not token.is_valid(rf.get("/"))
+    assert SolomonTokenEvent.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_failed_validation_is_recorded(audit_log, disabled_token, rf):
+    request = rf.get("/", HTTP_USER_AGENT="pytest", REMOTE_ADDR="203.0.113.195")
+    assert not disabled_token.is_valid(request)
+    event = SolomonTokenEvent.objects.get()
+    assert event.token_pk == disabled_token.pk
+    assert event.email == disabled_token.email
+    assert event.event == TokenEventType.FAIL
+    assert event.reason == InvalidReason.DISABLED
+    assert event.ip_address == "203.0.113.195"
+    assert event.user_agent == "pytest"
+
+
+@pytest.mark.django_db
+def test_ip_mismatch_is_recorded(audit_log, token, rf):
+    audit_log.SOLOMON_REQUIRE_SAME_IP = True
+    assert not token.is_valid(rf.get("/", REMOTE_ADDR="not-an-ip"))
+    event = SolomonTokenEvent.objects.get()
+    assert event.reason == InvalidReason.IP_MISMATCH
+    assert event.ip_address is None
+
+
+@pytest.mark.django_db
+def test_verify_and_consume_are_recorded(audit_log, token, rf):
+    SolomonBackend().authenticate(rf.get("/"), token_pk=token.pk, token_string=token.token_string)
+    assert events() == [(TokenEventType.VERIFY, ""), (TokenEventType.CONSUME, "")]
+
+
+@pytest.mark.django_db
+def test_issue_is_recorded(audit_log, client, login_view_url, active_user):
+    client.post(login_view_url, {"email": active_user.email, "ip_address": "127.0.0.1", "redirect_url": "/"})
+    assert events() == [(TokenEventType.ISSUE, "")]
+
+
+@pytest.mark.django_db
+def test_events_are_buffered(audit_log, disabled_token, rf):
+    audit_log.SOLOMON_AUDIT_SYNCHRONOUS = False
+    audit_log.SOLOMON_AUDIT_BUFFER_SIZE = 3
+    audit_log.SOLOMON_AUDIT_FLUSH_INTERVAL = 60
+    event_buffer.flush()
+
+    request = rf.get("/")
+    for _ in range(2):
+        disabled_token.is_valid(request)
+    assert SolomonTokenEvent.objects.count() == 0
+    assert len(event_buffer) == 2
+
+    disabled_token.is_valid(request)
+    assert SolomonTokenEvent.objects.count() == 3
+    assert len(event_buffer) == 0
+
+
+@pytest.mark.django_db
+def test_event_buffer_flushes_after_interval(settings):
+    settings.SOLOMON_AUDIT_FLUSH_INTERVAL = 0
+    buffer = EventBuffer()
+    buffer.add(SolomonTokenEvent(email="test@example.com", event=TokenEventType.ISSUE))
+    assert len(buffer) == 0
+    assert SolomonTokenEvent.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_event_buffer_keeps_event_time(settings):
+    settings.SOLOMON_AUDIT_FLUSH_INTERVAL = 60
+    buffer = EventBuffer()
+    event = SolomonTokenEvent(email="test@example.com", event=TokenEventType.ISSUE)
+    created_at = event.created_at
+    buffer.add(event)
+    assert buffer.flush() == 1
+    assert SolomonTokenEvent.objects.get().created_at == created_at
+
+
+@pytest.mark.django_db
+def test_event_buffer_flush_errors_are_logged(audit_log, client, login_view_url, active_user, caplog, mocker):
+    audit_log.SOLOMON_AUDIT_SYNCHRONOUS = False
+    audit_log.SOLOMON_AUDIT_BUFFER_SIZE = 1
+    mocker.patch.object(SolomonTokenEvent.objects, "bulk_create", side_effect=DatabaseError("disk full"))
+
+    response = client.post(login_view_url, {"email": active_user.email})
+    assert response.status_code == 200
+    assert len(event_buffer) == 0
+    assert "Writing 1 audit events failed." in caplog.text
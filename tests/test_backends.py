@@ -1,6 +1,9 @@
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from solomon.backends import SolomonBackend
+from solomon.models import SolomonToken
 
 
 @pytest.mark.django_db
@@ -13,3 +16,32 @@ def test_get_user_with_active_user(token, active_user):
 def test_get_user_with_non_existent_user(faker):
     backend = SolomonBackend()
     assert backend.get_user(2) is None
+
+
+@pytest.mark.django_db
+def test_authenticate_with_token_consumed_concurrently(settings, rf, token):
+    settings.SOLOMON_REQUIRE_SAME_IP = False
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+    SolomonToken.objects.get(pk=token.pk).consume()
+    assert SolomonBackend().authenticate(rf.get("/"), token=token) is None
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("is_signup", [True, False])
+def test_authenticate_creates_user_of_signup_token(settings, rf, faker, django_user_model, is_signup):
+    settings.SOLOMON_REQUIRE_SAME_IP = False
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+    token = SolomonToken.objects.create(email=faker.email(), ip_address=faker.ipv4(), redirect_url="/")
+    token.is_signup = is_signup
+    token.save()
+
+    with CaptureQueriesContext(connection) as queries:
+        user = SolomonBackend().authenticate(rf.get("/"), token=token)
+
+    if is_signup:
+        assert user.email == token.email
+        assert not user.has_usable_password()
+        assert len([query for query in queries if query["sql"].startswith('INSERT INTO "auth_user"')]) == 1
+    else:
+        assert user is None
+        assert not django_user_model.objects.exists()
@@ -0,0 +1,45 @@
+from django.contrib.auth.models import AbstractUser
+from django.db import models
+from django.db.models.functions import Lower
+from django.test.utils import isolate_apps
+
+from solomon.checks import check_settings, check_user_email_index, has_lower_index
+
+
+def test_check_settings_without_problems():
+    assert check_settings(None) == []
+
+
+def test_check_settings(settings):
+    settings.SOLOMON_CACHE_ALIAS = "missing"
+    settings.SOLOMON_SHARDS = ["default", "missing"]
+    settings.SOLOMON_TRUSTED_PROXIES = ["10.0.0.0/8", "not-a-network"]
+    settings.SOLOMON_BLOCKED_EMAIL_DOMAINS_FILE = "/does/not/exist.txt"
+    settings.SOLOMON_PROFILING_SAMPLE_RATE = 0.01
+    settings.SOLOMON_CROSS_DEVICE_LOGIN = True
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = True
+    settings.SOLOMON_MAIL_MAX_QUEUE_DEPTH = 100
+    assert [message.id for message in check_settings(None)] == [
+        "solomon.E001",
+        "solomon.E002",
+        "solomon.E003",
+        "solomon.E004",
+        "solomon.E005",
+        "solomon.W001",
+        "solomon.W002",
+    ]
+
+
+def test_check_user_email_index():
+    assert [message.id for message in check_user_email_index(None)] == ["solomon.W003"]
+
+
+@isolate_apps("tests")
+def test_has_lower_index():
+    class IndexedUser(AbstractUser):
+        class Meta:
+            app_label = "tests"
+            indexes = [models.Index(Lower("email"), name="user_email_lower")]
+
+    assert has_lower_index(IndexedUser, "email")
+    assert not has_lower_index(IndexedUser, "username")
@@ -0,0 +1,88 @@
+import gzip
+import json
+from datetime import timedelta
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+
+from solomon.models import SolomonToken
+
+
+@pytest.fixture
+def tokens():
+    return [
+        SolomonToken.objects.create(email="first@example.com", ip_address="10.0.0.1", redirect_url="/"),
+        SolomonToken.objects.create(email="second@example.org", ip_address="10.0.1.1", redirect_url="/"),
+        SolomonToken.objects.create(email="third@example.org", ip_address="192.168.0.1", redirect_url="/"),
+    ]
+
+
+def disabled_emails():
+    return set(SolomonToken.objects.filter(disabled_at__isnull=False).values_list("email", flat=True))
+
+
+def test_disable_tokens_requires_a_filter(db):
+    with pytest.raises(CommandError):
+        call_command("solomon_disable_tokens")
+
+
+def test_disable_tokens_with_invalid_network(db):
+    with pytest.raises(CommandError):
+        call_command("solomon_disable_tokens", "--network", "not-a-network")
+
+
+@pytest.mark.django_db
+def test_disable_tokens_by_domain(tokens, capsys):
+    call_command("solomon_disable_tokens", "--domain", "example.org", "--chunk-size", "1")
+    assert disabled_emails() == {"second@example.org", "third@example.org"}
+    assert "Disabled 2 token(s)." in capsys.readouterr().out
+
+
+@pytest.mark.django_db
+def test_disable_tokens_by_network_and_domain(tokens):
+    call_command("solomon_disable_tokens", "--domain", "example.org", "--network", "10.0.0.0/16")
+    assert disabled_emails() == {"second@example.org"}
+
+
+@pytest.mark.django_db
+def test_disable_tokens_by_creation_window(tokens):
+    SolomonToken.objects.filter(email="first@example.com").update(created_at=timezone.now() - timedelta(days=2))
+    yesterday = (timezone.now() - timedelta(days=1)).date().isoformat()
+    call_command("solomon_disable_tokens", "--created-before", yesterday)
+    assert disabled_emails() == {"first@example.com"}
+
+
+@pytest.mark.django_db
+def test_disable_tokens_created_before_includes_the_whole_day(tokens):
+    yesterday = timezone.localtime() - timedelta(days=1)
+    SolomonToken.objects.filter(email="first@example.com").update(created_at=yesterday.replace(hour=23, minute=30))
+    call_command("solomon_disable_tokens", "--created-before", yesterday.date().isoformat())
+    assert disabled_emails() == {"first@example.com"}
+
+
+@pytest.mark.django_db
+def test_export_tokens_as_csv(tokens, capsys):
+    call_command("solomon_export_tokens", "--domain", "example.org")
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("id,email,")
+    assert len(lines) == 3
+
+
+@pytest.mark.django_db
+def test_export_tokens_as_gzipped_jsonl(tokens, tmp_path):
+    tokens[0].consume()
+    output = tmp_path / "tokens.jsonl.gz"
+    call_command(
+        "solomon_export_tokens", "--format", "jsonl", "--gzip", "--status", "consumed", "--output", str(output)
+    )
+    with gzip.open(output, "rt") as stream:
+        rows = [json.loads(line) for line in stream]
+    assert [row["email"] for row in rows] == ["first@example.com"]
+
+
+@pytest.mark.django_db
+def test_export_tokens_to_file(tokens, tmp_path):
+    output = tmp_path / "tokens.csv"
+    call_command("solomon_export_tokens", "--output", str(output), "--chunk-size", "1")
+    assert len(output.read_text().splitlines()) == 4
@@ -0,0 +1,109 @@
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+import pytest
+from django.db import connection, connections
+from django.test import Client
+
+from solomon.models import SolomonToken
+from solomon.utils import get_or_create_user
+
+THREADS = 8
+
+# SQLite waits up to 5 seconds for the write lock before it raises "database is locked", so a call that takes longer
+# than this is a lock-wait regression rather than a slow CI runner. Override it with the SOLOMON_LOCK_WAIT_BUDGET_MS
+# environment variable to measure locally.
+LOCK_WAIT_BUDGET_MS = float(os.environ.get("SOLOMON_LOCK_WAIT_BUDGET_MS", 5000))
+
+
+@pytest.fixture
+def run_concurrently(concurrency_stats: list[str]) -> Callable[..., list[Any]]:
+    """
+    Returns a function that runs func in the given number of threads, released at the same time by a barrier.
+
+    The latencies mostly consist of waiting for the SQLite write lock. The slowest call has to stay within
+    LOCK_WAIT_BUDGET_MS, and the throughput and latency percentiles are listed in the terminal summary.
+    """
+
+    def run(func: Callable[[int], Any], threads: int = THREADS, label: str = "") -> list[Any]:
+        barrier = threading.Barrier(threads)
+        latencies = []
+
+        def worker(index: int) -> Any:
+            try:
+                barrier.wait()
+                start = time.perf_counter()
+                result = func(index)
+                latencies.append(time.perf_counter() - start)
+                return result
+            finally:
+                connections.close_all()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(worker, range(threads)))
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        p50_ms, max_ms = statistics.median(latencies) * 1000, latencies[-1] * 1000
+        concurrency_stats.append(
+            f"{label}: {threads} calls in {elapsed * 1000:.1f} ms ({threads / elapsed:.0f}/s), latency "
+            f"p50 {p50_ms:.1f} ms, max {max_ms:.1f} ms"
+        )
+        assert max_ms < LOCK_WAIT_BUDGET_MS, f"{label}: the slowest call waited {max_ms:.1f} ms"
+        return results
+
+    return run
+
+
+@pytest.fixture
+def relaxed(settings):
+    settings.SOLOMON_REQUIRE_SAME_IP = False
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+
+
+def test_database_uses_wal(db):
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode")
+        assert cursor.fetchone()[0] == "wal"
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_verify_consumes_token_once(relaxed, rf, active_user, token, run_concurrently):
+    url = token.get_verify_url(rf.get("/"))
+
+    responses = run_concurrently(lambda _: Client().get(url), label="verify")
+
+    logged_in = [response for response in responses if response.status_code == 302]
+    assert len(logged_in) == 1
+    assert logged_in[0].url == token.redirect_url
+    token.refresh_from_db()
+    assert token.consumed_at is not None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_consume(token, run_concurrently):
+    results = run_concurrently(lambda _: SolomonToken.objects.get(pk=token.pk).consume(), label="consume")
+    assert results.count(True) == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_get_or_create_user(django_user_model, run_concurrently):
+    users = run_concurrently(lambda _: get_or_create_user("Race@Example.com"), label="get_or_create_user")
+    assert django_user_model.objects.filter(email="race@example.com").count() == 1
+    assert {user.pk for user in users} == {django_user_model.objects.get(email="race@example.com").pk}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_login_submissions(relaxed, active_user, login_view_url, mailoutbox, run_concurrently):
+    data = {"email": active_user.email, "ip_address": "127.0.0.1", "redirect_url": "/"}
+
+    responses = run_concurrently(lambda _: Client().post(login_view_url, data), label="login")
+
+    assert [response.status_code for response in responses] == [200] * THREADS
+    assert SolomonToken.objects.filter(email=active_user.email).count() == THREADS
+    assert len(mailoutbox) == THREADS
@@ -0,0 +1,162 @@
+import pytest
+from django.contrib.auth import SESSION_KEY as AUTH_SESSION_KEY
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+
+from solomon.models import SolomonDevice, SolomonToken
+
+
+@pytest.fixture
+def remember_device(settings):
+    settings.SOLOMON_REMEMBER_DEVICE = True
+    settings.SOLOMON_REQUIRE_SAME_IP = False
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+    return settings
+
+
+def verify(client, token):
+    return client.get(reverse("solomon:verify", kwargs={"pk": token.pk, "token_string": token.token_string}))
+
+
+def logout(client):
+    # The test client drops all cookies on logout, a browser keeps the device cookie.
+    value = client.cookies["solomon_device"].value
+    client.logout()
+    client.cookies["solomon_device"] = value
+
+
+def login(client, email, **data):
+    return client.post(reverse("solomon:login"), {"email": email, **data})
+
+
+@pytest.mark.django_db
+def test_verify_does_not_remember_device_by_default(client, token):
+    verify(client, token)
+    assert not SolomonDevice.objects.exists()
+    assert "solomon_device" not in client.cookies
+
+
+@pytest.mark.django_db
+def test_verify_remembers_device(remember_device, client, token, active_user):
+    response = verify(client, token)
+    device = SolomonDevice.objects.get()
+    assert device.user == active_user
+    cookie = response.cookies["solomon_device"]
+    assert cookie["httponly"]
+    assert cookie["max-age"] == remember_device.SOLOMON_REMEMBER_DEVICE_LIFETIME
+
+
+@pytest.mark.django_db
+def test_verify_rotates_remembered_device(remember_device, client, token, active_user):
+    verify(client, token)
+    device, cookie = SolomonDevice.objects.get(), client.cookies["solomon_device"].value
+
+    verify(client, SolomonToken.objects.create(email=active_user.email, ip_address="127.0.0.1", redirect_url="/"))
+    assert SolomonDevice.objects.get() == device
+    assert client.cookies["solomon_device"].value != cookie
+
+
+@pytest.mark.django_db
+def test_verify_replaces_device_of_other_user(remember_device, client, token, django_user_model, faker):
+    verify(client, token)
+    other_user = django_user_model.objects.create_user(faker.user_name(), email=faker.email())
+    verify(client, SolomonToken.objects.create(email=other_user.email, ip_address="127.0.0.1", redirect_url="/"))
+    assert SolomonDevice.objects.get().user == other_user
+
+
+@pytest.mark.django_db
+def test_purge_expired_devices(active_user, capsys):
+    SolomonDevice.objects.create(user=active_user, secret_digest=b"x" * 16, expiry_date="2000-01-01T00:00:00Z")
+    active = SolomonDevice.objects.create(user=active_user, secret_digest=b"y" * 16, expiry_date="2100-01-01T00:00:00Z")
+    call_command("solomon_purge_tokens", "--chunk-size", "1")
+    assert list(SolomonDevice.objects.all()) == [active]
+    assert "1 expired device(s)" in capsys.readouterr().out
+
+
+@pytest.mark.django_db
+def test_login_with_remembered_device(remember_device, client, token, active_user, mailoutbox):
+    verify(client, token)
+    logout(client)
+    cookie = client.cookies["solomon_device"].value
+
+    response = login(client, active_user.email.upper(), redirect_url="/dashboard/")
+    assert response.status_code == 302
+    assert response.url == "/dashboard/"
+    assert client.session[AUTH_SESSION_KEY] == str(active_user.pk)
+    assert SolomonToken.objects.count() == 1
+    assert not mailoutbox
+    # The cookie is rotated on every use.
+    assert client.cookies["solomon_device"].value != cookie
+    assert SolomonDevice.objects.get().last_used_at is not None
+
+
+@pytest.mark.django_db
+def test_login_with_device_of_other_user(remember_device, client, token, faker, mailoutbox):
+    verify(client, token)
+    logout(client)
+    response = login(client, faker.email())
+    assert response.status_code == 200
+    assert AUTH_SESSION_KEY not in client.session
+    assert len(mailoutbox) == 1
+
+
+@pytest.mark.django_db
+def test_login_with_device_of_inactive_user(remember_device, client, token, active_user, mailoutbox):
+    verify(client, token)
+    logout(client)
+    active_user.is_active = False
+    active_user.save()
+    login(client, active_user.email)
+    assert AUTH_SESSION_KEY not in client.session
+
+
+@pytest.mark.django_db
+def test_login_with_expired_device(remember_device, client, token, active_user, mailoutbox):
+    verify(client, token)
+    logout(client)
+    SolomonDevice.objects.update(expiry_date="2000-01-01T00:00:00Z")
+    login(client, active_user.email)
+    assert AUTH_SESSION_KEY not in client.session
+    assert len(mailoutbox) == 1
+
+
+@pytest.mark.django_db
+def test_login_with_forged_cookie(remember_device, client, token, active_user):
+    verify(client, token)
+    logout(client)
+    client.cookies["solomon_device"] = f"{SolomonDevice.objects.get().pk}:forged"
+    login(client, active_user.email)
+    assert AUTH_SESSION_KEY not in client.session
+    assert SolomonDevice.objects.exists()
+
+
+@pytest.mark.django_db
+def test_replayed_cookie_revokes_device(remember_device, client, token, active_user):
+    verify(client, token)
+    logout(client)
+    stolen = Client()
+    stolen.cookies["solomon_device"] = client.cookies["solomon_device"].value
+
+    login(client, active_user.email)
+    logout(client)
+    login(stolen, active_user.email)
+    assert AUTH_SESSION_KEY not in stolen.session
+    assert not SolomonDevice.objects.exists()
+
+    login(client, active_user.email)
+    assert AUTH_SESSION_KEY not in client.session
+
+
+@pytest.mark.django_db
+def test_revoke_devices(remember_device, client, token, active_user, django_user_model, faker):
+    verify(client, token)
+    other_user = django_user_model.objects.create_user(faker.user_name(), email=faker.email())
+    SolomonDevice.objects.create(user=other_user, secret_digest=b"x" * 16, expiry_date="2100-01-01T00:00:00Z")
+
+    assert SolomonDevice.objects.revoke(active_user) == 1
+    assert list(SolomonDevice.objects.values_list("user", flat=True)) == [other_user.pk]
+
+    logout(client)
+    login(client, active_user.email)
+    assert AUTH_SESSION_KEY not in client.session
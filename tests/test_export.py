@@ -0,0 +1,43 @@
+import json
+
+import pytest
+from django.contrib.admin.sites import AdminSite
+
+from solomon.admin import SolomonTokenAdmin
+from solomon.export import EXPORT_FIELDS, iter_csv, iter_jsonl, iter_token_rows
+from solomon.models import SolomonToken
+
+
+@pytest.mark.django_db
+def test_iter_token_rows(token, disabled_token):
+    rows = list(iter_token_rows(SolomonToken.objects.all(), chunk_size=1))
+    assert [row[0] for row in rows] == [token.pk, disabled_token.pk]
+    assert all(len(row) == len(EXPORT_FIELDS) for row in rows)
+    assert token.token_string not in {value for row in rows for value in row}
+
+
+@pytest.mark.django_db
+def test_iter_csv(token):
+    lines = list(iter_csv(iter_token_rows(SolomonToken.objects.all())))
+    assert lines[0] == ",".join(EXPORT_FIELDS) + "\r\n"
+    assert lines[1].startswith(f"{token.pk},{token.email},{token.ip_address},")
+    assert token.created_at.isoformat() in lines[1]
+
+
+@pytest.mark.django_db
+def test_iter_jsonl(token):
+    lines = list(iter_jsonl(iter_token_rows(SolomonToken.objects.all())))
+    assert len(lines) == 1
+    row = json.loads(lines[0])
+    assert row["id"] == token.pk
+    assert row["email"] == token.email
+    assert row["consumed_at"] is None
+
+
+@pytest.mark.django_db
+def test_export_tokens_as_csv_admin_action(token, rf):
+    token_admin = SolomonTokenAdmin(SolomonToken, AdminSite())
+    response = token_admin.export_tokens_as_csv(rf.get("/"), SolomonToken.objects.all())
+    assert response["Content-Type"] == "text/csv"
+    content = b"".join(response.streaming_content).decode()
+    assert token.email in content
@@ -0,0 +1,35 @@
+import pytest
+from django import forms
+from django.core.exceptions import ValidationError
+
+from solomon.fields import PackedIPAddressField
+
+
+@pytest.mark.parametrize(
+    "ip, packed",
+    [
+        ("10.0.0.1", b"\n\x00\x00\x01"),
+        ("2001:db8::1", b" \x01\r\xb8" + b"\x00" * 11 + b"\x01"),
+    ],
+)
+def test_packed_ip_address_round_trip(ip, packed):
+    field = PackedIPAddressField()
+    assert field.get_prep_value(ip) == packed
+    assert field.from_db_value(memoryview(packed), None, None) == ip
+    assert field.to_python(packed) == ip
+
+
+@pytest.mark.parametrize("value", [None, "", b""])
+def test_packed_ip_address_empty_values(value):
+    field = PackedIPAddressField(null=True)
+    assert field.get_prep_value(value) is None
+    assert field.to_python(value) is None
+
+
+def test_packed_ip_address_invalid_value():
+    with pytest.raises(ValidationError):
+        PackedIPAddressField().to_python("not-an-ip")
+
+
+def test_packed_ip_address_formfield():
+    assert isinstance(PackedIPAddressField().formfield(), forms.GenericIPAddressField)
@@ -9,9 +9,9 @@ def test_login_form_with_valid_data(faker):
     form = LoginForm(
         {
             "email": faker.email(),
-            "ip_address": faker.ipv4(),
             "redirect_url": "/" + faker.uri_path(deep=3),
-        }
+        },
+        ip_address=faker.ipv4(),
     )
     assert form.is_valid()
 
@@ -21,22 +21,44 @@ def test_login_form_with_inactive_user(faker, inactive_user):
     form = LoginForm(
         {
             "email": inactive_user.email,
-            "ip_address": faker.ipv4(),
             "redirect_url": "/" + faker.uri_path(deep=3),
-        }
+        },
+        ip_address=faker.ipv4(),
     )
     assert not form.is_valid()
 
 
+@pytest.mark.django_db
+def test_login_form_with_blocked_domain(settings, faker, django_assert_num_queries):
+    settings.SOLOMON_BLOCKED_EMAIL_DOMAINS = ["mailinator.com"]
+    form = LoginForm(
+        {
+            "email": "User@Mailinator.com",
+            "redirect_url": "/" + faker.uri_path(deep=3),
+        },
+        ip_address=faker.ipv4(),
+    )
+    with django_assert_num_queries(0):
+        assert not form.is_valid()
+    assert form.errors["email"] == ["Logins with this email address are not allowed."]
+
+
 @pytest.mark.django_db
 def test_saving_form(faker):
     form = LoginForm(
         {
             "email": faker.email(),
-            "ip_address": faker.ipv4(),
             "redirect_url": "/" + faker.uri_path(deep=3),
-        }
+        },
+        ip_address=faker.ipv4(),
     )
     if form.is_valid():
         form.save()
     assert SolomonToken.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_saving_form_ignores_submitted_ip_address(faker):
+    form = LoginForm({"email": faker.email(), "redirect_url": "/", "ip_address": "10.0.0.1"}, ip_address="10.0.0.2")
+    assert form.is_valid()
+    assert form.save().ip_address == "10.0.0.2"
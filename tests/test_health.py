@@ -0,0 +1,97 @@
+import os
+import socket
+from datetime import timedelta
+
+import pytest
+import time_machine
+from django.urls import reverse
+from django.utils import timezone
+
+from solomon.health import collect_health, get_health
+from solomon.mail import mail_circuit_breaker
+from solomon.models import InvalidReason, SolomonToken
+
+
+@pytest.fixture
+def health(settings):
+    settings.SOLOMON_HEALTH_VIEW = True
+    settings.SOLOMON_HEALTH_WINDOW = 15 * 60
+    settings.SOLOMON_REQUIRE_SAME_IP = False
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+    return settings
+
+
+def create_token(email="user@example.com"):
+    return SolomonToken.objects.create(email=email, ip_address="127.0.0.1", redirect_url="/")
+
+
+@pytest.mark.django_db
+def test_collect_health(health, rf, active_user):
+    with time_machine.travel(timezone.now() - timedelta(hours=1)):
+        create_token()
+    create_token()
+    create_token().disable()
+    assert SolomonToken.objects.get(pk=create_token().pk).consume()
+    with time_machine.travel(timezone.now() + timedelta(seconds=30)):
+        token = create_token(active_user.email)
+        token.send_event("fail", rf.get("/"), reason=InvalidReason.IP_MISMATCH)
+        report = collect_health()
+
+    assert report["status"] == "ok"
+    assert report["tokens"] == {"issued": 4, "verified": 1, "disabled": 1, "active": 2, "estimated_tokens": 5}
+    assert report["oldest_active_token_age"] == 30
+    assert report["failures_total"][InvalidReason.IP_MISMATCH] == 1
+    assert report["failures_total"][InvalidReason.EXPIRED] == 0
+    assert report["mail"] == {
+        "process": f"{socket.gethostname()}:{os.getpid()}",
+        "queue_depth": None,
+        "circuit_breaker": "closed",
+    }
+
+
+@pytest.mark.django_db
+def test_collect_health_with_open_circuit_breaker(health):
+    for _ in range(health.SOLOMON_MAIL_BREAKER_MINIMUM_CALLS):
+        mail_circuit_breaker.record(0, failed=True)
+    report = collect_health()
+    assert report["status"] == "degraded"
+    assert report["oldest_active_token_age"] is None
+
+
+@pytest.mark.django_db
+def test_get_health_is_cached(health, django_assert_num_queries):
+    report = get_health()
+    create_token()
+    with django_assert_num_queries(0):
+        assert get_health() == report
+
+
+@pytest.mark.django_db
+def test_get_health_reports_mail_state_of_current_process(health):
+    assert get_health()["status"] == "ok"
+    for _ in range(health.SOLOMON_MAIL_BREAKER_MINIMUM_CALLS):
+        mail_circuit_breaker.record(0, failed=True)
+    # The token activity is still cached, the circuit breaker is read again.
+    report = get_health()
+    assert report["status"] == "degraded"
+    assert report["mail"]["circuit_breaker"] == "open"
+
+
+def test_health_view_disabled(client):
+    assert client.get(reverse("solomon:api_health")).status_code == 404
+
+
+@pytest.mark.django_db
+def test_health_view(health, client):
+    response = client.get(reverse("solomon:api_health"))
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
+    assert "no-cache" in response["Cache-Control"]
+
+    for _ in range(health.SOLOMON_MAIL_BREAKER_MINIMUM_CALLS):
+        mail_circuit_breaker.record(0, failed=True)
+    response = client.get(reverse("solomon:api_health"))
+    assert response.status_code == 200
+    assert response.json()["status"] == "degraded"
+    response = client.get(reverse("solomon:api_health"), {"strict": ""})
+    assert response.status_code == 503
@@ -0,0 +1,68 @@
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+# Generous, so the test only fails on a real regression and not on a slow CI runner. Override it with the
+# SOLOMON_IMPORT_BUDGET_MS environment variable to measure locally.
+IMPORT_BUDGET_MS = float(os.environ.get("SOLOMON_IMPORT_BUDGET_MS", 150))
+
+# Modules that are only needed to serve requests and must not be imported by django.setup(), e.g. for management
+# commands.
+LAZY_MODULES = {"solomon.api", "solomon.forms", "solomon.mail", "solomon.views", "solomon.warmup"}
+
+SETUP_SCRIPT = """
+import importlib
+import sys
+
+# -X importtime only reports import statements, not importlib.import_module(), which Django uses to import the apps
+# and their models. Route it through __import__ before Django binds it.
+def import_module(name, package=None):
+    name = importlib.util.resolve_name(name, package)
+    __import__(name)
+    return sys.modules[name]
+
+importlib.import_module = import_module
+
+import django
+from django.conf import settings
+
+settings.configure(
+    INSTALLED_APPS=["solomon", "django.contrib.contenttypes", "django.contrib.auth"],
+    DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}},
+)
+django.setup()
+"""
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)$")
+
+
+def import_times() -> dict[str, int]:
+    """
+    Runs django.setup() with solomon installed in a fresh interpreter and returns the self time of every imported
+    module in microseconds, as reported by `python -X importtime`.
+    """
+    src = str(Path(__file__).resolve().parent.parent / "src")
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", SETUP_SCRIPT],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": src, "DJANGO_SETTINGS_MODULE": ""},
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if match := IMPORTTIME_RE.match(line):
+            times[match.group(4)] = int(match.group(1))
+    return times
+
+
+def test_setup_import_budget():
+    times = import_times()
+    solomon_modules = {name: time for name, time in times.items() if name.split(".")[0] == "solomon"}
+
+    assert "solomon.models" in solomon_modules
+    assert not LAZY_MODULES & solomon_modules.keys()
+    total_ms = sum(solomon_modules.values()) / 1000
+    assert total_ms < IMPORT_BUDGET_MS, f"Importing solomon took {total_ms:.1f} ms: {solomon_modules}"
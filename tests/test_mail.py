@@ -0,0 +1,275 @@
+import socketserver
+import threading
+import time
+from collections import Counter
+from unittest.mock import Mock, patch
+
+import pytest
+from django.core.mail import EmailMessage
+
+from solomon.mail import (
+    CircuitBreaker,
+    MailScheduler,
+    MailUnavailable,
+    check_mail_available,
+    get_queue_depth,
+    mail_circuit_breaker,
+    mail_scheduler,
+    send_token_email,
+)
+from solomon.models import MailPriority, SolomonToken
+
+queue_depth = 0
+
+
+def get_test_queue_depth():
+    return queue_depth
+
+
+@pytest.fixture
+def breaker(settings):
+    settings.SOLOMON_MAIL_BREAKER_FAILURE_RATE = 0.5
+    settings.SOLOMON_MAIL_BREAKER_SLOW_CALL_DURATION = 1
+    settings.SOLOMON_MAIL_BREAKER_WINDOW = 4
+    settings.SOLOMON_MAIL_BREAKER_MINIMUM_CALLS = 4
+    settings.SOLOMON_MAIL_BREAKER_OPEN_DURATION = 30
+    return CircuitBreaker()
+
+
+def test_circuit_breaker_opens_at_failure_rate(breaker):
+    for failed in (False, True, False):
+        breaker.record(0, failed=failed)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+    breaker.record(0, failed=True)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(MailUnavailable) as exc_info:
+        breaker.before_call()
+    assert 0 < exc_info.value.retry_after <= 30
+
+
+def test_circuit_breaker_counts_slow_calls_as_failures(breaker):
+    for _ in range(4):
+        breaker.record(2, failed=False)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_circuit_breaker_forgets_outcomes_outside_window(breaker):
+    for _ in range(4):
+        breaker.record(0, failed=False)
+    breaker.record(0, failed=True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    # Two of the last four deliveries failed, the older successes are no longer taken into account.
+    breaker.record(0, failed=True)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+@pytest.mark.parametrize("failed, state", [(False, CircuitBreaker.CLOSED), (True, CircuitBreaker.OPEN)])
+def test_circuit_breaker_probes_when_half_open(settings, breaker, failed, state):
+    for _ in range(4):
+        breaker.record(0, failed=True)
+    settings.SOLOMON_MAIL_BREAKER_OPEN_DURATION = 0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    breaker.before_call()
+    settings.SOLOMON_MAIL_BREAKER_OPEN_DURATION = 30
+    # Only a single probe is let through.
+    with pytest.raises(MailUnavailable):
+        breaker.before_call()
+
+    breaker.record(0, failed=failed)
+    assert breaker.state == state
+
+
+def test_check_mail_available_with_queue_depth(settings, monkeypatch):
+    settings.SOLOMON_MAIL_QUEUE_DEPTH_CALLBACK = "tests.test_mail.get_test_queue_depth"
+    settings.SOLOMON_MAIL_MAX_QUEUE_DEPTH = 10
+    settings.SOLOMON_MAIL_UNAVAILABLE_RETRY_AFTER = 15
+    monkeypatch.setattr("tests.test_mail.queue_depth", 9)
+    assert get_queue_depth() == 9
+    check_mail_available()
+
+    monkeypatch.setattr("tests.test_mail.queue_depth", 10)
+    with pytest.raises(MailUnavailable) as exc_info:
+        check_mail_available()
+    assert exc_info.value.retry_after == 15
+
+
+def test_get_queue_depth_without_callback():
+    assert get_queue_depth() is None
+
+
+@pytest.mark.django_db
+def test_send_token_email_disables_token_on_failure(settings, rf, token):
+    settings.SOLOMON_MAIL_CIRCUIT_BREAKER = True
+    settings.SOLOMON_REQUIRE_SAME_IP = False
+    with patch("django.core.mail.send_mail", side_effect=OSError), pytest.raises(MailUnavailable):
+        send_token_email(token, rf.get("/"))
+    token.refresh_from_db()
+    assert token.disabled_at is not None
+
+
+@pytest.mark.django_db
+def test_send_token_email_without_circuit_breaker(settings, rf, token):
+    settings.SOLOMON_REQUIRE_SAME_IP = False
+    with patch("django.core.mail.send_mail", side_effect=OSError), pytest.raises(OSError):
+        send_token_email(token, rf.get("/"))
+    assert mail_circuit_breaker.state == CircuitBreaker.CLOSED
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        self.reply("220 fake ESMTP")
+        domain = recipient = None
+        while line := self.rfile.readline():
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb == "RCPT":
+                recipient = command.partition(":")[2].strip("<> ")
+                domain = recipient.rpartition("@")[2]
+                with server.lock:
+                    throttled = server.throttled[domain] > 0
+                    server.throttled[domain] -= throttled
+                self.reply("451 4.7.1 Too many mails, try again later" if throttled else "250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                with server.lock:
+                    server.active[domain] += 1
+                    server.max_active[domain] = max(server.max_active[domain], server.active[domain])
+                time.sleep(server.delays.get(domain, 0))
+                with server.lock:
+                    server.active[domain] -= 1
+                    server.delivered.append(recipient)
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    SMTP server that simulates a provider throttling: mails to a domain in "throttled" are rejected with a temporary
+    error that many times, and every mail to a domain in "delays" takes that many seconds.
+    """
+
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), FakeSMTPHandler)
+        self.lock = threading.Lock()
+        self.delivered: list[str] = []
+        self.delays: dict[str, float] = {}
+        self.throttled: Counter[str] = Counter()
+        self.active: Counter[str] = Counter()
+        self.max_active: Counter[str] = Counter()
+
+
+@pytest.fixture
+def smtp_server(settings):
+    server = FakeSMTPServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    settings.EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+    settings.EMAIL_HOST, settings.EMAIL_PORT = server.server_address
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def scheduler(settings):
+    settings.SOLOMON_MAIL_SCHEDULER_WORKERS = 2
+    settings.SOLOMON_MAIL_DOMAIN_CONCURRENCY = 1
+    settings.SOLOMON_MAIL_RETRY_DELAY = 0.05
+    return MailScheduler()
+
+
+def mail(to: str) -> EmailMessage:
+    return EmailMessage("Log in", "Your link", "noreply@example.com", [to])
+
+
+def test_mail_scheduler_shares_workers_between_domains(smtp_server, scheduler):
+    smtp_server.delays["big.example"] = 0.2
+    for i in range(4):
+        scheduler.submit(mail(f"user{i}@big.example"))
+    scheduler.submit(mail("user@small.example"))
+    assert scheduler.wait(timeout=10)
+
+    # The second worker delivers to the small domain while the big domain is capped at one delivery.
+    assert smtp_server.delivered[0] == "user@small.example"
+    assert smtp_server.max_active["big.example"] == 1
+    assert len(smtp_server.delivered) == 5
+
+
+def test_mail_scheduler_prefers_interactive_mails(smtp_server, scheduler, settings):
+    settings.SOLOMON_MAIL_SCHEDULER_WORKERS = 1
+    smtp_server.delays["slow.example"] = 0.2
+    scheduler.submit(mail("user@slow.example"), priority=MailPriority.BULK)
+    scheduler.submit(mail("user@a.example"), priority=MailPriority.BULK)
+    scheduler.submit(mail("user@b.example"), priority=MailPriority.BULK)
+    scheduler.submit(mail("user@c.example"))
+    assert scheduler.wait(timeout=10)
+
+    delivered = smtp_server.delivered
+    assert delivered.index("user@c.example") < delivered.index("user@a.example") < delivered.index("user@b.example")
+
+
+def test_mail_scheduler_retries_throttled_domain(smtp_server, scheduler, settings):
+    settings.SOLOMON_MAIL_MAX_RETRIES = 2
+    smtp_server.throttled["busy.example"] = 2
+    on_failure = Mock()
+    scheduler.submit(mail("user@busy.example"), on_failure=on_failure)
+    scheduler.submit(mail("user@quiet.example"))
+    assert scheduler.wait(timeout=10)
+
+    assert smtp_server.delivered == ["user@quiet.example", "user@busy.example"]
+    on_failure.assert_not_called()
+    assert len(scheduler) == 0
+
+
+def test_mail_scheduler_gives_up_after_retries(smtp_server, scheduler, settings):
+    settings.SOLOMON_MAIL_MAX_RETRIES = 1
+    smtp_server.throttled["busy.example"] = 5
+    on_failure = Mock()
+    scheduler.submit(mail("user@busy.example"), on_failure=on_failure)
+    assert scheduler.wait(timeout=10)
+
+    assert smtp_server.delivered == []
+    assert smtp_server.throttled["busy.example"] == 3
+    on_failure.assert_called_once_with()
+
+
+def test_mail_scheduler_limits_rate_per_domain(smtp_server, scheduler, settings):
+    settings.SOLOMON_MAIL_DOMAIN_CONCURRENCY = 2
+    settings.SOLOMON_MAIL_DOMAIN_RATE = 20
+    start = time.monotonic()
+    for i in range(4):
+        scheduler.submit(mail(f"user{i}@example.com"))
+    assert scheduler.wait(timeout=10)
+    assert time.monotonic() - start >= 3 / 20
+    assert len(smtp_server.delivered) == 4
+
+
+def test_get_queue_depth_with_mail_scheduler(settings):
+    settings.SOLOMON_MAIL_SCHEDULER = True
+    assert get_queue_depth() == 0
+
+
+def test_send_email_with_mail_scheduler_disables_undeliverable_token(transactional_db, smtp_server, settings, rf):
+    settings.SOLOMON_MAIL_SCHEDULER = True
+    settings.SOLOMON_MAIL_MAX_RETRIES = 0
+    token = SolomonToken.objects.create(email="user@busy.example", ip_address="127.0.0.1", redirect_url="/")
+    smtp_server.throttled["busy.example"] = 1
+    send_token_email(token, rf.get("/"))
+    assert mail_scheduler.wait(timeout=10)
+
+    token.refresh_from_db()
+    assert token.disabled_at is not None
@@ -0,0 +1,9 @@
+from solomon.metrics import get_counter, increment
+
+
+def test_increment():
+    assert get_counter("test") == 0
+    increment("test")
+    increment("test", 2)
+    assert get_counter("test") == 3
+    assert get_counter("other") == 0
@@ -0,0 +1,20 @@
+from django.http import HttpResponse
+
+from solomon.middleware import ClientIPMiddleware
+from solomon.utils import IP_ADDRESS_META_KEY
+
+
+def test_client_ip_middleware_stores_ip_address(rf, settings):
+    settings.SOLOMON_TRUSTED_PROXIES = ["10.0.0.0/8"]
+    request = rf.get("/", HTTP_X_FORWARDED_FOR="198.51.100.1, 10.0.0.2", REMOTE_ADDR="10.0.0.1")
+    middleware = ClientIPMiddleware(lambda _: HttpResponse())
+    middleware(request)
+    assert request.META[IP_ADDRESS_META_KEY] == "198.51.100.1"
+
+
+def test_client_ip_middleware_ignores_untrusted_forwarded_for(rf, settings):
+    settings.SOLOMON_TRUSTED_PROXIES = ["10.0.0.0/8"]
+    request = rf.get("/", HTTP_X_FORWARDED_FOR="198.51.100.1", REMOTE_ADDR="203.0.113.195")
+    middleware = ClientIPMiddleware(lambda _: HttpResponse())
+    middleware(request)
+    assert request.META[IP_ADDRESS_META_KEY] == "203.0.113.195"
@@ -5,7 +5,7 @@ import pytest
 import time_machine
 from django.utils import timezone
 
-from solomon.models import SolomonToken
+from solomon.models import SolomonRedirect, SolomonToken, hash_value
 
 
 @pytest.mark.django_db
@@ -28,8 +28,10 @@ def test_create_token(settings, active_user, require_same_browser, faker):
 
     if require_same_browser:
         assert token.cookie_value != ""
+        assert bytes(token.cookie_digest) == hash_value(token.cookie_value)
     else:
         assert token.cookie_value == ""
+        assert token.cookie_digest is None
 
     assert str(token) == f"{active_user.email} - {token.expiry_date}"
 
@@ -138,6 +140,52 @@ def test_is_valid_check_same_browser(settings, active_user, faker):
     assert not token.is_valid(request)
 
 
+@pytest.mark.django_db
+def test_cookie_value_is_not_stored(settings, faker):
+    settings.SOLOMON_REQUIRE_SAME_IP = False
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = True
+    token = SolomonToken.objects.create(email=faker.email(), ip_address=faker.ipv4(), redirect_url="/")
+    cookie_value = token.cookie_value
+
+    token = SolomonToken.objects.get(pk=token.pk)
+    assert token.cookie_value == ""
+    assert token.is_valid(Mock(headers={}, META={}, COOKIES={settings.SOLOMON_COOKIE_NAME: cookie_value}))
+    assert not token.is_valid(Mock(headers={}, META={}, COOKIES={}))
+
+
+@pytest.mark.django_db
+def test_is_valid_compares_normalized_ip_addresses(settings, faker):
+    settings.SOLOMON_REQUIRE_SAME_IP = True
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+    token = SolomonToken.objects.create(email=faker.email(), ip_address="2001:0DB8::0001", redirect_url="/")
+    token = SolomonToken.objects.get(pk=token.pk)
+    assert token.ip_address == "2001:db8::1"
+    assert token.is_valid(Mock(headers={}, META={"REMOTE_ADDR": "2001:DB8:0:0::1"}))
+
+
+@pytest.mark.django_db
+def test_redirect_urls_are_shared(faker):
+    first = SolomonToken.objects.create(email=faker.email(), ip_address=faker.ipv4(), redirect_url="/dashboard/")
+    second = SolomonToken.objects.create(email=faker.email(), ip_address=faker.ipv4(), redirect_url="/dashboard/")
+    other = SolomonToken.objects.create(email=faker.email(), ip_address=faker.ipv4(), redirect_url="/settings/")
+    assert first.redirect_id == second.redirect_id != other.redirect_id
+    assert SolomonRedirect.objects.count() == 2
+    assert SolomonToken.objects.get(pk=second.pk).redirect_url == "/dashboard/"
+
+    second.redirect_url = "/settings/"
+    second.save()
+    assert SolomonToken.objects.get(pk=second.pk).redirect_id == other.redirect_id
+
+
+@pytest.mark.django_db
+def test_redirect_lookups_are_cached(faker, django_assert_num_queries, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        SolomonToken.objects.create(email=faker.email(), ip_address=faker.ipv4(), redirect_url="/dashboard/")
+    # Only the INSERT of the token, the redirect is taken from the cache.
+    with django_assert_num_queries(1):
+        SolomonToken.objects.create(email=faker.email(), ip_address=faker.ipv4(), redirect_url="/dashboard/")
+
+
 @pytest.mark.django_db
 def test_is_valid_with_disabled_token(token):
     token.disable()
@@ -205,3 +253,67 @@ def test_send_email_for_invalid_token(disabled_token, faker, mailoutbox, rf, set
     request = rf.get("/")
     disabled_token.send_email(request)
     assert len(mailoutbox) == 0
+
+
+@pytest.mark.django_db
+def test_send_email_from_other_ip_address(token, mailoutbox, rf, settings):
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+    token.send_email(rf.get("/", REMOTE_ADDR="192.0.2.1"))
+    assert len(mailoutbox) == 0
+    token.refresh_from_db()
+    assert token.disabled_at is not None
+
+
+@pytest.mark.django_db
+def test_send_email_without_browser_cookie(token, mailoutbox, rf, settings):
+    # The cookie is only set by the response of the login, so the browser binding isn't checked before sending.
+    settings.SOLOMON_REQUIRE_SAME_IP = False
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = True
+    token.send_email(rf.get("/"))
+    assert len(mailoutbox) == 1
+    token.refresh_from_db()
+    assert token.disabled_at is None
+
+
+@pytest.mark.django_db
+def test_for_domains(faker):
+    first = SolomonToken.objects.create(email="first@example.com", ip_address=faker.ipv4(), redirect_url="/")
+    second = SolomonToken.objects.create(email="second@example.org", ip_address=faker.ipv4(), redirect_url="/")
+    SolomonToken.objects.create(email="third@sub.example.com", ip_address=faker.ipv4(), redirect_url="/")
+    assert list(SolomonToken.objects.for_domains(["Example.com"])) == [first]
+    assert set(SolomonToken.objects.for_domains(["example.com", "example.org"])) == {first, second}
+
+
+@pytest.mark.django_db
+def test_bulk_disable(token, disabled_token, invalid_token):
+    assert SolomonToken.objects.bulk_disable(chunk_size=1) == 1
+    token.refresh_from_db()
+    assert token.disabled_at is not None
+    invalid_token.refresh_from_db()
+    assert invalid_token.disabled_at is None
+
+
+@pytest.mark.django_db
+def test_bulk_disable_with_networks(faker):
+    inside = SolomonToken.objects.create(email=faker.email(), ip_address="10.1.2.3", redirect_url="/")
+    outside = SolomonToken.objects.create(email=faker.email(), ip_address="10.2.2.3", redirect_url="/")
+    assert SolomonToken.objects.bulk_disable(networks=["10.1.0.0/16"], chunk_size=1) == 1
+    inside.refresh_from_db()
+    outside.refresh_from_db()
+    assert inside.disabled_at is not None
+    assert outside.disabled_at is None
+
+
+@pytest.mark.django_db
+def test_consume_token_only_once(token):
+    assert SolomonToken.objects.get(pk=token.pk).consume()
+    assert not token.consume()
+    assert token.consumed_at is None
+
+
+@pytest.mark.django_db
+def test_token_email_is_normalized(django_user_model, faker):
+    user = django_user_model.objects.create(username="jane", email="Jane@Example.com")
+    token = SolomonToken.objects.create(email=" JANE@example.COM", ip_address=faker.ipv4(), redirect_url="/")
+    assert token.email == "jane@example.com"
+    assert token.get_user() == user
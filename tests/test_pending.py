@@ -0,0 +1,137 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth import SESSION_KEY as AUTH_SESSION_KEY
+from django.test import Client
+from django.urls import reverse
+from pytest_django.asserts import assertContains, assertNotContains
+
+from solomon.models import SolomonToken
+from solomon.pending import CONFIRM_SESSION_KEY, SESSION_KEY, complete_pending_login, wait_for_login
+
+
+@pytest.fixture
+def cross_device(settings):
+    settings.SOLOMON_CROSS_DEVICE_LOGIN = True
+    settings.SOLOMON_REQUIRE_SAME_IP = False
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+    settings.SOLOMON_PENDING_LOGIN_TIMEOUT = 0
+    settings.SOLOMON_PENDING_LOGIN_POLL_INTERVAL = 0
+    return settings
+
+
+@pytest.mark.django_db
+def test_wait_for_login(cross_device, token, active_user):
+    assert async_to_sync(wait_for_login)(0, token.pk) is None
+    complete_pending_login(token, active_user)
+    assert async_to_sync(wait_for_login)(0, token.pk) == active_user.pk
+    assert async_to_sync(wait_for_login)(0, token.pk) is None
+
+
+@pytest.mark.django_db
+def test_pending_login_view_disabled(client):
+    response = client.get(reverse("solomon:pending_login"))
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_pending_login_view_without_pending_login(cross_device, client):
+    response = client.get(reverse("solomon:pending_login"))
+    assert response.status_code == 404
+    assert response.json() == {"status": "unknown"}
+
+
+@pytest.mark.django_db
+def test_cross_device_login(cross_device, client, rf, login_view_url, active_user):
+    response = client.post(login_view_url, {"email": active_user.email, "ip_address": "127.0.0.1", "redirect_url": "/"})
+    assert response.context["pending_login_url"] == reverse("solomon:pending_login")
+    code = response.context["pending_login_code"]
+    token = SolomonToken.objects.get()
+    assert client.session[SESSION_KEY] == [0, token.pk]
+
+    response = client.get(reverse("solomon:pending_login"))
+    assert response.json() == {"status": "pending"}
+    assert "no-cache" in response["Cache-Control"]
+
+    phone = Client()
+    response = phone.get(token.get_verify_url(rf.get("/")))
+    assert response.url == reverse("solomon:pending_login_confirm")
+    assert phone.session[AUTH_SESSION_KEY] == str(active_user.pk)
+
+    # The owner of the mailbox has to confirm the login with the code shown in the waiting browser.
+    response = client.get(reverse("solomon:pending_login"))
+    assert response.json() == {"status": "pending"}
+    response = phone.post(reverse("solomon:pending_login_confirm"), {"code": "x" + code})
+    assert response.status_code == 200
+    assert response.context["form"].errors
+    response = phone.post(reverse("solomon:pending_login_confirm"), {"code": code})
+    assert response.url == token.redirect_url
+    assert CONFIRM_SESSION_KEY not in phone.session
+
+    response = client.get(reverse("solomon:pending_login"))
+    assert response.json() == {"status": "complete", "redirect_url": token.redirect_url}
+    assert client.session[AUTH_SESSION_KEY] == str(active_user.pk)
+    assert SESSION_KEY not in client.session
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url_name", ["login", "signup"])
+def test_done_page_shows_pending_login_code(cross_device, client, active_user, url_name):
+    response = client.post(reverse(f"solomon:{url_name}"), {"email": active_user.email, "redirect_url": "/"})
+    assertContains(response, f"<strong>{response.context['pending_login_code']}</strong>", html=True)
+    assertContains(response, f'"{reverse("solomon:pending_login")}"')
+
+
+@pytest.mark.django_db
+def test_done_page_without_cross_device_login(client, active_user):
+    response = client.post(reverse("solomon:login"), {"email": active_user.email, "redirect_url": "/"})
+    assertNotContains(response, "<script")
+
+
+@pytest.mark.django_db
+def test_cross_device_login_without_confirmation(cross_device, client, rf, login_view_url, active_user):
+    client.post(login_view_url, {"email": active_user.email, "ip_address": "127.0.0.1", "redirect_url": "/"})
+    token = SolomonToken.objects.get()
+
+    phone = Client()
+    phone.get(token.get_verify_url(rf.get("/")))
+    response = phone.get(reverse("solomon:pending_login_confirm"))
+    assert response.status_code == 200
+    assert response.context["redirect_url"] == token.redirect_url
+
+    response = client.get(reverse("solomon:pending_login"))
+    assert response.json() == {"status": "pending"}
+    assert AUTH_SESSION_KEY not in client.session
+
+
+@pytest.mark.django_db
+def test_pending_login_confirm_view_without_pending_login(cross_device, client, active_user):
+    response = client.get(reverse("solomon:pending_login_confirm"))
+    assert response.status_code == 404
+    client.force_login(active_user)
+    response = client.get(reverse("solomon:pending_login_confirm"))
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_cross_device_login_in_same_browser(cross_device, client, rf, login_view_url, active_user):
+    client.post(login_view_url, {"email": active_user.email, "ip_address": "127.0.0.1", "redirect_url": "/"})
+    token = SolomonToken.objects.get()
+
+    response = client.get(token.get_verify_url(rf.get("/")))
+    assert response.url == token.redirect_url
+    assert async_to_sync(wait_for_login)(0, token.pk) == active_user.pk
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(("confirm", "status"), [(False, "confirmation_required"), (True, "confirmed")])
+def test_cross_device_login_with_api(cross_device, client, active_user, confirm, status):
+    response = client.post(reverse("solomon:api_login"), {"email": active_user.email}, content_type="application/json")
+    code = response.json()["pending_login_code"]
+    token = SolomonToken.objects.get()
+
+    data = {"pk": token.pk, "token": token.token_string}
+    if confirm:
+        data["pending_login_code"] = code
+    response = Client().post(reverse("solomon:api_verify"), data, content_type="application/json")
+    assert response.json()["pending_login"] == status
+    assert async_to_sync(wait_for_login)(0, token.pk) == (active_user.pk if confirm else None)
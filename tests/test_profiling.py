@@ -0,0 +1,115 @@
+import pstats
+from contextlib import contextmanager
+
+import pytest
+from django.urls import reverse
+
+from solomon.models import SolomonToken
+from solomon.profiling import span
+
+spans = []
+
+
+def record_span(name, duration, attributes):
+    spans.append((name, duration, attributes))
+
+
+@pytest.fixture
+def span_callback(settings):
+    settings.SOLOMON_PROFILING_SPAN_CALLBACK = "tests.test_profiling.record_span"
+    yield spans
+    spans.clear()
+
+
+def test_span_without_callback():
+    with span("solomon.test"):
+        pass
+    assert spans == []
+
+
+def test_span_calls_callback(span_callback):
+    with pytest.raises(ValueError), span("solomon.test", shard=0):
+        raise ValueError
+    assert [(name, attributes) for name, _, attributes in span_callback] == [("solomon.test", {"shard": 0})]
+    assert span_callback[0][1] >= 0
+
+
+def failing_callback(name, duration, attributes):
+    raise ConnectionError
+
+
+def test_span_callback_errors_are_logged(settings, caplog):
+    settings.SOLOMON_PROFILING_SPAN_CALLBACK = "tests.test_profiling.failing_callback"
+    with pytest.raises(ValueError), span("solomon.test"):
+        raise ValueError
+    with span("solomon.test"):
+        pass
+    assert [record.exc_info[0] for record in caplog.records] == [ConnectionError, ConnectionError]
+
+
+def test_span_with_opentelemetry(settings, monkeypatch):
+    started = []
+
+    class Tracer:
+        @contextmanager
+        def start_as_current_span(self, name, attributes):
+            started.append((name, attributes))
+            yield
+
+    settings.SOLOMON_PROFILING_OPENTELEMETRY = True
+    monkeypatch.setattr("solomon.profiling._get_tracer", lambda: Tracer())
+    with span("solomon.test", shard=1):
+        pass
+    assert started == [("solomon.test", {"shard": 1})]
+
+
+@pytest.mark.django_db
+def test_login_and_verify_stages(span_callback, client, active_user, settings):
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+    settings.SOLOMON_REQUIRE_SAME_IP = False
+    client.post(reverse("solomon:login"), {"email": active_user.email})
+    assert [name for name, _, _ in span_callback] == [
+        "solomon.login.validate",
+        "solomon.login.save",
+        "solomon.send_email.render",
+        "solomon.send_email.deliver",
+        "solomon.login.send_email",
+        "solomon.login_view",
+    ]
+
+    span_callback.clear()
+    token = SolomonToken.objects.get()
+    client.get(reverse("solomon:verify", kwargs={"pk": token.pk, "token_string": token.token_string}))
+    assert [name for name, _, _ in span_callback] == [
+        "solomon.authenticate.lookup",
+        "solomon.authenticate.validate",
+        "solomon.authenticate.consume",
+        "solomon.verify_view",
+    ]
+
+
+@pytest.mark.django_db
+def test_sampled_profiles(settings, client, tmp_path):
+    settings.SOLOMON_PROFILING_SAMPLE_RATE = 1
+    settings.SOLOMON_PROFILING_DIR = str(tmp_path / "profiles")
+    client.get(reverse("solomon:login"))
+
+    (profile,) = (tmp_path / "profiles").iterdir()
+    assert profile.name.startswith("login_view-")
+    assert pstats.Stats(str(profile)).total_calls > 0
+
+
+@pytest.mark.django_db
+def test_profiles_are_not_sampled_by_default(settings, client, tmp_path):
+    settings.SOLOMON_PROFILING_DIR = str(tmp_path)
+    client.get(reverse("solomon:login"))
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.django_db
+def test_profile_write_errors_are_logged(settings, client, tmp_path, caplog):
+    settings.SOLOMON_PROFILING_SAMPLE_RATE = 1
+    (tmp_path / "file").write_text("")
+    settings.SOLOMON_PROFILING_DIR = str(tmp_path / "file")
+    assert client.get(reverse("solomon:login")).status_code == 200
+    assert "Writing the profile" in caplog.text
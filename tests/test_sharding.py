@@ -0,0 +1,144 @@
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from solomon.backends import SolomonBackend
+from solomon.models import SolomonToken
+from solomon.sharding import for_each_shard, get_shard, get_shard_index, get_shards
+
+SHARDS = ["shard1", "shard2"]
+
+
+@pytest.fixture
+def sharded(settings):
+    settings.SOLOMON_SHARDS = SHARDS
+    settings.SOLOMON_REQUIRE_SAME_IP = False
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+    return settings
+
+
+def emails_per_shard():
+    emails = {}
+    for index in range(len(SHARDS)):
+        email = next(f"user{i}@example.com" for i in range(100) if get_shard_index(f"user{i}@example.com") == index)
+        emails[index] = email
+    return emails
+
+
+def test_get_shards_without_sharding():
+    assert get_shards() == ["default"]
+    assert get_shard(None) == "default"
+    assert get_shard(0) == "default"
+    assert get_shard(1) is None
+
+
+def test_get_shard(sharded):
+    assert get_shard(0) == "shard1"
+    assert get_shard(1) == "shard2"
+    assert get_shard(2) is None
+    assert get_shard(-1) is None
+    # Verify urls without a shard were issued before sharding was enabled.
+    assert get_shard(None) == "default"
+
+
+def test_get_shard_index_is_stable(sharded):
+    assert get_shard_index("Test@Example.com") == get_shard_index("test@example.com")
+    assert {get_shard_index(f"user{i}@example.com") for i in range(100)} == {0, 1}
+
+
+def test_for_each_shard(sharded):
+    assert for_each_shard(str.upper) == ["SHARD1", "SHARD2"]
+    assert for_each_shard(str.upper, parallel=False) == ["SHARD1", "SHARD2"]
+
+
+@pytest.mark.django_db(databases=["default", *SHARDS])
+def test_tokens_are_stored_on_their_shard(sharded):
+    for index, email in emails_per_shard().items():
+        token = SolomonToken.objects.create(email=email, ip_address="127.0.0.1", redirect_url="/")
+        assert token.shard == index
+        assert SolomonToken.objects.using(SHARDS[index]).filter(pk=token.pk).exists()
+        assert SolomonToken.objects.for_email(email).filter(pk=token.pk).exists()
+    assert not SolomonToken.objects.using("default").exists()
+
+
+@pytest.mark.django_db(databases=["default", *SHARDS])
+def test_verify_url_contains_shard(sharded, rf):
+    email = emails_per_shard()[1]
+    token = SolomonToken.objects.create(email=email, ip_address="127.0.0.1", redirect_url="/")
+    kwargs = {"shard": 1, "pk": token.pk, "token_string": token.token_string}
+    assert token.get_verify_url(rf.get("/")).endswith(reverse("solomon:verify", kwargs=kwargs))
+
+
+@pytest.mark.django_db(databases=["default", *SHARDS])
+def test_authenticate_on_shard(sharded, rf, django_user_model):
+    email = emails_per_shard()[1]
+    user = django_user_model.objects.create_user("user", email=email)
+    token = SolomonToken.objects.create(email=email, ip_address="127.0.0.1", redirect_url="/")
+    backend = SolomonBackend()
+    request = rf.get("/")
+    assert backend.authenticate(request, token_pk=token.pk, token_string=token.token_string, token_shard=0) is None
+    assert backend.authenticate(request, token_pk=token.pk, token_string=token.token_string, token_shard=1) == user
+
+
+@pytest.mark.django_db(databases=["default", *SHARDS])
+def test_verify_view_on_shard(sharded, client, rf, django_user_model):
+    email = emails_per_shard()[0]
+    django_user_model.objects.create_user("user", email=email)
+    token = SolomonToken.objects.create(email=email, ip_address="127.0.0.1", redirect_url="/dashboard/")
+    response = client.get(token.get_verify_url(rf.get("/")))
+    assert response.status_code == 302
+    assert response.url == "/dashboard/"
+
+
+@pytest.mark.django_db(databases=["default", *SHARDS], transaction=True)
+def test_purge_tokens_on_all_shards(sharded):
+    for email in emails_per_shard().values():
+        token = SolomonToken.objects.create(email=email, ip_address="127.0.0.1", redirect_url="/")
+        token.expiry_date = timezone.now() - timedelta(days=2)
+        token.save()
+        SolomonToken.objects.create(email=email, ip_address="127.0.0.1", redirect_url="/")
+
+    call_command("solomon_purge_tokens", "--chunk-size", "1")
+    assert [SolomonToken.objects.using(alias).count() for alias in SHARDS] == [1, 1]
+
+
+@pytest.mark.django_db(databases=["default", *SHARDS])
+def test_verify_view_with_url_issued_before_sharding(settings, client, django_user_model):
+    settings.SOLOMON_REQUIRE_SAME_IP = False
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+    django_user_model.objects.create_user("user", email="user@example.com")
+    token = SolomonToken.objects.create(email="user@example.com", ip_address="127.0.0.1", redirect_url="/dashboard/")
+    settings.SOLOMON_SHARDS = SHARDS
+
+    response = client.get(reverse("solomon:verify", kwargs={"pk": token.pk, "token_string": token.token_string}))
+    assert response.status_code == 302
+    assert response.url == "/dashboard/"
+
+
+@pytest.mark.django_db(databases=["default", *SHARDS])
+def test_admin_changelist_per_shard(sharded, admin_client):
+    emails = emails_per_shard()
+    for email in emails.values():
+        SolomonToken.objects.create(email=email, ip_address="127.0.0.1", redirect_url="/")
+
+    url = reverse("admin:solomon_solomontoken_changelist")
+    for index, email in emails.items():
+        response = admin_client.get(url, {"shard": index})
+        assert [token.email for token in response.context["cl"].result_list] == [email]
+
+
+@pytest.mark.django_db(databases=["default", *SHARDS], transaction=True)
+def test_admin_disable_tokens_for_domains_on_all_shards(sharded, admin_client):
+    tokens = [
+        SolomonToken.objects.create(email=email, ip_address="127.0.0.1", redirect_url="/")
+        for email in emails_per_shard().values()
+    ]
+    response = admin_client.post(
+        f"{reverse('admin:solomon_solomontoken_changelist')}?shard=1",
+        {"action": "disable_tokens_for_domains", "_selected_action": [tokens[1].pk]},
+    )
+    assert response.status_code == 302
+    assert [SolomonToken.objects.using(alias).active().count() for alias in SHARDS] == [0, 0]
@@ -0,0 +1,66 @@
+import datetime
+
+import pytest
+import time_machine
+from django.core.management import call_command
+
+from solomon.models import SolomonStatsWatermark, SolomonToken, SolomonTokenStats
+from solomon.stats import rollup_stats
+
+START = datetime.datetime(2024, 5, 1, 10, 0, tzinfo=datetime.timezone.utc)
+
+
+def at(minutes: int) -> datetime.datetime:
+    return START + datetime.timedelta(minutes=minutes)
+
+
+def create_token(minutes: int) -> SolomonToken:
+    with time_machine.travel(at(minutes), tick=False):
+        return SolomonToken.objects.create(email="user@example.com", ip_address="127.0.0.1", redirect_url="/")
+
+
+def stats() -> dict:
+    return {
+        row.hour: (row.issued, row.consumed, row.disabled, row.expired)
+        for row in SolomonTokenStats.objects.order_by("hour")
+    }
+
+
+@pytest.mark.django_db
+def test_rollup_stats(settings):
+    settings.SOLOMON_MAX_TOKEN_LIFETIME = 10 * 60
+    create_token(5)
+    consumed = create_token(20)
+    disabled = create_token(58)
+    late = create_token(70)
+    SolomonToken.objects.filter(pk=consumed.pk).update(consumed_at=at(25))
+    SolomonToken.objects.filter(pk=disabled.pk).update(disabled_at=at(61))
+    # Verifying an expired token disables it, it still counts as expired.
+    SolomonToken.objects.filter(pk=late.pk).update(disabled_at=at(90))
+
+    assert rollup_stats(at(75)) == 1
+    assert stats() == {START: (3, 1, 0, 1)}
+
+    # The next run only adds the hours since the last one.
+    assert rollup_stats(at(130)) == 1
+    assert stats() == {START: (3, 1, 0, 1), at(60): (1, 0, 2, 1)}
+    assert rollup_stats(at(130)) == 0
+    assert stats() == {START: (3, 1, 0, 1), at(60): (1, 0, 2, 1)}
+
+    assert set(SolomonStatsWatermark.objects.values_list("value", flat=True)) == {at(120)}
+
+
+@pytest.mark.django_db
+def test_rollup_stats_adds_to_existing_hours():
+    SolomonTokenStats.objects.create(hour=START, issued=5)
+    create_token(5)
+    rollup_stats(at(60))
+    assert stats() == {START: (6, 0, 0, 1)}
+
+
+@pytest.mark.django_db
+def test_rollup_stats_command(capsys):
+    create_token(5)
+    call_command("solomon_rollup_stats", "--until", at(60).isoformat())
+    assert capsys.readouterr().out.strip() == "Updated 1 hour(s)."
+    assert stats() == {START: (1, 0, 0, 1)}
@@ -0,0 +1,60 @@
+import pytest
+
+from solomon.throttling import (
+    DEAD,
+    MALFORMED,
+    check_verify_link,
+    is_blocked,
+    is_dead_token,
+    is_well_formed,
+    mark_dead_token,
+    register_failure,
+    reject_verify_link,
+)
+
+
+def test_is_well_formed():
+    assert is_well_formed("a" * 128)
+    assert not is_well_formed("a" * 127)
+    assert not is_well_formed("a" * 127 + "!")
+
+
+def test_negative_cache():
+    assert not is_dead_token(1, "a" * 128)
+    mark_dead_token(1, "a" * 128)
+    assert is_dead_token(1, "a" * 128)
+    assert not is_dead_token(2, "a" * 128)
+    assert not is_dead_token(1, "b" * 128)
+
+
+def test_negative_cache_disabled(settings):
+    settings.SOLOMON_NEGATIVE_CACHE_TIMEOUT = 0
+    mark_dead_token(1, "a" * 128)
+    assert not is_dead_token(1, "a" * 128)
+
+
+def test_check_verify_link(settings):
+    settings.SOLOMON_VERIFY_FAILURE_LIMIT = 3
+    assert check_verify_link("203.0.113.195", 1, "a" * 128) is None
+    assert check_verify_link("203.0.113.195", 1, "a") == MALFORMED
+    reject_verify_link("203.0.113.195", 1, "a" * 128)
+    assert check_verify_link("203.0.113.195", 1, "a" * 128) == DEAD
+    assert is_blocked("203.0.113.195")
+
+
+def test_failure_limit(settings):
+    settings.SOLOMON_VERIFY_FAILURE_LIMIT = 3
+    for _ in range(2):
+        register_failure("203.0.113.195")
+    assert not is_blocked("203.0.113.195")
+    register_failure("203.0.113.195")
+    assert is_blocked("203.0.113.195")
+    assert not is_blocked("203.0.113.196")
+
+
+@pytest.mark.parametrize("limit", [None, 0])
+def test_failure_limit_disabled(settings, limit):
+    settings.SOLOMON_VERIFY_FAILURE_LIMIT = limit
+    for _ in range(5):
+        register_failure("203.0.113.195")
+    assert not is_blocked("203.0.113.195")
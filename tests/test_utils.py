@@ -1,8 +1,23 @@
 from unittest.mock import Mock
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from solomon.utils import anonymize_ip, get_ip_address, get_or_create_user
+from solomon.utils import (
+    DomainSet,
+    NetworkSet,
+    anonymize_ip,
+    filter_users_by_email,
+    get_user_by_email,
+    get_blocked_email_domains,
+    get_ip_address,
+    get_or_create_user,
+    is_email_domain_allowed,
+    normalize_email,
+    normalize_ip,
+    resolve_ip_address,
+)
 
 
 @pytest.mark.django_db
@@ -48,6 +63,159 @@ def test_get_ip_address_from_remote_addr():
     assert get_ip_address(request) == "203.0.113.195"
 
 
+@pytest.mark.parametrize("forwarded_for", ["garbage", "203.0.113.195, garbage", " "])
+def test_get_ip_address_skips_invalid_x_forwarded_for(forwarded_for):
+    request = Mock(headers={"x-forwarded-for": forwarded_for}, META={"REMOTE_ADDR": "198.51.100.1"})
+    assert get_ip_address(request) == "198.51.100.1"
+
+
 def test_get_ip_address_no_ip():
     request = Mock(headers={}, META={})
     assert get_ip_address(request) == ""
+
+
+def test_get_ip_address_is_memoized():
+    request = Mock(headers={}, META={"REMOTE_ADDR": "203.0.113.195"})
+    assert get_ip_address(request) == "203.0.113.195"
+    request.META["REMOTE_ADDR"] = "198.51.100.1"
+    assert get_ip_address(request) == "203.0.113.195"
+
+
+@pytest.mark.parametrize(
+    "ip, expected",
+    [
+        ("10.1.2.3", True),
+        ("10.255.255.255", True),
+        ("11.0.0.1", False),
+        ("192.168.178.1", True),
+        ("192.168.179.1", False),
+        ("2001:db8::1", True),
+        ("2001:db9::1", False),
+        ("not-an-ip", False),
+    ],
+)
+def test_network_set(ip, expected):
+    proxies = NetworkSet(["10.0.0.0/8", "192.168.178.0/24", "2001:db8::/32"])
+    assert (ip in proxies) == expected
+
+
+@pytest.mark.parametrize(
+    "domain, expected",
+    [
+        ("example.com", True),
+        ("mail.example.com", True),
+        ("EXAMPLE.COM.", True),
+        ("notexample.com", False),
+        ("com", False),
+        ("mailinator.com", True),
+        ("x.y.mailinator.com", True),
+        ("example.org", False),
+        ("", False),
+    ],
+)
+def test_domain_set(domain, expected):
+    domains = DomainSet(["example.com", "*.mailinator.com", " "])
+    assert (domain in domains) == expected
+
+
+def test_get_blocked_email_domains_reads_file_once(tmp_path, settings):
+    path = tmp_path / "blocklist.txt"
+    path.write_text("# disposable providers\n\nmailinator.com\n  guerrillamail.com  \n")
+    settings.SOLOMON_BLOCKED_EMAIL_DOMAINS = ["example.com"]
+    settings.SOLOMON_BLOCKED_EMAIL_DOMAINS_FILE = str(path)
+    domains = get_blocked_email_domains()
+    path.unlink()
+    assert get_blocked_email_domains() is domains
+    assert len(domains) == 3
+    assert "guerrillamail.com" in domains
+
+    # Changing a setting rebuilds the domains.
+    settings.SOLOMON_BLOCKED_EMAIL_DOMAINS_FILE = None
+    assert len(get_blocked_email_domains()) == 1
+
+
+@pytest.mark.parametrize(
+    "email, expected",
+    [
+        ("user@example.com", True),
+        ("user@staff.example.com", True),
+        ("user@example.org", False),
+        ("user@spam.example.com", False),
+        ("user@mailinator.com", False),
+    ],
+)
+def test_is_email_domain_allowed(settings, tmp_path, email, expected):
+    path = tmp_path / "blocklist.txt"
+    path.write_text("mailinator.com\n")
+    settings.SOLOMON_ALLOWED_EMAIL_DOMAINS = ["example.com", "mailinator.com"]
+    settings.SOLOMON_BLOCKED_EMAIL_DOMAINS = ["spam.example.com"]
+    settings.SOLOMON_BLOCKED_EMAIL_DOMAINS_FILE = str(path)
+    assert is_email_domain_allowed(email) == expected
+
+
+def test_is_email_domain_allowed_by_default():
+    assert is_email_domain_allowed("user@mailinator.com")
+
+
+@pytest.mark.parametrize(
+    "remote_addr, forwarded_for, expected",
+    [
+        ("203.0.113.195", "", "203.0.113.195"),
+        ("203.0.113.195", "198.51.100.1", "203.0.113.195"),
+        ("10.0.0.1", "198.51.100.1", "198.51.100.1"),
+        ("10.0.0.1", "198.51.100.1, 10.0.0.2", "198.51.100.1"),
+        ("10.0.0.1", "1.2.3.4, 198.51.100.1, 10.0.0.2", "198.51.100.1"),
+        ("10.0.0.1", "10.0.0.3, 10.0.0.2", "10.0.0.3"),
+        ("10.0.0.1", "198.51.100.1, garbage, 10.0.0.2", "10.0.0.2"),
+    ],
+)
+def test_resolve_ip_address_with_trusted_proxies(settings, remote_addr, forwarded_for, expected):
+    settings.SOLOMON_TRUSTED_PROXIES = ["10.0.0.0/8"]
+    request = Mock(headers={"x-forwarded-for": forwarded_for}, META={"REMOTE_ADDR": remote_addr})
+    assert resolve_ip_address(request) == expected
+
+
+@pytest.mark.parametrize(
+    "ip, expected",
+    [
+        ("10.0.0.1", "10.0.0.1"),
+        ("2001:DB8:0:0::1", "2001:db8::1"),
+        ("not-an-ip", None),
+        ("", None),
+        (None, None),
+    ],
+)
+def test_normalize_ip(ip, expected):
+    assert normalize_ip(ip) == expected
+
+
+@pytest.mark.django_db
+def test_get_or_create_user_returns_oldest_user(django_user_model):
+    first = django_user_model.objects.create(username="first", email="twice@example.com")
+    django_user_model.objects.create(username="second", email="twice@example.com")
+    assert get_or_create_user("twice@example.com") == first
+
+
+def test_normalize_email():
+    assert normalize_email(" Jane.Doe@Example.COM ") == "jane.doe@example.com"
+
+
+@pytest.mark.django_db
+def test_filter_users_by_email_ignores_stored_case(django_user_model):
+    user = django_user_model.objects.create(username="jane", email="Jane.Doe@Example.com")
+    assert list(filter_users_by_email("jane.doe@EXAMPLE.com")) == [user]
+    assert get_or_create_user("JANE.DOE@example.com") == user
+    assert get_user_by_email("jane.doe@EXAMPLE.com") == user
+
+
+@pytest.mark.django_db
+def test_get_user_by_email_tries_exact_lookup_first(django_user_model):
+    user = django_user_model.objects.create(username="jane", email="jane.doe@example.com")
+    with CaptureQueriesContext(connection) as queries:
+        assert get_user_by_email("Jane.Doe@Example.com") == user
+    assert len(queries) == 1
+    assert "LOWER" not in queries[0]["sql"].upper()
+
+    with CaptureQueriesContext(connection) as queries:
+        assert get_user_by_email("john@example.com") is None
+    assert len(queries) == 2
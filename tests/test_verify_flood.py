@@ -0,0 +1,72 @@
+import os
+import time
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+# Benchmarks of verify_view under a flood of invalid links. The defaults keep the run short and the throughput floor
+# generous, so the tests only fail on a real regression and not on a slow CI runner. Override them with the
+# SOLOMON_VERIFY_FLOOD_SIZE and SOLOMON_VERIFY_FLOOD_MIN_RPS environment variables to measure locally.
+FLOOD_SIZE = int(os.environ.get("SOLOMON_VERIFY_FLOOD_SIZE", 200))
+FLOOD_MIN_RPS = float(os.environ.get("SOLOMON_VERIFY_FLOOD_MIN_RPS", 100))
+
+
+def bogus_links(count: int) -> list[str]:
+    """
+    Returns verify links for unknown tokens, like a scanner guessing or replaying leaked links would request.
+    """
+    return [
+        reverse("solomon:verify", kwargs={"pk": pk, "token_string": get_random_string(128)})
+        for pk in range(1, count + 1)
+    ]
+
+
+def flood(client, urls: list[str]) -> tuple[int, float]:
+    """
+    Requests all urls and returns the number of queries and the throughput in requests per second.
+    """
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        for url in urls:
+            response = client.get(url)
+            assert response.status_code in (200, 429)
+        elapsed = time.perf_counter() - start
+    return len(queries), len(urls) / elapsed
+
+
+@pytest.mark.django_db
+def test_verify_flood_of_replayed_links(client, settings):
+    settings.SOLOMON_VERIFY_FAILURE_LIMIT = None
+    urls = bogus_links(FLOOD_SIZE)
+
+    first_queries, _ = flood(client, urls)
+    assert first_queries >= len(urls)
+
+    # Replays of the links are answered from the negative cache.
+    replay_queries, rps = flood(client, urls * 5)
+    assert replay_queries == 0
+    assert rps >= FLOOD_MIN_RPS, f"verify_view answered {rps:.0f} replayed links per second"
+
+
+@pytest.mark.django_db
+def test_verify_flood_of_malformed_links(client):
+    urls = [reverse("solomon:verify", kwargs={"pk": pk, "token_string": "guess"}) for pk in range(FLOOD_SIZE)]
+    queries, rps = flood(client, urls)
+    assert queries == 0
+    assert rps >= FLOOD_MIN_RPS, f"verify_view answered {rps:.0f} malformed links per second"
+
+
+@pytest.mark.django_db
+def test_verify_flood_from_one_ip_address(client, settings):
+    settings.SOLOMON_VERIFY_FAILURE_LIMIT = 10
+    urls = bogus_links(FLOOD_SIZE)
+    queries_per_link, _ = flood(client, urls[:1])
+
+    queries, rps = flood(client, urls[1:])
+    # Only the links requested before the IP address was blocked were looked up.
+    assert queries == (settings.SOLOMON_VERIFY_FAILURE_LIMIT - 1) * queries_per_link
+    assert client.get(urls[0]).status_code == 429
+    assert rps >= FLOOD_MIN_RPS, f"verify_view answered {rps:.0f} links of a blocked client per second"
@@ -1,9 +1,19 @@
+from unittest.mock import patch
+
+import pytest
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import translation
+from django.utils.http import urlencode
 from pytest_django.asserts import assertTemplateUsed
 
 from solomon.conf import settings
-from solomon.forms import LoginForm
+from solomon.forms import LoginForm, SignupForm
+from solomon.mail import mail_circuit_breaker
+from solomon.metrics import VERIFY_BURN_PREVENTED, get_counter
 from solomon.models import SolomonToken
-from solomon.views import get_token_redirect_url
+from solomon.views import get_token_redirect_url, render_cached_login_page
 
 
 def test_get_login_page(client, login_view_url):
@@ -58,6 +68,28 @@ def test_post_login_page_with_active_user(client, login_view_url, active_user, f
     assert SolomonToken.objects.count() == 1
 
 
+@pytest.mark.parametrize(
+    "extra",
+    [
+        {"HTTP_X_FORWARDED_FOR": "garbage", "REMOTE_ADDR": ""},
+        {"REMOTE_ADDR": ""},
+    ],
+)
+def test_post_login_page_without_valid_ip_address(client, login_view_url, active_user, extra):
+    response = client.post(login_view_url, {"email": active_user.email}, **extra)
+    assert response.status_code == 200
+    assert "Your IP address could not be determined." in response.context["form"].non_field_errors()
+    assertTemplateUsed(response, settings.SOLOMON_LOGIN_TEMPLATE)
+    assert not SolomonToken.objects.exists()
+
+
+def test_post_login_page_with_invalid_x_forwarded_for(client, login_view_url, active_user):
+    response = client.post(login_view_url, {"email": active_user.email}, HTTP_X_FORWARDED_FOR="garbage")
+    assert response.status_code == 200
+    assertTemplateUsed(response, settings.SOLOMON_LOGIN_DONE_TEMPLATE)
+    assert SolomonToken.objects.get().ip_address == "127.0.0.1"
+
+
 def test_post_login_page_with_active_user_same_browser_not_required(
     client, login_view_url, active_user, faker, settings
 ):
@@ -113,3 +145,297 @@ def test_post_verify_page_with_invalid_token(settings, rf, client, invalid_token
     response = client.get(invalid_token.get_verify_url(request))
     assert response.status_code == 200
     assertTemplateUsed(response, settings.SOLOMON_LOGIN_FAILED_TEMPLATE)
+
+
+def test_verify_page_rejects_malformed_links_without_queries(db, client, django_assert_num_queries):
+    with django_assert_num_queries(0):
+        response = client.get(reverse("solomon:verify", kwargs={"pk": 1, "token_string": "guess"}))
+    assert response.status_code == 200
+    assertTemplateUsed(response, settings.SOLOMON_LOGIN_FAILED_TEMPLATE)
+
+
+def test_verify_page_caches_failed_links(settings, rf, client, invalid_token, django_assert_num_queries):
+    settings.SOLOMON_REQUIRE_SAME_IP = False
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+    url = invalid_token.get_verify_url(rf.get("/"))
+    client.get(url)
+    with django_assert_num_queries(0):
+        for _ in range(100):
+            response = client.get(url)
+    assert response.status_code == 200
+    assertTemplateUsed(response, settings.SOLOMON_LOGIN_FAILED_TEMPLATE)
+
+
+def test_verify_page_blocks_ip_after_failures(settings, client, token, django_assert_num_queries):
+    settings.SOLOMON_VERIFY_FAILURE_LIMIT = 3
+    url = reverse("solomon:verify", kwargs={"pk": token.pk, "token_string": "x" * 128})
+    for _ in range(3):
+        assert client.get(url).status_code == 200
+    with django_assert_num_queries(0):
+        response = client.get(url)
+    assert response.status_code == 429
+
+
+def test_verify_page_with_confirmation_renders_confirm_page(settings, rf, client, token, django_assert_num_queries):
+    settings.SOLOMON_VERIFY_CONFIRM = True
+    settings.SOLOMON_REQUIRE_SAME_IP = False
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = True
+    url = token.get_verify_url(rf.get("/"))
+    with django_assert_num_queries(1):
+        response = client.get(url)
+    assert response.status_code == 200
+    assertTemplateUsed(response, settings.SOLOMON_VERIFY_CONFIRM_TEMPLATE)
+    token.refresh_from_db()
+    assert token.disabled_at is None
+    assert get_counter(VERIFY_BURN_PREVENTED) == 1
+
+
+def test_verify_page_with_confirmation_logs_in_on_post(settings, rf, client, token):
+    settings.SOLOMON_VERIFY_CONFIRM = True
+    settings.SOLOMON_REQUIRE_SAME_IP = False
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+    url = token.get_verify_url(rf.get("/"))
+    assert client.get(url).status_code == 200
+    response = client.post(url)
+    assert response.status_code == 302
+    assert response.url == token.redirect_url
+    assert get_counter(VERIFY_BURN_PREVENTED) == 0
+
+
+def test_verify_page_with_confirmation_and_invalid_token(settings, rf, client, invalid_token):
+    settings.SOLOMON_VERIFY_CONFIRM = True
+    response = client.get(invalid_token.get_verify_url(rf.get("/")))
+    assert response.status_code == 200
+    assertTemplateUsed(response, settings.SOLOMON_LOGIN_FAILED_TEMPLATE)
+
+
+def test_post_login_page_sends_email_with_same_browser(client, login_view_url, active_user, settings, mailoutbox):
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = True
+    client.post(login_view_url, {"email": active_user.email, "ip_address": "127.0.0.1", "redirect_url": "/"})
+    assert len(mailoutbox) == 1
+    assert SolomonToken.objects.get().disabled_at is None
+
+
+def test_post_login_page_with_open_circuit_breaker(client, login_view_url, active_user, settings, mailoutbox):
+    settings.SOLOMON_MAIL_CIRCUIT_BREAKER = True
+    for _ in range(settings.SOLOMON_MAIL_BREAKER_MINIMUM_CALLS):
+        mail_circuit_breaker.record(0, failed=True)
+
+    response = client.post(login_view_url, {"email": active_user.email, "ip_address": "127.0.0.1", "redirect_url": "/"})
+    assert response.status_code == 503
+    assert int(response["Retry-After"]) > 0
+    assertTemplateUsed(response, settings.SOLOMON_MAIL_UNAVAILABLE_TEMPLATE)
+    assert not SolomonToken.objects.exists()
+    assert len(mailoutbox) == 0
+
+
+def test_post_login_page_with_failing_mail(client, login_view_url, active_user, settings):
+    settings.SOLOMON_MAIL_CIRCUIT_BREAKER = True
+    with patch("django.core.mail.send_mail", side_effect=OSError):
+        response = client.post(
+            login_view_url, {"email": active_user.email, "ip_address": "127.0.0.1", "redirect_url": "/"}
+        )
+    assert response.status_code == 503
+    assert SolomonToken.objects.get().disabled_at is not None
+
+
+def test_get_login_page_with_next(client, login_view_url):
+    response = client.get(login_view_url, {"next": "/dashboard/"})
+    assert response.context["form"].initial["redirect_url"] == "/dashboard/"
+
+
+def test_post_login_page_resolves_ip_address_and_redirect_url(client, login_view_url, active_user):
+    response = client.post(
+        f"{login_view_url}?next=/dashboard/",
+        {"email": active_user.email, "ip_address": "10.0.0.1", "redirect_url": ""},
+    )
+    assertTemplateUsed(response, settings.SOLOMON_LOGIN_DONE_TEMPLATE)
+    token = SolomonToken.objects.get()
+    assert token.ip_address == "127.0.0.1"
+    assert token.redirect_url == "/dashboard/"
+
+
+def test_post_login_page_with_unsafe_redirect_url(client, login_view_url, active_user, settings):
+    settings.ALLOWED_HOSTS = ["testserver"]
+    client.post(login_view_url, {"email": active_user.email, "redirect_url": "https://evil.example.com/"})
+    assert SolomonToken.objects.get().redirect_url == settings.LOGIN_REDIRECT_URL
+
+
+def test_get_cached_login_page(client, login_view_url, settings):
+    settings.SOLOMON_LOGIN_PAGE_CACHE_TIMEOUT = 60
+    with patch("solomon.views.render_to_string", wraps=render_to_string) as render_mock:
+        first = client.get(login_view_url)
+        second = client.get(login_view_url, {"next": "/dashboard/"})
+    assert first.status_code == second.status_code == 200
+    assert first.content == second.content
+    render_mock.assert_called_once()
+    assert "no-cache" in second["Cache-Control"]
+
+
+def test_cached_login_page_per_language(rf, settings):
+    settings.SOLOMON_LOGIN_PAGE_CACHE_TIMEOUT = 60
+    with patch("solomon.views.render_to_string", wraps=render_to_string) as render_mock:
+        for language in ("en", "de", "en"):
+            with translation.override(language):
+                render_cached_login_page()
+    assert render_mock.call_count == 2
+
+
+def test_cached_login_page_has_no_request_context(client, login_view_url, settings):
+    settings.SOLOMON_LOGIN_PAGE_CACHE_TIMEOUT = 60
+    template = "[{{ request.path }}|{{ csrf_token }}|{% for message in messages %}{{ message }}{% endfor %}]"
+    settings.TEMPLATES = [
+        {
+            **settings.TEMPLATES[0],
+            "DIRS": [],
+            "APP_DIRS": False,
+            "OPTIONS": {
+                **settings.TEMPLATES[0]["OPTIONS"],
+                "loaders": [("django.template.loaders.locmem.Loader", {settings.SOLOMON_LOGIN_TEMPLATE: template})],
+            },
+        }
+    ]
+    response = client.get(login_view_url, {"next": "/secret/"})
+    assert response.content == b"[||]"
+
+
+def test_get_login_page_of_authenticated_user_is_not_cached(client, login_view_url, active_user, settings):
+    settings.SOLOMON_LOGIN_PAGE_CACHE_TIMEOUT = 60
+    client.force_login(active_user)
+    response = client.get(login_view_url)
+    assertTemplateUsed(response, settings.SOLOMON_LOGIN_TEMPLATE)
+    assert isinstance(response.context["form"], LoginForm)
+
+
+def test_get_signup_page(client):
+    response = client.get(reverse("solomon:signup"))
+    assert isinstance(response.context["form"], SignupForm)
+    assertTemplateUsed(response, settings.SOLOMON_SIGNUP_TEMPLATE)
+
+
+def test_signup_creates_user_on_verify(client, django_user_model, settings, mailoutbox):
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = True
+    response = client.post(reverse("solomon:signup"), {"email": "New@Example.com"})
+    assertTemplateUsed(response, settings.SOLOMON_SIGNUP_DONE_TEMPLATE)
+    assertTemplateUsed(response, settings.SOLOMON_SIGNUP_EMAIL_HTML_TEMPLATE)
+    assert len(mailoutbox) == 1
+    token = SolomonToken.objects.get()
+    assert token.is_signup
+    assert token.email == "new@example.com"
+    # Abandoned signups never create a user.
+    assert not django_user_model.objects.exists()
+
+    response = client.get(reverse("solomon:verify", kwargs={"pk": token.pk, "token_string": token.token_string}))
+    assert response.status_code == 302
+    user = django_user_model.objects.get()
+    assert user.email == "new@example.com"
+    assert not user.has_usable_password()
+    assert client.session["_auth_user_id"] == str(user.pk)
+
+
+def test_signup_with_existing_user(client, active_user, django_user_model):
+    client.post(reverse("solomon:signup"), {"email": active_user.email})
+    token = SolomonToken.objects.get()
+    response = client.get(reverse("solomon:verify", kwargs={"pk": token.pk, "token_string": token.token_string}))
+    assert response.status_code == 302
+    assert client.session["_auth_user_id"] == str(active_user.pk)
+    assert django_user_model.objects.count() == 1
+
+
+def test_login_code_page_disabled(client):
+    assert client.get(reverse("solomon:login_code")).status_code == 404
+
+
+def test_post_login_page_links_login_code_page(client, login_view_url, active_user, settings):
+    settings.SOLOMON_LOGIN_CODE = True
+    response = client.post(login_view_url, {"email": active_user.email})
+    token = SolomonToken.objects.get()
+    assert len(token.code_hash) == 32
+    assert response.context["login_code_url"] == f"{reverse('solomon:login_code')}?{urlencode({'email': token.email})}"
+
+    response = client.get(response.context["login_code_url"])
+    assertTemplateUsed(response, settings.SOLOMON_LOGIN_CODE_TEMPLATE)
+    assert response.context["form"].initial["email"] == token.email
+
+
+def test_login_with_code(client, active_user, settings):
+    settings.SOLOMON_LOGIN_CODE = True
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+    token = SolomonToken.objects.create(email=active_user.email, ip_address="127.0.0.1", redirect_url="/dashboard/")
+    assert len(token.code) == 6
+    assert token.code.isdigit()
+
+    response = client.post(reverse("solomon:login_code"), {"email": active_user.email.upper(), "code": token.code})
+    assert response.status_code == 302
+    assert response.url == "/dashboard/"
+    assert client.session["_auth_user_id"] == str(active_user.pk)
+
+    # The code and the link share the consumption of the token.
+    client.logout()
+    response = client.get(token.get_verify_url(RequestFactory().get("/")))
+    assertTemplateUsed(response, settings.SOLOMON_LOGIN_FAILED_TEMPLATE)
+    response = client.post(reverse("solomon:login_code"), {"email": active_user.email, "code": token.code})
+    assert response.context["form"].errors["code"] == ["This code is invalid or has expired."]
+
+
+def wrong_code(token):
+    return str((int(token.code) + 1) % 1_000_000).zfill(6)
+
+
+def test_login_with_code_disables_token_after_wrong_codes(client, active_user, settings):
+    settings.SOLOMON_LOGIN_CODE = True
+    settings.SOLOMON_LOGIN_CODE_MAX_ATTEMPTS = 2
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+    token = SolomonToken.objects.create(email=active_user.email, ip_address="127.0.0.1", redirect_url="/")
+
+    for _ in range(2):
+        response = client.post(reverse("solomon:login_code"), {"email": active_user.email, "code": wrong_code(token)})
+        assert "code" in response.context["form"].errors
+
+    response = client.post(reverse("solomon:login_code"), {"email": active_user.email, "code": token.code})
+    assert response.context["form"].errors["code"] == ["This code is invalid or has expired."]
+    assert "_auth_user_id" not in client.session
+    token.refresh_from_db()
+    assert token.disabled_at is not None
+    assert token.consumed_at is None
+
+
+def test_login_with_code_limits_guesses_across_new_links(client, active_user, settings):
+    settings.SOLOMON_LOGIN_CODE = True
+    settings.SOLOMON_LOGIN_CODE_MAX_ATTEMPTS = 2
+    settings.SOLOMON_LOGIN_CODE_EMAIL_MAX_ATTEMPTS = 5
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+
+    guesses = 0
+    for _ in range(10):
+        client.post(reverse("solomon:login"), {"email": active_user.email})
+        for _ in range(settings.SOLOMON_LOGIN_CODE_MAX_ATTEMPTS):
+            # Codes have 6 digits, so this one is always wrong.
+            response = client.post(reverse("solomon:login_code"), {"email": active_user.email, "code": "1234567"})
+            if "code" in response.context["form"].errors:
+                guesses += 1
+    assert guesses == settings.SOLOMON_LOGIN_CODE_EMAIL_MAX_ATTEMPTS
+
+    # New links don't unlock the code login, so even the right code is rejected.
+    token = SolomonToken.objects.create(email=active_user.email, ip_address="127.0.0.1", redirect_url="/")
+    response = client.post(reverse("solomon:login_code"), {"email": active_user.email, "code": token.code})
+    assert response.context["form"].non_field_errors() == ["Too many wrong codes. Please try again later."]
+    assert "_auth_user_id" not in client.session
+
+
+def test_login_with_code_ignores_used_tokens_with_same_code(client, active_user, settings):
+    settings.SOLOMON_LOGIN_CODE = True
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = False
+    used = SolomonToken.objects.create(email=active_user.email, ip_address="127.0.0.1", redirect_url="/used/")
+    used.consume()
+    token = SolomonToken.objects.create(email=active_user.email, ip_address="127.0.0.1", redirect_url="/fresh/")
+    SolomonToken.objects.filter(pk=used.pk).update(code_hash=token.code_hash)
+
+    response = client.post(reverse("solomon:login_code"), {"email": active_user.email, "code": token.code})
+    assert response.url == "/fresh/"
+
+
+def test_login_with_malformed_code(client, active_user, settings):
+    settings.SOLOMON_LOGIN_CODE = True
+    response = client.post(reverse("solomon:login_code"), {"email": active_user.email, "code": "12ab"})
+    assert "code" in response.context["form"].errors
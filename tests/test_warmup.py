@@ -0,0 +1,53 @@
+import logging
+from unittest.mock import patch
+
+from django.apps import apps
+from django.core.management import call_command
+
+from solomon.warmup import WARMUP_STEPS, warm_up
+
+
+def test_warm_up(caplog):
+    with caplog.at_level(logging.INFO, logger="solomon.warmup"):
+        timings = warm_up()
+    assert set(timings) == set(WARMUP_STEPS)
+    assert "Warmed up templates" in caplog.text
+    assert "failed" not in caplog.text
+
+
+def test_warm_up_continues_after_failing_step(settings, caplog):
+    settings.SOLOMON_LOGIN_TEMPLATE = "solomon/does_not_exist.html"
+    timings = warm_up()
+    assert set(timings) == set(WARMUP_STEPS)
+    assert "Warm-up of templates failed." in caplog.text
+
+
+def test_warm_up_logs_setting_problems(settings, caplog):
+    settings.SOLOMON_CROSS_DEVICE_LOGIN = True
+    settings.SOLOMON_REQUIRE_SAME_BROWSER = True
+    warm_up()
+    assert "solomon.W001" in caplog.text
+
+
+def test_warm_up_with_shards(settings):
+    settings.SOLOMON_SHARDS = ["shard1", "shard2"]
+    settings.SOLOMON_TRUSTED_PROXIES = ["10.0.0.0/8"]
+    assert set(warm_up()) == set(WARMUP_STEPS)
+
+
+def test_ready_warms_up_if_enabled(settings):
+    settings.SOLOMON_WARMUP = True
+    with patch("solomon.warmup.warm_up") as warm_up_mock:
+        apps.get_app_config("solomon").ready()
+    warm_up_mock.assert_called_once()
+
+
+def test_ready_skips_warm_up_by_default():
+    with patch("solomon.warmup.warm_up") as warm_up_mock:
+        apps.get_app_config("solomon").ready()
+    warm_up_mock.assert_not_called()
+
+
+def test_warmup_command(capsys):
+    call_command("solomon_warmup")
+    assert "templates:" in capsys.readouterr().out
@@ -1,3 +1,4 @@
+from django.contrib import admin
 from django.contrib.auth.decorators import login_required
 from django.http import HttpResponse
 from django.urls import include, path
@@ -13,6 +14,7 @@ def unprotected(request):
 
 
 urlpatterns = [
+    path("admin/", admin.site.urls),
     path("auth/", include("solomon.urls")),
     path("unprotected-route/", unprotected, name="unprotected"),
     path("protected-route/", protected, name="protected"),